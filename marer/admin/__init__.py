@@ -1,6 +1,7 @@
 from collections import OrderedDict
 from random import randint
 
+from django.conf import settings
 from django.conf.urls import url
 from django.contrib import messages
 from django.contrib.admin import ModelAdmin, register, site
@@ -10,19 +11,21 @@ from django.contrib.admin.utils import unquote
 from django.contrib.auth.admin import UserAdmin
 from django.core.exceptions import ObjectDoesNotExist, ValidationError
 from django.core.exceptions import PermissionDenied
-from django.db.models import TextField, BLANK_CHOICE_DASH, Q
+from django.db.models import TextField, BLANK_CHOICE_DASH, Q, Sum
 from django.forms import Textarea
 from django.http import Http404, HttpResponseRedirect
 from django.template.response import TemplateResponse
 from django.urls import reverse
 from django.utils.encoding import force_text
 from django.utils.html import escape
+from django.utils import timezone
 from django.utils.timezone import localtime
 from django.utils.translation import ugettext_lazy as _
 from mptt.admin import MPTTModelAdmin
 
 
-from marer.consts import TENDER_EXEC_LAW_44_FZ, TENDER_EXEC_LAW_223_FZ, DOCUMENT_SIGN_NONE
+from marer.consts import TENDER_EXEC_LAW_44_FZ, TENDER_EXEC_LAW_223_FZ, DOCUMENT_SIGN_NONE, CONCLUSION_CHOICES, \
+    CONCLUSION_DOC_OPS_MGMT, CONCLUSION_LAWYERS_DEP, CONCLUSION_SEC_DEP
 from marer import models
 from marer.admin.filters import ManagerListFilter, BrokerListFilter
 from marer.admin.forms import IFOPClarificationAddForm, MarerUserChangeForm, UserCreationForm
@@ -36,6 +39,9 @@ from marer.models.finance_org import FinanceOrgProductProposeDocument
 from marer.utils.notify import notify_user_about_manager_created_issue_for_user, \
     notify_user_about_manager_updated_issue_for_user, notify_manager_about_new_issue
 from marer.models.base import FormOwnership
+from marer.models.external import MorpherDeclension, KonturUsage
+from marer.utils.documents import generate_conclusions
+from marer.utils.morph import MorpherApi
 
 site.site_title = 'Управление сайтом'
 site.site_header = 'Управление площадкой'
@@ -243,6 +249,40 @@ class IssueAdmin(ModelAdmin):
     tender_gos_number_link.allow_tags = True
     tender_gos_number_link.short_description = 'Ссылка на конкурс'
 
+    actions = [
+        'generate_doc_ops_mgmt_conclusions',
+        'generate_sec_dep_conclusions',
+        'generate_lawyers_dep_conclusions',
+    ]
+
+    def _generate_conclusions(self, request, queryset, conclusion_type):
+        issue_ids = list(queryset.values_list('id', flat=True))
+        if len(issue_ids) > settings.CONCLUSION_BATCH_MAX_ISSUES:
+            self.message_user(request, 'Не более {} заявок за один раз'.format(
+                settings.CONCLUSION_BATCH_MAX_ISSUES), level=messages.ERROR)
+            return
+        report = generate_conclusions(issue_ids, conclusion_type, user=request.user)
+        for result in report:
+            for err in result['errors']:
+                self.message_user(request, 'Заявка №{}: {}'.format(result['issue_id'], err), level=messages.ERROR)
+        self.message_user(request, '{}: заполнено {} из {}'.format(
+            dict(CONCLUSION_CHOICES)[conclusion_type],
+            len([result for result in report if result['success']]),
+            len(report),
+        ))
+
+    def generate_doc_ops_mgmt_conclusions(self, request, queryset):
+        self._generate_conclusions(request, queryset, CONCLUSION_DOC_OPS_MGMT)
+    generate_doc_ops_mgmt_conclusions.short_description = 'Заполнить заключения УРДО'
+
+    def generate_sec_dep_conclusions(self, request, queryset):
+        self._generate_conclusions(request, queryset, CONCLUSION_SEC_DEP)
+    generate_sec_dep_conclusions.short_description = 'Заполнить заключения ДБ'
+
+    def generate_lawyers_dep_conclusions(self, request, queryset):
+        self._generate_conclusions(request, queryset, CONCLUSION_LAWYERS_DEP)
+    generate_lawyers_dep_conclusions.short_description = 'Заполнить заключения ПУ'
+
     def get_urls(self):
         return [
             url(
@@ -260,8 +300,38 @@ class IssueAdmin(ModelAdmin):
                 self.admin_site.admin_view(self.generate_lawyers_dep_conclusion_doc),
                 name='marer_issue_generate_lawyers_dep_conclusion_doc',
             ),
+            url(
+                r'^(.+)/refresh/external_snapshots/$',
+                self.admin_site.admin_view(self.refresh_external_snapshots),
+                name='marer_issue_refresh_external_snapshots',
+            ),
         ] + super().get_urls()
 
+    def refresh_external_snapshots(self, request, id, form_url=''):
+        issue_id = unquote(id)
+        try:
+            issue = Issue.objects.get(id=issue_id)
+        except ObjectDoesNotExist:
+            return self._get_obj_does_not_exist_redirect(request, Issue._meta, issue_id)
+
+        try:
+            issue.refresh_external_snapshots()
+        except Exception:
+            self.message_user(request, 'Не удалось обновить данные внешних сервисов', level=messages.ERROR)
+        else:
+            self.message_user(request, 'Данные внешних сервисов обновлены')
+
+        return HttpResponseRedirect(
+            reverse(
+                '%s:%s_%s_change' % (
+                    self.admin_site.name,
+                    Issue._meta.app_label,
+                    Issue._meta.model_name,
+                ),
+                args=(issue.id,),
+            )
+        )
+
     def generate_doc_ops_mgmt_conclusion_doc(self, request, id, form_url=''):
         issue_id = unquote(id)
         try:
@@ -871,3 +941,71 @@ class FinanceOrgProductProposeDocumentAdmin(ModelAdmin):
 @register(FormOwnership)
 class FormOwnershipAdmin(ModelAdmin):
     pass
+
+
+@register(MorpherDeclension)
+class MorpherDeclensionAdmin(ModelAdmin):
+    list_display = (
+        'text',
+        'created_at',
+    )
+    search_fields = (
+        'text',
+    )
+    readonly_fields = (
+        'text_hash',
+        'text',
+        'response',
+        'created_at',
+    )
+
+    def has_add_permission(self, request):
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        stats = MorpherApi.get_stats()
+        extra_context = extra_context or {}
+        extra_context.update(
+            morpher_stats=stats,
+            morpher_hit_ratio=round(stats['hit_ratio'] * 100, 1),
+        )
+        return super().changelist_view(request, extra_context)
+
+
+@register(KonturUsage)
+class KonturUsageAdmin(ModelAdmin):
+    list_display = (
+        'date',
+        'method',
+        'count',
+    )
+    list_filter = (
+        'method',
+    )
+    date_hierarchy = 'date'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def get_readonly_fields(self, request, obj=None):
+        return 'date', 'method', 'count'
+
+    def changelist_view(self, request, extra_context=None):
+        month_start = timezone.localdate().replace(day=1)
+        month_usage = KonturUsage.objects.filter(date__gte=month_start)
+        by_method = month_usage.values('method').annotate(total=Sum('count')).order_by('-total')
+        month_total = month_usage.aggregate(total=Sum('count'))['total'] or 0
+        quota = settings.KONTUR_MONTHLY_QUOTA
+
+        extra_context = extra_context or {}
+        extra_context.update(
+            kontur_month_start=month_start,
+            kontur_month_total=month_total,
+            kontur_month_by_method=by_method,
+            kontur_quota=quota,
+            kontur_quota_used_percent=round(month_total * 100 / quota, 1) if quota else None,
+        )
+        return super().changelist_view(request, extra_context)
@@ -87,3 +87,25 @@ DOCUMENT_SIGN_LABELS = {
     DOCUMENT_SIGN_CORRUPTED: 'Неверна',
     DOCUMENT_SIGN_NONE: 'Отсутствует',
 }
+
+DOCUMENT_JOB_STATUS_PENDING = 'pending'
+DOCUMENT_JOB_STATUS_RUNNING = 'running'
+DOCUMENT_JOB_STATUS_DONE = 'done'
+DOCUMENT_JOB_STATUS_FAILED = 'failed'
+
+DOCUMENT_JOB_STATUS_CHOICES = (
+    (DOCUMENT_JOB_STATUS_PENDING, 'В очереди'),
+    (DOCUMENT_JOB_STATUS_RUNNING, 'Формируется'),
+    (DOCUMENT_JOB_STATUS_DONE, 'Готово'),
+    (DOCUMENT_JOB_STATUS_FAILED, 'Ошибка'),
+)
+
+CONCLUSION_DOC_OPS_MGMT = 'doc_ops_mgmt'
+CONCLUSION_SEC_DEP = 'sec_dep'
+CONCLUSION_LAWYERS_DEP = 'lawyers_dep'
+
+CONCLUSION_CHOICES = (
+    (CONCLUSION_DOC_OPS_MGMT, 'Заключение УРДО'),
+    (CONCLUSION_SEC_DEP, 'Заключение ДБ'),
+    (CONCLUSION_LAWYERS_DEP, 'Заключение ПУ'),
+)
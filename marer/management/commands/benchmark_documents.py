@@ -0,0 +1,250 @@
+import glob
+import json
+import os
+import platform
+import resource
+import time
+import tracemalloc
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import models, transaction
+from django.utils import timezone
+
+from marer import consts
+from marer.models import Document, Issue, User
+from marer.models.issue import IssueBGProdAffiliate, IssueBGProdFounderLegal, IssueBGProdFounderPhysical, \
+    IssuerLicences, IssueOrgBankAccount, IssueOrgBeneficiaryOwner, IssueOrgManagementCollegial, \
+    IssueOrgManagementDirectors, IssueOrgManagementOthers
+from marer.products import BankGuaranteeProduct
+from marer.utils.documents import fill_docx_file_with_issue_data, fill_xlsx_file_with_issue_data, \
+    generate_acts_for_issue, get_acts_for_issue
+
+TEMPLATES_DIR = os.path.join(settings.BASE_DIR, 'marer', 'templates', 'documents')
+ACTS_NAME = 'generate_acts_for_issue'
+
+
+def external_stubs():
+    """
+    Внешние сервисы на время замера отвечают пустыми данными.
+    """
+    return [
+        mock.patch('marer.utils.kontur._cached_api_request', lambda method, inn, ogrn: {}),
+        mock.patch('marer.utils.zakupki.get_finished_contracts_counts', lambda inn: (0, 0)),
+        mock.patch('marer.utils.morph.MorpherApi._request', lambda text: None),
+        mock.patch('marer.models.issue.fetch_tender_info', lambda gos_number: {}),
+        # проверка по перечню террористов на fedsfm.ru
+        mock.patch.object(Issue, 'is_issuer_present_in_terrorists_list', False),
+        # акты не пишутся в хранилище и базу, размер берется из несохраненного файла
+        mock.patch.object(Document, 'save', lambda self, *args, **kwargs: None),
+    ]
+
+
+def create_synthetic_issue(user: User, rows: int) -> int:
+    """
+    Заявка с заполненными полями и связанными наборами по rows записей: заполнены и
+    отчетность со скорингом, которые читают заключения и шаблоны issue_domc_*.
+    Сохраняется в обход Issue.save, чтобы не формировать документы заранее.
+    """
+    issue = Issue(
+        user=user,
+        product=BankGuaranteeProduct().name,
+        issuer_inn='7701234567',
+        issuer_kpp='770101001',
+        issuer_ogrn='1027700000000',
+        issuer_full_name='Общество с ограниченной ответственностью «Ромашка»',
+        issuer_short_name='ООО «Ромашка»',
+        issuer_legal_address='г. Москва, ул. Тверская, д. 1',
+        issuer_fact_address='г. Москва, ул. Тверская, д. 1',
+        issuer_post_address='г. Москва, ул. Тверская, д. 1',
+        issuer_registration_date=date(2010, 1, 1),
+        issuer_head_first_name='Иван',
+        issuer_head_last_name='Иванов',
+        issuer_head_middle_name='Иванович',
+        issuer_accountant_org_or_person='Иванова Мария Петровна',
+        avg_employees_cnt_for_prev_year=25,
+        balance_code_1300_offset_0=Decimal('12000'),
+        balance_code_1600_offset_0=Decimal('48000'),
+        balance_code_2110_offset_0=Decimal('65000'),
+        balance_code_2400_offset_0=Decimal('3100'),
+        balance_code_1230_offset_0=Decimal('9000'),
+        balance_code_1300_offset_1=Decimal('11000'),
+        balance_code_1600_offset_1=Decimal('45000'),
+        balance_code_2110_offset_1=Decimal('90000'),
+        balance_code_2400_offset_1=Decimal('4200'),
+        balance_code_2110_offset_2=Decimal('80000'),
+        balance_code_2110_analog_offset_0=Decimal('60000'),
+        is_contract_corresponds_issuer_activity=1,
+        total_credit_pay_term_expiration_events=0,
+        total_credit_pay_term_overdue_days=0,
+        tender_gos_number='0373100000000000001',
+        tender_exec_law=consts.TENDER_EXEC_LAW_44_FZ,
+        tender_responsible_inn='7702345678',
+        tender_responsible_full_name='Государственное бюджетное учреждение города Москвы',
+        tender_contract_subject='Поставка медицинского оборудования',
+        tender_start_cost=Decimal('15000000'),
+        tender_final_cost=Decimal('14500000'),
+        bg_sum=Decimal('1450000'),
+        bg_currency=consts.CURRENCY_RUR,
+        bg_type=consts.BG_TYPE_CONTRACT_EXECUTION,
+        bg_start_date=timezone.localdate(),
+        bg_end_date=timezone.localdate() + timedelta(days=365),
+    )
+    models.Model.save(issue)
+
+    IssueBGProdFounderLegal.objects.bulk_create([IssueBGProdFounderLegal(
+        issue=issue, name='ООО «Учредитель {}»'.format(i), auth_capital_percentage='30%',
+    ) for i in range(rows)])
+    IssueBGProdFounderPhysical.objects.bulk_create([IssueBGProdFounderPhysical(
+        issue=issue, fio='Петров Петр Петрович {}'.format(i), auth_capital_percentage='30%',
+    ) for i in range(rows)])
+    IssueBGProdAffiliate.objects.bulk_create([IssueBGProdAffiliate(
+        issue=issue, name='ООО «Партнер {}»'.format(i), inn='77{:08d}'.format(i), bank_liabilities_vol=Decimal('100000'),
+    ) for i in range(rows)])
+    IssueOrgBankAccount.objects.bulk_create([IssueOrgBankAccount(
+        issue=issue, name='ПАО «Банк {}»'.format(i), bik='044525{:03d}'.format(i % 1000),
+    ) for i in range(rows)])
+    IssueOrgBeneficiaryOwner.objects.bulk_create([IssueOrgBeneficiaryOwner(
+        issue=issue, fio='Сидоров Сидор Сидорович {}'.format(i), legal_address='г. Москва',
+    ) for i in range(rows)])
+    for management_model in (IssueOrgManagementCollegial, IssueOrgManagementDirectors, IssueOrgManagementOthers):
+        management_model.objects.bulk_create([management_model(
+            issue=issue, org_name='Совет {}'.format(i), fio='Кузнецов Кузьма Кузьмич {}'.format(i),
+        ) for i in range(rows)])
+    IssuerLicences.objects.bulk_create([IssuerLicences(
+        issue=issue, number='ЛО-77-{:05d}'.format(i), activity='Медицинская деятельность', date_from=date(2015, 1, 1),
+    ) for i in range(rows)])
+    return issue.id
+
+
+class Command(BaseCommand):
+    help = 'Measures rendering of every document template for synthetic issues of growing size'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[3, 300],
+                            help='Founders, affiliates, bank accounts etc. per synthetic issue')
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--template', action='append', default=[],
+                            help='Only templates whose file name contains this string')
+        parser.add_argument('--save', help='Write results as a baseline JSON file')
+        parser.add_argument('--compare', help='Baseline JSON file to compare wall time with')
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='Allowed relative slowdown against the baseline')
+
+    def get_renderers(self, names_filter):
+        renderers = []
+        for path in sorted(glob.glob(os.path.join(TEMPLATES_DIR, '**', '*.docx'), recursive=True)):
+            renderers.append((os.path.relpath(path, TEMPLATES_DIR), fill_docx_file_with_issue_data, path))
+        for path in sorted(glob.glob(os.path.join(TEMPLATES_DIR, '**', '*.xlsx'), recursive=True)):
+            renderers.append((os.path.relpath(path, TEMPLATES_DIR), fill_xlsx_file_with_issue_data, path))
+        renderers.append((ACTS_NAME, None, None))
+        if names_filter:
+            renderers = [r for r in renderers if any(name in r[0] for name in names_filter)]
+        return renderers
+
+    def render(self, renderer, path, issue_id, user) -> int:
+        # заявка загружается заново, чтобы кеши свойств не переживали замер
+        issue = Issue.objects.get(id=issue_id)
+        if renderer is None:
+            generate_acts_for_issue(issue)
+            return sum(getattr(issue, issue_field).file.size for issue_field, _, _ in get_acts_for_issue(issue))
+        document_file = renderer(path, issue, user)
+        size = document_file.size
+        document_file.close()
+        return size
+
+    def measure(self, renderer, path, issue_id, user, repeat) -> dict:
+        started_at = time.perf_counter()
+        for _ in range(repeat):
+            output_bytes = self.render(renderer, path, issue_id, user)
+        wall_ms = (time.perf_counter() - started_at) * 1000 / repeat
+
+        tracemalloc.start()
+        self.render(renderer, path, issue_id, user)
+        _, peak_py = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        return dict(
+            wall_ms=round(wall_ms, 1),
+            # ru_maxrss в Linux в килобайтах и не уменьшается: это максимум процесса к концу замера
+            peak_rss_kb=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            peak_py_kb=peak_py // 1024,
+            output_bytes=output_bytes,
+        )
+
+    def handle(self, *args, **options):
+        renderers = self.get_renderers(options['template'])
+        results = {}
+        row_format = '{:<64}{:>6}{:>12}{:>14}{:>12}{:>14}'
+        self.stdout.write(row_format.format('template', 'rows', 'wall_ms', 'peak_rss_kb', 'peak_py_kb', 'output_bytes'))
+
+        stubs = external_stubs()
+        for stub in stubs:
+            stub.start()
+        try:
+            with transaction.atomic():
+                # заключения выводят инициалы и телефон сотрудника, формирующего документ
+                user = User.objects.create(
+                    username='benchmark_documents_{}'.format(int(time.time())),
+                    first_name='Мария',
+                    last_name='Смирнова',
+                    middle_name='Андреевна',
+                    phone='+7 495 000-00-00',
+                )
+                for rows in options['rows']:
+                    issue_id = create_synthetic_issue(user, rows)
+                    for name, renderer, path in renderers:
+                        key = '{}@{}'.format(name, rows)
+                        try:
+                            results[key] = self.measure(renderer, path, issue_id, user, options['repeat'])
+                        except Exception as e:
+                            results[key] = dict(error='{}: {}'.format(type(e).__name__, e))
+                            self.stdout.write(row_format.format(name, rows, 'error', '', '', '') + ' ' + results[key]['error'])
+                            continue
+                        self.stdout.write(row_format.format(name, rows, *[
+                            results[key][k] for k in ('wall_ms', 'peak_rss_kb', 'peak_py_kb', 'output_bytes')
+                        ]))
+                # синтетические данные в базе не остаются
+                transaction.set_rollback(True)
+        finally:
+            for stub in stubs:
+                stub.stop()
+
+        errors = sorted(key for key, result in results.items() if 'error' in result)
+        if errors:
+            raise CommandError('{} templates failed to render: {}'.format(len(errors), ', '.join(errors)))
+
+        if options['save']:
+            with open(options['save'], 'w') as f:
+                json.dump(dict(
+                    python=platform.python_version(),
+                    created_at=timezone.now().isoformat(),
+                    repeat=options['repeat'],
+                    results=results,
+                ), f, indent=2, ensure_ascii=False, sort_keys=True)
+            self.stdout.write('Baseline saved to {}'.format(options['save']))
+
+        if options['compare']:
+            self.compare(results, options['compare'], options['tolerance'])
+
+    def compare(self, results, baseline_path, tolerance):
+        with open(baseline_path) as f:
+            baseline = json.load(f)['results']
+        regressions = []
+        for key in sorted(set(results) & set(baseline)):
+            current_ms = results[key].get('wall_ms')
+            baseline_ms = baseline[key].get('wall_ms')
+            if not current_ms or not baseline_ms:
+                continue
+            ratio = current_ms / baseline_ms
+            marker = ''
+            if ratio > 1 + tolerance:
+                regressions.append(key)
+                marker = ' REGRESSION'
+            self.stdout.write('{:<72}{:>10.1f}{:>10.1f}{:>8.2f}x{}'.format(key, baseline_ms, current_ms, ratio, marker))
+        if regressions:
+            raise CommandError('{} templates are slower than the baseline by more than {:.0%}: {}'.format(
+                len(regressions), tolerance, ', '.join(regressions)))
@@ -0,0 +1,77 @@
+import os
+import time
+from collections import ChainMap
+from copy import deepcopy
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from marer.utils.documents import get_compiled_docx_template
+
+TEMPLATE_PATH = os.path.join(settings.BASE_DIR, 'marer', 'templates', 'documents', 'issue_application_doc.docx')
+
+
+class BenchmarkIssue:
+    """
+    Заявка для замера: списки для циклов шаблона заданной длины,
+    остальные атрибуты и вложенные значения выводятся пустой строкой.
+    """
+
+    def __init__(self, rows: int):
+        self.bank_accounts = [SimpleNamespace(name='ПАО «Банк»', bik='044525094') for _ in range(rows)]
+        self.beneficiaries_owner = [SimpleNamespace(
+            fio='Иванов Иван Иванович',
+            inn_or_snils='7701234567',
+            legal_address='г. Москва',
+            fact_address='г. Москва',
+            post_address='г. Москва',
+        ) for _ in range(rows)]
+        self.founders_with_25_share = [dict(name='ООО «Ромашка»', auth_capital_percentage=50) for _ in range(rows)]
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return self
+
+    def __getitem__(self, key):
+        return self
+
+    def __format__(self, format_spec):
+        return ''
+
+
+class Command(BaseCommand):
+    help = 'Measures loop expansion and full render time of the application template for growing lists'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[1, 10, 100, 1000])
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        template = get_compiled_docx_template(TEMPLATE_PATH)
+        row_format = '{:>8}{:>16}{:>16}{:>16}'
+        self.stdout.write(row_format.format('rows', 'expand_ms', 'render_ms', 'render_ms/row'))
+        for rows in options['rows']:
+            data = ChainMap(dict(issue=BenchmarkIssue(rows), clean_on_empty=''))
+
+            expand_time = 0
+            for _ in range(options['repeat']):
+                document = deepcopy(template.document)
+                started_at = time.perf_counter()
+                template.expand_loops(document, data)
+                expand_time += time.perf_counter() - started_at
+
+            started_at = time.perf_counter()
+            for _ in range(options['repeat']):
+                template.render(data)
+            render_time = time.perf_counter() - started_at
+
+            expand_ms = expand_time * 1000 / options['repeat']
+            render_ms = render_time * 1000 / options['repeat']
+            self.stdout.write(row_format.format(
+                rows,
+                '{:.1f}'.format(expand_ms),
+                '{:.1f}'.format(render_ms),
+                '{:.3f}'.format(render_ms / rows),
+            ))
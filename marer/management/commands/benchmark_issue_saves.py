@@ -0,0 +1,138 @@
+import json
+import platform
+import time
+from unittest import mock
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from marer.management.commands.benchmark_documents import create_synthetic_issue
+from marer.models import Issue, User
+from marer.models.issue import ISSUE_SAVE_EFFECTS
+
+MODES = ('full', 'tracked')
+SURVEY_FIELDS = (
+    'issuer_full_name', 'issuer_short_name', 'issuer_inn', 'issuer_kpp', 'issuer_ogrn', 'issuer_legal_address',
+    'issuer_post_address', 'issuer_registration_date', 'issuer_head_first_name', 'issuer_head_last_name',
+    'issuer_head_middle_name', 'issuer_accountant_org_or_person', 'avg_employees_cnt_for_prev_year',
+)
+
+
+def change_comment(issue, i):
+    issue.comment = 'Комментарий менеджера {}'.format(i)
+
+
+def touch(issue, i):
+    # как set_obj_update_time при новом сообщении или дозапросе: меняется только время обновления
+    issue.updated_at = timezone.now()
+
+
+def submit_survey(issue, i):
+    # форма анкеты присваивает все поля, из которых изменилось одно
+    for field in SURVEY_FIELDS:
+        setattr(issue, field, getattr(issue, field))
+    issue.issuer_fact_address = 'г. Москва, ул. Тверская, д. {}'.format(i)
+
+
+SCENARIOS = (
+    ('comment', change_comment),
+    ('touch', touch),
+    ('survey', submit_survey),
+)
+
+
+def get_update_columns(sql: str) -> int:
+    return sql.split(' SET ', 1)[1].split(' WHERE ', 1)[0].count('" = ')
+
+
+class Command(BaseCommand):
+    help = 'Measures columns, SQL size, WAL volume and row lock time of Issue saves with full and tracked UPDATEs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument('--save', help='Write results as JSON file')
+
+    def get_wal_lsn(self):
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            if connection.pg_version >= 100000:
+                cursor.execute('SELECT pg_current_wal_lsn()')
+            else:
+                cursor.execute('SELECT pg_current_xlog_location()')
+            return cursor.fetchone()[0]
+
+    def get_wal_bytes(self, start_lsn, end_lsn):
+        if start_lsn is None:
+            return None
+        with connection.cursor() as cursor:
+            if connection.pg_version >= 100000:
+                cursor.execute('SELECT pg_wal_lsn_diff(%s::pg_lsn, %s::pg_lsn)', [end_lsn, start_lsn])
+            else:
+                cursor.execute('SELECT pg_xlog_location_diff(%s::pg_lsn, %s::pg_lsn)', [end_lsn, start_lsn])
+            return int(cursor.fetchone()[0])
+
+    def save_once(self, issue_id, scenario, mode, i) -> dict:
+        issue = Issue.objects.get(id=issue_id)
+        scenario(issue, i)
+        start_lsn = self.get_wal_lsn()
+        transaction.set_autocommit(False)
+        try:
+            with CaptureQueriesContext(connection) as queries:
+                issue.save(full_save=mode == 'full')
+            commit_started_at = time.perf_counter()
+            transaction.commit()
+            commit_ms = (time.perf_counter() - commit_started_at) * 1000
+        finally:
+            transaction.set_autocommit(True)
+        end_lsn = self.get_wal_lsn()
+
+        updates = [q for q in queries.captured_queries if q['sql'].startswith('UPDATE "marer_issue"')]
+        update_ms = sum(float(q['time']) * 1000 for q in updates)
+        return dict(
+            columns=sum(get_update_columns(q['sql']) for q in updates),
+            sql_bytes=sum(len(q['sql'].encode()) for q in updates),
+            update_ms=update_ms,
+            # строка заявки заблокирована от UPDATE до фиксации транзакции
+            lock_ms=update_ms + commit_ms,
+            wal_bytes=self.get_wal_bytes(start_lsn, end_lsn),
+        )
+
+    def handle(self, *args, **options):
+        results = {}
+        row_format = '{:<10}{:<10}{:>10}{:>12}{:>12}{:>12}{:>12}'
+        self.stdout.write(row_format.format('scenario', 'mode', 'columns', 'sql_bytes', 'update_ms', 'lock_ms', 'wal_bytes'))
+
+        user = User.objects.create(username='benchmark_issue_saves_{}'.format(int(time.time())))
+        issue_id = create_synthetic_issue(user, 0)
+        try:
+            # замеряется только запись заявки, документы после фиксации не формируются
+            with mock.patch.object(ISSUE_SAVE_EFFECTS, 'schedule', lambda *args, **kwargs: None):
+                for name, scenario in SCENARIOS:
+                    for mode in MODES:
+                        runs = [self.save_once(issue_id, scenario, mode, i) for i in range(options['repeat'])]
+                        result = dict(columns=runs[-1]['columns'], sql_bytes=runs[-1]['sql_bytes'])
+                        for key in ('update_ms', 'lock_ms', 'wal_bytes'):
+                            values = [run[key] for run in runs if run[key] is not None]
+                            result[key] = round(sum(values) / len(values), 3) if values else None
+                        results['{}@{}'.format(name, mode)] = result
+                        self.stdout.write(row_format.format(name, mode, *[
+                            '-' if result[k] is None else result[k]
+                            for k in ('columns', 'sql_bytes', 'update_ms', 'lock_ms', 'wal_bytes')
+                        ]))
+        finally:
+            Issue.objects.filter(id=issue_id).delete()
+            user.delete()
+
+        if options['save']:
+            with open(options['save'], 'w') as f:
+                json.dump(dict(
+                    python=platform.python_version(),
+                    database=connection.vendor,
+                    created_at=timezone.now().isoformat(),
+                    repeat=options['repeat'],
+                    results=results,
+                ), f, indent=2, ensure_ascii=False, sort_keys=True)
+            self.stdout.write('Results saved to {}'.format(options['save']))
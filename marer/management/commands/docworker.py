@@ -0,0 +1,64 @@
+import logging
+import os
+import socket
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from marer.models import DocumentGenerationTask
+from marer.utils.documents import run_document_task
+
+logger = logging.getLogger('django')
+
+
+class Command(BaseCommand):
+    help = 'Renders queued issue documents in a pool of worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=settings.DOCWORKER_PROCESSES)
+        parser.add_argument('--poll-interval', type=float, default=settings.DOCWORKER_POLL_INTERVAL)
+        parser.add_argument('--once', action='store_true', default=False,
+                            help='Exit when the queue is empty instead of polling')
+
+    def requeue_stale(self):
+        requeued = DocumentGenerationTask.requeue_stale(settings.DOCWORKER_TASK_TIMEOUT)
+        if requeued:
+            logger.warning('Requeued {} stale document tasks'.format(requeued))
+
+    def handle(self, *args, **options):
+        processes = options['processes']
+        worker = '{}:{}'.format(socket.gethostname(), os.getpid())
+        logger.info('Document worker {} started with {} processes'.format(worker, processes))
+
+        running = {}
+        requeued_at = None
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            while True:
+                # задачи упавшего соседа возвращаются в очередь и тогда, когда этот обработчик занят
+                if requeued_at is None or time.monotonic() - requeued_at >= settings.DOCWORKER_REQUEUE_INTERVAL:
+                    self.requeue_stale()
+                    requeued_at = time.monotonic()
+
+                free_slots = processes - len(running)
+                task_ids = DocumentGenerationTask.claim(free_slots, worker) if free_slots else []
+                # процессы пула создаются при submit и не должны унаследовать открытое соединение
+                connections.close_all()
+                for task_id in task_ids:
+                    running[executor.submit(run_document_task, task_id)] = task_id
+
+                if not running:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                done, _ = wait(list(running), timeout=options['poll_interval'], return_when=FIRST_COMPLETED)
+                for future in done:
+                    task_id = running.pop(future)
+                    try:
+                        logger.info('Document task {} finished: {}'.format(task_id, future.result()))
+                    except Exception as e:
+                        logger.warning('Document task {} crashed: {}'.format(task_id, e))
@@ -0,0 +1,36 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from marer.utils import kontur
+
+logger = logging.getLogger('django')
+
+
+class Command(BaseCommand):
+    help = 'Shows Kontur.Focus cache statistics per API method'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', default=False)
+
+    def handle(self, *args, **options):
+        stats = kontur.get_cache_stats()
+        row_format = '{:<24}{:>10}{:>12}{:>10}{:>12}{:>14}{:>16}'
+        self.stdout.write(row_format.format(
+            'method', 'hits', 'stale_hits', 'misses', 'api_calls', 'saved_calls', 'avg_latency_ms'
+        ))
+        for method in kontur.CACHED_METHODS:
+            method_stats = stats[method]
+            self.stdout.write(row_format.format(
+                method,
+                method_stats['hits'],
+                method_stats['stale_hits'],
+                method_stats['misses'],
+                method_stats['api_calls'],
+                method_stats['saved_api_calls'],
+                method_stats['avg_api_latency_ms'],
+            ))
+
+        if options.get('reset'):
+            kontur.reset_cache_stats()
+            logger.info('Kontur.Focus cache statistics reset')
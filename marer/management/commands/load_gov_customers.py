@@ -0,0 +1,102 @@
+import logging
+import zipfile
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from lxml import etree
+
+from marer.models.external import GovCustomerRegistry
+
+logger = logging.getLogger('django')
+
+FIELDS = dict(
+    regNumber='reg_number',
+    fullName='full_name',
+    INN='inn',
+    KPP='kpp',
+    OGRN='ogrn',
+)
+
+
+class Command(BaseCommand):
+    help = 'Loads government customers registry dump (nsiOrganization xml or zip with xml files)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('filenames', nargs='+', type=str)
+        parser.add_argument('--tag', type=str, default='nsiOrganization')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def iter_sources(self, filename):
+        if zipfile.is_zipfile(filename):
+            with zipfile.ZipFile(filename) as archive:
+                for name in archive.namelist():
+                    if name.endswith('.xml'):
+                        with archive.open(name) as source:
+                            yield source
+        else:
+            with open(filename, 'rb') as source:
+                yield source
+
+    def iter_records(self, source, tag):
+        for event, elem in etree.iterparse(source, events=('end',), tag='{*}' + tag):
+            record = {}
+            for child in elem.iter():
+                if not isinstance(child.tag, str):
+                    continue
+                field = FIELDS.get(etree.QName(child).localname)
+                if field and field not in record and child.text:
+                    record[field] = child.text.strip()
+            elem.clear()
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
+            if record.get('inn'):
+                yield record
+
+    def save_batch(self, batch):
+        existing = {
+            row.inn: row for row in GovCustomerRegistry.objects.filter(inn__in=list(batch.keys()))
+        }
+        to_create = []
+        updated = 0
+        with transaction.atomic():
+            for inn, record in batch.items():
+                row = existing.get(inn)
+                if row is None:
+                    to_create.append(GovCustomerRegistry(source=GovCustomerRegistry.SOURCE_REGISTRY, **record))
+                    continue
+                changes = {k: v for k, v in record.items() if getattr(row, k) != v}
+                if changes or row.source != GovCustomerRegistry.SOURCE_REGISTRY:
+                    changes['source'] = GovCustomerRegistry.SOURCE_REGISTRY
+                    changes['updated_at'] = timezone.now()
+                    GovCustomerRegistry.objects.filter(id=row.id).update(**changes)
+                    updated += 1
+            GovCustomerRegistry.objects.bulk_create(to_create)
+        return len(to_create), updated
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        created_total = 0
+        updated_total = 0
+        processed = 0
+
+        for filename in options['filenames']:
+            logger.info('Loading government customers from {}'.format(filename))
+            for source in self.iter_sources(filename):
+                batch = {}
+                for record in self.iter_records(source, options['tag']):
+                    batch[record['inn']] = record
+                    processed += 1
+                    if len(batch) >= batch_size:
+                        created, updated = self.save_batch(batch)
+                        created_total += created
+                        updated_total += updated
+                        batch = {}
+                if batch:
+                    created, updated = self.save_batch(batch)
+                    created_total += created
+                    updated_total += updated
+
+        logger.info('Government customers processed: {}, created: {}, updated: {}'.format(
+            processed, created_total, updated_total
+        ))
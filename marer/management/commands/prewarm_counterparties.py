@@ -0,0 +1,134 @@
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+
+from marer import consts
+from marer.models.external import SupplierContractStats
+from marer.models.issue import Issue, IssueExternalSnapshot
+from marer.utils import kontur, zakupki
+from marer.utils.other import fetch_tender_info
+
+logger = logging.getLogger('django')
+
+CHECKPOINT_KEY = 'prewarm_counterparties:checkpoint'
+
+ISSUER_METHODS = ('req', 'analytics', 'egr_details', 'beneficial_owners', 'company_affiliates', 'licences')
+BENEFICIARY_METHODS = ('analytics', 'egr_details')
+
+
+class Command(BaseCommand):
+    help = 'Prefetches external data for counterparties of active issues'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.PREWARM_COUNTERPARTIES_WORKERS)
+        parser.add_argument('--restart', action='store_true', default=False)
+
+    def collect_counterparties(self):
+        counterparties = OrderedDict()
+
+        def add(inn, ogrn, issue_id, is_issuer, gos_number=''):
+            if not inn:
+                return
+            item = counterparties.setdefault(inn, dict(ogrn=ogrn, issuer=False, issues={}))
+            item['ogrn'] = item['ogrn'] or ogrn
+            item['issuer'] = item['issuer'] or is_issuer
+            item['issues'].setdefault(issue_id, gos_number)
+
+        issues = Issue.objects.filter(
+            status__in=[consts.ISSUE_STATUS_REGISTERING, consts.ISSUE_STATUS_REVIEW]
+        ).order_by('id').values(
+            'id', 'issuer_inn', 'issuer_ogrn', 'tender_responsible_inn', 'tender_responsible_ogrn', 'tender_gos_number'
+        )
+        for issue in issues:
+            add(issue['issuer_inn'], issue['issuer_ogrn'], issue['id'], True)
+            add(issue['tender_responsible_inn'], issue['tender_responsible_ogrn'], issue['id'], False,
+                issue['tender_gos_number'])
+        return OrderedDict(sorted(counterparties.items()))
+
+    def fetch(self, inn, item):
+        """
+        Выполняется в потоке пула: только сетевые запросы, без записи в базу.
+        """
+        result = dict(contracts=None, tenders={}, errors=[])
+        methods = ISSUER_METHODS if item['issuer'] else BENEFICIARY_METHODS
+        result['bundle'] = kontur.fetch_bundle(inn=inn, ogrn=item['ogrn'], methods=methods)
+        if item['issuer']:
+            try:
+                result['contracts'] = zakupki.get_finished_contracts_counts(inn)
+            except Exception as e:
+                logger.warning('Unable to prewarm finished contracts for {}: {}'.format(inn, e))
+                result['errors'].append(e)
+        for gos_number in set(item['issues'].values()):
+            if not gos_number:
+                continue
+            try:
+                result['tenders'][gos_number] = fetch_tender_info(gos_number)
+            except Exception as e:
+                logger.warning('Unable to prewarm tender {}: {}'.format(gos_number, e))
+                result['errors'].append(e)
+        return result
+
+    def apply(self, inn, item, result):
+        bundle = result['bundle']
+        if result['contracts'] is not None:
+            fz44_count, fz223_count = result['contracts']
+            stats = SupplierContractStats.objects.filter(inn=inn).first() or SupplierContractStats(inn=inn)
+            stats.apply_counts(fz44_count, fz223_count)
+            stats.save()
+
+        for issue_id, gos_number in item['issues'].items():
+            snapshot, created = IssueExternalSnapshot.objects.get_or_create(
+                issue_id=issue_id,
+                inn=inn,
+                defaults=dict(ogrn=item['ogrn']),
+            )
+            # уже сохраненные снимки не трогаем: они обновляются только явно
+            changed = False
+            if snapshot.analytics_fetched_at is None and bundle.is_ok('analytics'):
+                snapshot.set_payload('analytics', bundle.analytics)
+                changed = True
+            if snapshot.egr_details_fetched_at is None and bundle.is_ok('egr_details'):
+                snapshot.set_payload('egr_details', bundle.egr_details)
+                changed = True
+            if snapshot.tender_fetched_at is None and gos_number in result['tenders']:
+                snapshot.tender_gos_number = gos_number
+                snapshot.set_payload('tender', result['tenders'][gos_number] or {})
+                changed = True
+            if changed:
+                snapshot.save()
+
+        # удачные ответы сохранены, а контрагент с ошибками не попадает в контрольную точку и будет загружен снова
+        errors = list(bundle.errors.values()) + result['errors']
+        if errors:
+            raise errors[0]
+
+    def handle(self, *args, **options):
+        if options['restart']:
+            cache.delete(CHECKPOINT_KEY)
+        done = set(cache.get(CHECKPOINT_KEY) or [])
+
+        counterparties = self.collect_counterparties()
+        pending = [(inn, item) for inn, item in counterparties.items() if inn not in done]
+        logger.info('Prewarming {} counterparties, {} already done'.format(len(pending), len(counterparties) - len(pending)))
+
+        failed = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            futures = {executor.submit(self.fetch, inn, item): (inn, item) for inn, item in pending}
+            for future in as_completed(futures):
+                inn, item = futures[future]
+                try:
+                    self.apply(inn, item, future.result())
+                except Exception as e:
+                    failed += 1
+                    logger.warning('Unable to prewarm counterparty {}: {}'.format(inn, e))
+                    continue
+                done.add(inn)
+                cache.set(CHECKPOINT_KEY, list(done), settings.PREWARM_COUNTERPARTIES_CHECKPOINT_TTL)
+
+        if not failed:
+            cache.delete(CHECKPOINT_KEY)
+        logger.info('Counterparties prewarmed: {}, failed: {}'.format(len(pending) - failed, failed))
@@ -0,0 +1,67 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from marer.models.external import SupplierContractStats
+from marer.models.issue import Issue
+from marer.utils import zakupki
+
+logger = logging.getLogger('django')
+
+
+class Command(BaseCommand):
+    help = 'Refreshes stale finished contracts counters from zakupki.gov.ru'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-age-hours', type=int, default=settings.SUPPLIER_CONTRACT_STATS_MAX_AGE_HOURS)
+        parser.add_argument('--workers', type=int, default=settings.SUPPLIER_CONTRACT_STATS_REFRESH_WORKERS)
+        parser.add_argument('--limit', type=int, default=None)
+        parser.add_argument('--inn', nargs='*', type=str, default=None)
+
+    def get_inns(self, options):
+        if options.get('inn'):
+            return list(options['inn'])
+
+        known_inns = set(SupplierContractStats.objects.values_list('inn', flat=True))
+        issuers_inns = set(Issue.objects.exclude(issuer_inn='').values_list('issuer_inn', flat=True).distinct())
+        stale_border = timezone.now() - timedelta(hours=options['max_age_hours'])
+        stale_inns = SupplierContractStats.objects.filter(
+            Q(refreshed_at__isnull=True) | Q(refreshed_at__lt=stale_border)
+        ).order_by('refreshed_at').values_list('inn', flat=True)
+
+        inns = sorted(issuers_inns - known_inns) + list(stale_inns)
+        if options.get('limit'):
+            inns = inns[:options['limit']]
+        return inns
+
+    def handle(self, *args, **options):
+        inns = self.get_inns(options)
+        logger.info('Refreshing finished contracts counters for {} suppliers'.format(len(inns)))
+
+        refreshed = 0
+        failed = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            futures = {executor.submit(zakupki.get_finished_contracts_counts, inn): inn for inn in inns}
+            for future in as_completed(futures):
+                inn = futures[future]
+                try:
+                    fz44_count, fz223_count = future.result()
+                except Exception as e:
+                    failed += 1
+                    logger.warning('Unable to refresh finished contracts for {}: {}'.format(inn, e))
+                    continue
+
+                # запись в базу только из основного потока
+                SupplierContractStats.objects.update_or_create(inn=inn, defaults=dict(
+                    fz44_count=fz44_count,
+                    fz223_count=fz223_count,
+                    refreshed_at=timezone.now(),
+                ))
+                refreshed += 1
+
+        logger.info('Finished contracts counters refreshed: {}, failed: {}'.format(refreshed, failed))
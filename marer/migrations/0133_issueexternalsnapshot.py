@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.3 on 2018-03-14 11:20
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marer', '0132_issue_bg_extradition_date'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IssueExternalSnapshot',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('inn', models.CharField(blank=True, default='', max_length=32, verbose_name='ИНН')),
+                ('ogrn', models.CharField(blank=True, default='', max_length=32, verbose_name='ОГРН')),
+                ('analytics', models.TextField(blank=True, default='', verbose_name='аналитика Контур.Фокус')),
+                ('analytics_fetched_at', models.DateTimeField(blank=True, null=True, verbose_name='аналитика получена')),
+                ('egr_details', models.TextField(blank=True, default='', verbose_name='выписка ЕГР Контур.Фокус')),
+                ('egr_details_fetched_at', models.DateTimeField(blank=True, null=True, verbose_name='выписка ЕГР получена')),
+                ('tender_gos_number', models.CharField(blank=True, default='', max_length=512, verbose_name='госномер тендера')),
+                ('tender', models.TextField(blank=True, default='', verbose_name='данные тендера')),
+                ('tender_fetched_at', models.DateTimeField(blank=True, null=True, verbose_name='данные тендера получены')),
+                ('issue', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='external_snapshots', to='marer.Issue')),
+            ],
+            options={
+                'verbose_name': 'снимок внешних данных',
+                'verbose_name_plural': 'снимки внешних данных',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='issueexternalsnapshot',
+            unique_together=set([('issue', 'inn')]),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.3 on 2018-03-15 10:05
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marer', '0133_issueexternalsnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SupplierContractStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('inn', models.CharField(max_length=32, unique=True, verbose_name='ИНН')),
+                ('fz44_count', models.IntegerField(default=0, verbose_name='контрактов по 44-ФЗ')),
+                ('fz223_count', models.IntegerField(default=0, verbose_name='контрактов по 223-ФЗ')),
+                ('refreshed_at', models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='обновлено')),
+            ],
+            options={
+                'verbose_name': 'статистика контрактов поставщика',
+                'verbose_name_plural': 'статистика контрактов поставщиков',
+            },
+        ),
+    ]
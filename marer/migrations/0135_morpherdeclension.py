@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.3 on 2018-03-16 12:40
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marer', '0134_suppliercontractstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MorpherDeclension',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('text_hash', models.CharField(max_length=64, unique=True, verbose_name='хеш строки')),
+                ('text', models.TextField(verbose_name='строка')),
+                ('response', models.TextField(verbose_name='ответ сервиса')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='добавлено')),
+            ],
+            options={
+                'verbose_name': 'склонение',
+                'verbose_name_plural': 'словарь склонений',
+            },
+        ),
+    ]
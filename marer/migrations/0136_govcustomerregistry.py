@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.3 on 2018-03-19 09:30
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marer', '0135_morpherdeclension'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GovCustomerRegistry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('inn', models.CharField(max_length=32, unique=True, verbose_name='ИНН')),
+                ('kpp', models.CharField(blank=True, default='', max_length=32, verbose_name='КПП')),
+                ('ogrn', models.CharField(blank=True, default='', max_length=32, verbose_name='ОГРН')),
+                ('reg_number', models.CharField(blank=True, default='', max_length=32, verbose_name='реестровый номер')),
+                ('full_name', models.TextField(blank=True, default='', verbose_name='полное наименование')),
+                ('source', models.CharField(choices=[('registry', 'выгрузка реестра'), ('rss', 'поиск на zakupki.gov.ru')], default='registry', max_length=16, verbose_name='источник')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='обновлено')),
+            ],
+            options={
+                'verbose_name': 'государственный заказчик',
+                'verbose_name_plural': 'реестр государственных заказчиков',
+            },
+        ),
+    ]
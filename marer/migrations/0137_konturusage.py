@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.3 on 2018-03-20 15:10
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marer', '0136_govcustomerregistry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KonturUsage',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='дата')),
+                ('method', models.CharField(max_length=64, verbose_name='метод API')),
+                ('count', models.IntegerField(default=0, verbose_name='количество запросов')),
+            ],
+            options={
+                'verbose_name': 'запросы к Контур.Фокусу',
+                'verbose_name_plural': 'расход квоты Контур.Фокуса',
+                'ordering': ('-date', 'method'),
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='konturusage',
+            unique_together=set([('date', 'method')]),
+        ),
+    ]
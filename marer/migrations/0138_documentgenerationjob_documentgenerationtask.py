@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.3 on 2018-03-21 11:40
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marer', '0137_konturusage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentGenerationJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'В очереди'), ('running', 'Формируется'), ('done', 'Готово'), ('failed', 'Ошибка')], default='pending', max_length=32, verbose_name='статус')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='создано')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='завершено')),
+                ('issue', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='document_generation_jobs', to='marer.Issue')),
+            ],
+            options={
+                'verbose_name': 'формирование документов',
+                'verbose_name_plural': 'формирование документов',
+            },
+        ),
+        migrations.CreateModel(
+            name='DocumentGenerationTask',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('issue_field', models.CharField(max_length=64, verbose_name='поле заявки')),
+                ('template_path', models.CharField(max_length=512, verbose_name='шаблон')),
+                ('file_name', models.CharField(max_length=512, verbose_name='имя файла')),
+                ('status', models.CharField(choices=[('pending', 'В очереди'), ('running', 'Формируется'), ('done', 'Готово'), ('failed', 'Ошибка')], default='pending', max_length=32, verbose_name='статус')),
+                ('error', models.TextField(blank=True, default='', verbose_name='ошибка')),
+                ('worker', models.CharField(blank=True, default='', max_length=64, verbose_name='обработчик')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='начато')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='завершено')),
+                ('document', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='marer.Document')),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tasks', to='marer.DocumentGenerationJob')),
+            ],
+            options={
+                'verbose_name': 'документ к формированию',
+                'verbose_name_plural': 'документы к формированию',
+            },
+        ),
+    ]
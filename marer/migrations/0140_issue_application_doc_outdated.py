@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.3 on 2018-03-23 11:40
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marer', '0139_document_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='issue',
+            name='application_doc_outdated',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.3 on 2018-03-26 10:15
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marer', '0140_issue_application_doc_outdated'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='issue',
+            name='application_doc_valid_until',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+    ]
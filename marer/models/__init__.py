@@ -3,6 +3,8 @@ from django.contrib.auth.models import AbstractUser
 from marer.models.base import *
 from marer.models.base import finance_products_page_images_upload_path, news_pictures_upload_path, \
     showcase_partners_logos_upload_path
+from marer.models.external import *
 from marer.models.issue import *
+from marer.models.document_job import *
 from marer.models.issuer import *
 from marer.models.user import *
@@ -6,13 +6,14 @@ import uuid
 from logging import warning
 
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
 from django.utils.encoding import force_str, force_text
 from django.utils import timezone
 from mptt import models as mptt_models
 from mptt.fields import TreeForeignKey
 
 from marer import consts
+from marer.utils.other import file_content_hash, file_sha256
 
 __all__ = ['Document', 'Region', 'RegionKLADRCode', 'BankMinimalCommission']
 
@@ -29,6 +30,17 @@ def documents_upload_path(instance, filename):
     return new_filename
 
 
+def content_addressed_path(digest: str, filename: str) -> str:
+    new_filename = 'documents/sha256/{prefix}/{digest}/{file_name}'.format(
+        prefix=digest[:2],
+        digest=digest,
+        file_name=filename,
+    )
+    new_filename = force_text(new_filename)
+    new_filename = os.path.normpath(new_filename)
+    return new_filename
+
+
 def finance_products_page_images_upload_path(instance, filename):
     filename_arr = str(filename).split('.')
     ext = filename_arr[-1]
@@ -69,10 +81,20 @@ def showcase_partners_logos_upload_path(instance, filename):
 
 
 def set_obj_update_time(obj, updated_at_field='updated_at'):
+    """
+    Обновляет время изменения объекта одним UPDATE этого столбца, без save() и его побочных действий.
+    В транзакции повторные вызовы для того же объекта объединяются в один UPDATE при фиксации.
+    """
     if obj:
         if hasattr(obj, updated_at_field):
-            setattr(obj, updated_at_field, timezone.now())
-            obj.save()
+            updated_at = timezone.now()
+            setattr(obj, updated_at_field, updated_at)
+            if obj.pk is None:
+                obj.save()
+                return
+            if isinstance(obj, TrackedFieldsModel):
+                obj._saved_field_values[obj._meta.get_field(updated_at_field).attname] = updated_at
+            _touch_on_commit(type(obj)._default_manager, obj.pk, updated_at_field)
         else:
             warning('Object {} got no field called {} for update time there'.format(
                 obj, updated_at_field))
@@ -80,6 +102,79 @@ def set_obj_update_time(obj, updated_at_field='updated_at'):
         warning('Got none object for set update time', stacklevel=3)
 
 
+def _touch_on_commit(manager, pk, updated_at_field):
+    key = (manager.model._meta.label, pk, updated_at_field)
+    connection = transaction.get_connection()
+    # обновление уже ждет фиксации этой транзакции; при откате Django сам убирает его из run_on_commit
+    if connection.in_atomic_block and any(getattr(func, 'touch_key', None) == key for _, func in connection.run_on_commit):
+        return
+
+    def touch():
+        manager.filter(pk=pk).update(**{updated_at_field: timezone.now()})
+
+    touch.touch_key = key
+    transaction.on_commit(touch)
+
+
+class TrackedFieldsModel(models.Model):
+    """
+    Модель помнит значения полей на момент загрузки или последнего сохранения.
+    Существующая запись сохраняется UPDATE только измененных столбцов и полей auto_now;
+    full_save=True или явный update_fields сохраняют как обычно.
+    """
+    class Meta:
+        abstract = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._saved_field_values = self.get_field_values()
+
+    def get_field_values(self) -> dict:
+        return {f.attname: self.__dict__[f.attname] for f in self._meta.concrete_fields if f.attname in self.__dict__}
+
+    def get_changed_fields(self) -> set:
+        """
+        Поля, измененные с момента загрузки или последнего сохранения.
+        """
+        changed = set()
+        for field in self._meta.concrete_fields:
+            if field.attname not in self.__dict__:
+                continue
+            if field.attname not in self._saved_field_values or self._saved_field_values[field.attname] != self.__dict__[field.attname]:
+                changed.add(field.name)
+        return changed
+
+    def get_update_fields(self):
+        """
+        Столбцы для UPDATE существующей записи; None — сохранять все.
+        """
+        if self._state.adding or self.pk is None:
+            return None
+        changed = self.get_changed_fields()
+        auto_now = {f.name for f in self._meta.concrete_fields if getattr(f, 'auto_now', False)}
+        # без изменений и без auto_now запись сохраняется целиком, чтобы не пропустить сигналы сохранения
+        return (changed | auto_now) or None
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using, fields)
+        field_values = self.get_field_values()
+        if fields is not None:
+            loaded = {self._meta.get_field(name).attname for name in fields}
+            field_values = {attname: value for attname, value in field_values.items() if attname in loaded}
+        self._saved_field_values.update(field_values)
+
+    def save(self, force_insert=False, force_update=False, using=None, update_fields=None, full_save=False):
+        if update_fields is None and not force_insert and not full_save:
+            update_fields = self.get_update_fields()
+        super().save(force_insert, force_update, using, update_fields)
+        field_values = self.get_field_values()
+        if update_fields is not None:
+            # несохраненные столбцы остаются измененными до следующего сохранения
+            saved = {self._meta.get_field(name).attname for name in update_fields}
+            field_values = {attname: value for attname, value in field_values.items() if attname in saved}
+        self._saved_field_values.update(field_values)
+
+
 class Document(models.Model):
 
     file = models.FileField(upload_to=documents_upload_path, max_length=512)
@@ -90,6 +185,36 @@ class Document(models.Model):
         (consts.DOCUMENT_SIGN_CORRUPTED, 'Неверна'),
         (consts.DOCUMENT_SIGN_VERIFIED, 'Проверена'),
     ])
+    # канонический хеш содержимого, см. file_content_hash
+    content_hash = models.CharField(max_length=64, blank=True, null=False, default='', db_index=True)
+
+    def get_content_hash(self) -> str:
+        """
+        Для документов, сохраненных до появления хеша, он считается по файлу и запоминается.
+        """
+        if not self.content_hash and self.file and self.id:
+            try:
+                with self.file.storage.open(self.file.name, 'rb') as f:
+                    self.content_hash = file_content_hash(f, self.file.name)
+            except (IOError, OSError):
+                return ''
+            Document.objects.filter(id=self.id).update(content_hash=self.content_hash)
+        return self.content_hash
+
+    def _store_file_by_content(self):
+        """
+        Новый файл кладется по адресу от sha256 его байтов; если такой файл
+        уже загружен, документ ссылается на него без повторной записи.
+        """
+        content = self.file.file
+        self.content_hash = file_content_hash(content, self.file.name)
+        digest = file_sha256(content)
+        storage = self.file.storage
+        path = storage.generate_filename(content_addressed_path(digest, os.path.basename(self.file.name)))
+        if not storage.exists(path):
+            path = storage.save(path, content)
+        self.file.name = path
+        self.file._committed = True
 
     def base64_content(self):
         if self.file and os.path.exists(self.file.path) and os.path.isfile(self.file.path):
@@ -99,6 +224,8 @@ class Document(models.Model):
             return ''
 
     def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
+        if self.file and not self.file._committed:
+            self._store_file_by_content()
         super().save(force_insert, force_update, using, update_fields)
         if not self.sign and self.sign_state != consts.DOCUMENT_SIGN_NONE:
             self.sign_state = consts.DOCUMENT_SIGN_NONE
@@ -0,0 +1,116 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+
+from marer import consts
+from marer.models.base import Document
+from marer.models.issue import Issue
+
+
+__all__ = ['DocumentGenerationJob', 'DocumentGenerationTask']
+
+
+class DocumentGenerationJob(models.Model):
+    """
+    Пакет документов заявки, который формирует фоновый обработчик docworker.
+    """
+    class Meta:
+        verbose_name = 'формирование документов'
+        verbose_name_plural = 'формирование документов'
+
+    issue = models.ForeignKey(Issue, on_delete=models.CASCADE, blank=False, null=False, related_name='document_generation_jobs')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, verbose_name='пользователь', on_delete=models.SET_NULL, blank=True, null=True, related_name='+')
+    status = models.CharField(verbose_name='статус', max_length=32, blank=False, null=False, default=consts.DOCUMENT_JOB_STATUS_PENDING, choices=consts.DOCUMENT_JOB_STATUS_CHOICES)
+    created_at = models.DateTimeField(verbose_name='создано', auto_now_add=True, null=False)
+    finished_at = models.DateTimeField(verbose_name='завершено', blank=True, null=True)
+
+    def __str__(self):
+        return 'документы заявки {} ({})'.format(self.issue_id, self.get_status_display())
+
+    def get_progress(self):
+        counts = dict(self.tasks.values_list('status').annotate(count=models.Count('id')))
+        return dict(
+            total=sum(counts.values()),
+            done=counts.get(consts.DOCUMENT_JOB_STATUS_DONE, 0),
+            failed=counts.get(consts.DOCUMENT_JOB_STATUS_FAILED, 0),
+        )
+
+    def refresh_status(self):
+        """
+        Пересчитывает статус пакета по задачам; вызывается после завершения каждой задачи.
+        Задачи пакета завершаются в разных процессах почти одновременно, поэтому статус
+        меняется только вперед: опоздавший пересчет не вернет завершенный пакет в работу.
+        """
+        progress = self.get_progress()
+        if progress['done'] + progress['failed'] < progress['total']:
+            status = consts.DOCUMENT_JOB_STATUS_RUNNING
+            finished_at = None
+            previous_statuses = [consts.DOCUMENT_JOB_STATUS_PENDING]
+        else:
+            status = consts.DOCUMENT_JOB_STATUS_FAILED if progress['failed'] else consts.DOCUMENT_JOB_STATUS_DONE
+            finished_at = timezone.now()
+            previous_statuses = [consts.DOCUMENT_JOB_STATUS_PENDING, consts.DOCUMENT_JOB_STATUS_RUNNING]
+        updated = DocumentGenerationJob.objects.filter(id=self.id, status__in=previous_statuses).update(
+            status=status,
+            finished_at=finished_at,
+        )
+        if updated:
+            self.status = status
+        else:
+            self.status = DocumentGenerationJob.objects.values_list('status', flat=True).get(id=self.id)
+
+
+class DocumentGenerationTask(models.Model):
+    """
+    Один документ пакета: шаблон, имя файла и поле заявки, в которое попадет результат.
+    """
+    class Meta:
+        verbose_name = 'документ к формированию'
+        verbose_name_plural = 'документы к формированию'
+
+    job = models.ForeignKey(DocumentGenerationJob, on_delete=models.CASCADE, blank=False, null=False, related_name='tasks')
+    issue_field = models.CharField(verbose_name='поле заявки', max_length=64, blank=False, null=False)
+    template_path = models.CharField(verbose_name='шаблон', max_length=512, blank=False, null=False)
+    file_name = models.CharField(verbose_name='имя файла', max_length=512, blank=False, null=False)
+    status = models.CharField(verbose_name='статус', max_length=32, blank=False, null=False, default=consts.DOCUMENT_JOB_STATUS_PENDING, choices=consts.DOCUMENT_JOB_STATUS_CHOICES)
+    document = models.ForeignKey(Document, on_delete=models.SET_NULL, blank=True, null=True, related_name='+')
+    error = models.TextField(verbose_name='ошибка', blank=True, null=False, default='')
+    worker = models.CharField(verbose_name='обработчик', max_length=64, blank=True, null=False, default='')
+    started_at = models.DateTimeField(verbose_name='начато', blank=True, null=True)
+    finished_at = models.DateTimeField(verbose_name='завершено', blank=True, null=True)
+
+    def __str__(self):
+        return self.file_name
+
+    @classmethod
+    def claim(cls, limit: int, worker: str) -> list:
+        """
+        Забирает до limit задач из очереди. Задача достается только тому
+        обработчику, чей update перевел ее из очереди в работу.
+        """
+        claimed = []
+        candidates = cls.objects.filter(status=consts.DOCUMENT_JOB_STATUS_PENDING).order_by('id').values_list('id', flat=True)
+        for task_id in candidates[:limit * 2]:
+            updated = cls.objects.filter(id=task_id, status=consts.DOCUMENT_JOB_STATUS_PENDING).update(
+                status=consts.DOCUMENT_JOB_STATUS_RUNNING,
+                worker=worker,
+                started_at=timezone.now(),
+            )
+            if updated:
+                claimed.append(task_id)
+            if len(claimed) >= limit:
+                break
+        return claimed
+
+    @classmethod
+    def requeue_stale(cls, timeout_seconds: int) -> int:
+        """
+        Возвращает в очередь задачи, обработчик которых завис или был остановлен.
+        """
+        started_before = timezone.now() - timedelta(seconds=timeout_seconds)
+        return cls.objects.filter(
+            status=consts.DOCUMENT_JOB_STATUS_RUNNING,
+            started_at__lt=started_before,
+        ).update(status=consts.DOCUMENT_JOB_STATUS_PENDING, worker='', started_at=None)
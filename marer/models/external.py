@@ -0,0 +1,129 @@
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
+from django.utils import timezone
+
+
+__all__ = ['SupplierContractStats', 'MorpherDeclension', 'GovCustomerRegistry', 'KonturUsage']
+
+
+class SupplierContractStats(models.Model):
+    """
+    Локальная копия количества исполненных контрактов поставщика с zakupki.gov.ru.
+    Обновляется командой refresh_contract_stats.
+    """
+    class Meta:
+        verbose_name = 'статистика контрактов поставщика'
+        verbose_name_plural = 'статистика контрактов поставщиков'
+
+    inn = models.CharField(verbose_name='ИНН', max_length=32, blank=False, null=False, unique=True)
+    fz44_count = models.IntegerField(verbose_name='контрактов по 44-ФЗ', blank=False, null=False, default=0)
+    fz223_count = models.IntegerField(verbose_name='контрактов по 223-ФЗ', blank=False, null=False, default=0)
+    refreshed_at = models.DateTimeField(verbose_name='обновлено', blank=True, null=True, db_index=True)
+
+    def __str__(self):
+        return self.inn
+
+    @property
+    def total_count(self):
+        return self.fz44_count + self.fz223_count
+
+    @property
+    def is_known(self):
+        return self.refreshed_at is not None
+
+    def apply_counts(self, fz44_count: int, fz223_count: int):
+        self.fz44_count = fz44_count
+        self.fz223_count = fz223_count
+        self.refreshed_at = timezone.now()
+
+    @classmethod
+    def get_for_inn(cls, inn: str):
+        """
+        Возвращает статистику из базы без обращения к zakupki.gov.ru; для ещё
+        неизвестного ИНН - пустую несохраненную. Загружают статистику
+        Issue.prefetch_external_data и команды refresh_contract_stats, prewarm_counterparties.
+        """
+        return cls.objects.filter(inn=inn).first() or cls(inn=inn)
+
+    @classmethod
+    def store_counts(cls, inn: str, fz44_count: int, fz223_count: int):
+        stats, created = cls.objects.update_or_create(inn=inn, defaults=dict(
+            fz44_count=fz44_count,
+            fz223_count=fz223_count,
+            refreshed_at=timezone.now(),
+        ))
+        return stats
+
+
+class MorpherDeclension(models.Model):
+    """
+    Полный ответ ws3.morpher.ru по нормализованной строке, со всеми падежами.
+    """
+    class Meta:
+        verbose_name = 'склонение'
+        verbose_name_plural = 'словарь склонений'
+
+    text_hash = models.CharField(verbose_name='хеш строки', max_length=64, blank=False, null=False, unique=True)
+    text = models.TextField(verbose_name='строка', blank=False, null=False)
+    response = models.TextField(verbose_name='ответ сервиса', blank=False, null=False)
+    created_at = models.DateTimeField(verbose_name='добавлено', auto_now_add=True, null=False)
+
+    def __str__(self):
+        return self.text
+
+
+class GovCustomerRegistry(models.Model):
+    """
+    Заказчики из сводного реестра zakupki.gov.ru. Загружается командой
+    load_gov_customers, дополняется найденными через поиск организаций.
+    """
+    class Meta:
+        verbose_name = 'государственный заказчик'
+        verbose_name_plural = 'реестр государственных заказчиков'
+
+    SOURCE_REGISTRY = 'registry'
+    SOURCE_RSS = 'rss'
+
+    inn = models.CharField(verbose_name='ИНН', max_length=32, blank=False, null=False, unique=True)
+    kpp = models.CharField(verbose_name='КПП', max_length=32, blank=True, null=False, default='')
+    ogrn = models.CharField(verbose_name='ОГРН', max_length=32, blank=True, null=False, default='')
+    reg_number = models.CharField(verbose_name='реестровый номер', max_length=32, blank=True, null=False, default='')
+    full_name = models.TextField(verbose_name='полное наименование', blank=True, null=False, default='')
+    source = models.CharField(verbose_name='источник', max_length=16, blank=False, null=False, choices=[
+        (SOURCE_REGISTRY, 'выгрузка реестра'),
+        (SOURCE_RSS, 'поиск на zakupki.gov.ru'),
+    ], default=SOURCE_REGISTRY)
+    updated_at = models.DateTimeField(verbose_name='обновлено', auto_now=True, null=False)
+
+    def __str__(self):
+        return '{}, ИНН {}'.format(self.full_name, self.inn)
+
+
+class KonturUsage(models.Model):
+    """
+    Суточный учет платных запросов к Контур.Фокусу по методам API.
+    """
+    class Meta:
+        verbose_name = 'запросы к Контур.Фокусу'
+        verbose_name_plural = 'расход квоты Контур.Фокуса'
+        unique_together = (('date', 'method'),)
+        ordering = ('-date', 'method')
+
+    date = models.DateField(verbose_name='дата', blank=False, null=False)
+    method = models.CharField(verbose_name='метод API', max_length=64, blank=False, null=False)
+    count = models.IntegerField(verbose_name='количество запросов', blank=False, null=False, default=0)
+
+    def __str__(self):
+        return '{} {}'.format(self.date, self.method)
+
+    @classmethod
+    def record(cls, method: str, count: int=1):
+        today = timezone.localdate()
+        if cls.objects.filter(date=today, method=method).update(count=F('count') + count):
+            return
+        try:
+            # точка сохранения: ошибка вставки не должна ломать внешнюю транзакцию
+            with transaction.atomic():
+                cls.objects.create(date=today, method=method, count=count)
+        except IntegrityError:
+            cls.objects.filter(date=today, method=method).update(count=F('count') + count)
@@ -1,16 +1,19 @@
 import json
+import logging
 import warnings
 import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
+from functools import partial
 
-import feedparser
-import requests
 from dateutil.relativedelta import relativedelta
 from django.conf import settings
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import connection, models, transaction
 from django.db.models import Q
-from django.db.models.signals import pre_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.urls import reverse
 from django.utils import timezone
@@ -19,25 +22,32 @@ from django.utils.functional import cached_property
 from django.utils.timezone import now
 
 from marer import consts
-from marer.models.base import Document, set_obj_update_time, FormOwnership
+from marer.models.base import Document, FormOwnership, TrackedFieldsModel, _touch_on_commit
+from marer.models.external import SupplierContractStats, GovCustomerRegistry
 from marer.models.finance_org import FinanceOrgProductProposeDocument
 from marer.models.issuer import Issuer, IssuerDocument
 from marer.products import get_urgency_hours, get_urgency_days, get_finance_products_as_choices, FinanceProduct, get_finance_products, BankGuaranteeProduct
-from marer.utils import CustomJSONEncoder, kontur
-from marer.utils.issue import calculate_bank_commission, sum_str_format, generate_bg_number, issue_term_in_months, \
-    calculate_effective_rate, CalculateUnderwritingCriteria
+from marer.utils import CustomJSONEncoder, kontur, zakupki
+from marer.utils.formatting import sum_str_format, generate_bg_number
+from marer.utils.issue import calculate_bank_commission, issue_term_in_months, calculate_effective_rate, \
+    CalculateUnderwritingCriteria
 from marer.utils.morph import MorpherApi
-from marer.utils.other import OKOPF_CATALOG, get_tender_info, are_docx_files_identical
+from marer.utils.other import OKOPF_CATALOG, fetch_tender_info, file_content_hash
+from marer.utils.outbound import get_client, get_feed
+from marer.utils.side_effects import SideEffectRegistry
 from marer.utils.datetime_utils import today, month_difference_from_today
 
+logger = logging.getLogger('django')
+
+ISSUE_SAVE_EFFECTS = SideEffectRegistry()
 
 __all__ = [
     'Issue', 'IssueDocument', 'IssueClarification', 'IssueMessagesProxy',
-    'IssueClarificationMessage', 'IssueFinanceOrgProposeClarificationMessageDocument'
+    'IssueClarificationMessage', 'IssueFinanceOrgProposeClarificationMessageDocument', 'IssueExternalSnapshot',
 ]
 
 
-class Issue(models.Model):
+class Issue(TrackedFieldsModel):
     class Meta:
         verbose_name = 'заявка'
         verbose_name_plural = 'заявки'
@@ -563,9 +573,139 @@ class Issue(models.Model):
     def humanized_is_bg_limit_exceeded_max(self):
         return 'Да' if self.bg_sum > 18000000 else 'Нет'
 
+    def get_external_snapshot(self, inn: str, ogrn: str=None):
+        """
+        Снимок внешних данных по контрагенту заявки. Для несохраненной заявки
+        снимок живет только в памяти.
+        """
+        inn = inn or ''
+        snapshots = self.__dict__.setdefault('_external_snapshots', {})
+        snapshot = snapshots.get(inn)
+        if snapshot is None:
+            if self.pk:
+                snapshot, created = IssueExternalSnapshot.objects.get_or_create(
+                    issue=self,
+                    inn=inn,
+                    defaults=dict(ogrn=ogrn or ''),
+                )
+            else:
+                snapshot = IssueExternalSnapshot(issue=self, inn=inn, ogrn=ogrn or '')
+            if ogrn and snapshot.ogrn != ogrn:
+                # данные Контур.Фокуса получены по прежнему ОГРН и загрузятся заново
+                snapshot.ogrn = ogrn
+                snapshot.analytics_fetched_at = None
+                snapshot.egr_details_fetched_at = None
+                if snapshot.pk:
+                    snapshot.save()
+            snapshots[inn] = snapshot
+        return snapshot
+
+    @property
+    def issuer_snapshot(self):
+        return self.get_external_snapshot(self.issuer_inn, self.issuer_ogrn)
+
+    @property
+    def beneficiary_snapshot(self):
+        return self.get_external_snapshot(self.tender_responsible_inn, self.tender_responsible_ogrn)
+
+    def prefetch_external_data(self, sources):
+        """
+        Параллельно загружает внешние данные для свойств заявки. В потоках
+        выполняются только запросы к сервисам, снимки и статистика сохраняются здесь.
+        :param sources: declension, contracts, issuer_analytics, issuer_egr_details,
+            beneficiary_analytics, beneficiary_tender
+        """
+        tasks = {}
+        if 'declension' in sources and 'bg_property' not in self.__dict__:
+            tasks['declension'] = partial(MorpherApi.prefetch, self.get_declension_texts())
+        if 'contracts' in sources and self.issuer_inn and 'finished_contracts_count' not in self.__dict__ \
+                and not SupplierContractStats.objects.filter(inn=self.issuer_inn).exists():
+            tasks['contracts'] = partial(zakupki.get_finished_contracts_counts, self.issuer_inn)
+
+        snapshots = {}
+        snapshot_methods = {}
+        for side in ('issuer', 'beneficiary'):
+            methods = [m for m in ('analytics', 'egr_details') if '{}_{}'.format(side, m) in sources]
+            if not methods and not (side == 'beneficiary' and 'beneficiary_tender' in sources):
+                continue
+            snapshot = getattr(self, side + '_snapshot')
+            snapshots[side] = snapshot
+            methods = [m for m in methods if getattr(snapshot, m + '_fetched_at') is None]
+            if methods and snapshot.inn:
+                snapshot_methods[side] = methods
+                tasks[side] = partial(kontur.fetch_bundle, inn=snapshot.inn, ogrn=snapshot.ogrn, methods=methods)
+        if 'beneficiary' in snapshots and 'beneficiary_tender' in sources and self.tender_gos_number:
+            snapshot = snapshots['beneficiary']
+            if snapshot.tender_fetched_at is None or snapshot.tender_gos_number != self.tender_gos_number:
+                tasks['tender'] = partial(fetch_tender_info, self.tender_gos_number)
+
+        if not tasks:
+            return
+        with ThreadPoolExecutor(max_workers=len(tasks)) as executor:
+            futures = {name: executor.submit(_run_closing_connection, task) for name, task in tasks.items()}
+        results = {}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                # при обычном вычислении свойства запрос повторится и ошибка проявится там же, где и раньше
+                logger.warning('Unable to prefetch {} for issue {}: {}'.format(name, self.id, e))
+
+        if 'contracts' in results:
+            SupplierContractStats.store_counts(self.issuer_inn, *results['contracts'])
+        changed = set()
+        for side, snapshot in snapshots.items():
+            bundle = results.get(side)
+            if bundle is None:
+                continue
+            for method in snapshot_methods[side]:
+                if bundle.is_ok(method):
+                    snapshot.set_payload(method, getattr(bundle, method))
+                    changed.add(side)
+        if 'tender' in results:
+            snapshots['beneficiary'].tender_gos_number = self.tender_gos_number
+            snapshots['beneficiary'].set_payload('tender', results['tender'] or {})
+            changed.add('beneficiary')
+        for side in changed:
+            if snapshots[side].issue_id:
+                snapshots[side].save()
+
+    def refresh_external_snapshots(self):
+        self.issuer_snapshot.refresh()
+        self.beneficiary_snapshot.refresh(tender_gos_number=self.tender_gos_number)
+        self.__dict__.pop('check_not_stop_factors', None)
+        self.__dict__.pop('check_stop_factors_validity', None)
+
+    def external_snapshots_admin_field(self):
+        field_parts = []
+        for title, snapshot in (('заявитель', self.issuer_snapshot), ('бенефициар', self.beneficiary_snapshot)):
+            fetched_at = snapshot.analytics_fetched_at
+            field_parts.append('{}: {}'.format(
+                title,
+                timezone.localtime(fetched_at).strftime('%d.%m.%Y %H:%M') if fetched_at else 'не загружены',
+            ))
+        url = reverse('admin:marer_issue_refresh_external_snapshots', args=(self.id,))
+        field_parts.append('<b><a href="{}">обновить</a></b>'.format(url))
+        return ', '.join(field_parts)
+    external_snapshots_admin_field.short_description = 'данные внешних сервисов'
+    external_snapshots_admin_field.allow_tags = True
+
+    def document_jobs_admin_field(self):
+        job = self.document_generation_jobs.order_by('-id').first() if self.id else None
+        if job is None:
+            return '—'
+        progress = job.get_progress()
+        return '{}: {} из {}{}'.format(
+            job.get_status_display(),
+            progress['done'],
+            progress['total'],
+            ', ошибок: {}'.format(progress['failed']) if progress['failed'] else '',
+        )
+    document_jobs_admin_field.short_description = 'формирование актов'
+
     @property
     def issuer_presence_in_unfair_suppliers_registry(self):
-        kontur_principal_analytics_data = kontur.analytics(inn=self.issuer_inn, ogrn=self.issuer_ogrn).get('analytics', {})
+        kontur_principal_analytics_data = self.issuer_snapshot.get_analytics().get('analytics', {})
         return kontur_principal_analytics_data.get('m4001', False)
 
     @property
@@ -574,7 +714,7 @@ class Issue(models.Model):
 
     @property
     def is_issuer_liquidating_or_bankrupt(self):
-        kontur_principal_analytics_data = kontur.analytics(inn=self.issuer_inn, ogrn=self.issuer_ogrn).get('analytics', {})
+        kontur_principal_analytics_data = self.issuer_snapshot.get_analytics().get('analytics', {})
         return kontur_principal_analytics_data.get('m7014', False)
 
     @property
@@ -585,7 +725,7 @@ class Issue(models.Model):
     def is_issuer_present_in_terrorists_list(self):
         url = 'http://www.fedsfm.ru/TerroristSearch'
         json = dict(pageLength=50, rowIndex=0, searchText=self.issuer_inn)
-        result = requests.post(url, json=json).json()
+        result = get_client('fedsfm').post(url, json=json).json()
         if result.get('IsError', False) and result.get('recordsTotal', 1) == 0:
             return False
         elif result.get('IsError', False) and result.get('recordsTotal', 1) > 0:
@@ -820,6 +960,10 @@ class Issue(models.Model):
         blank=True,
         related_name='application_docs_links'
     )
+    # выставляется при изменении связанных наборов, которые выводятся в заявлении
+    application_doc_outdated = models.BooleanField(default=False, editable=False)
+    # с этой даты перестанет действовать одна из лицензий, выведенных в заявлении
+    application_doc_valid_until = models.DateField(null=True, blank=True, editable=False)
     prev_signed_application_doc = models.ForeignKey(
         Document,
         on_delete=models.SET_NULL,
@@ -961,13 +1105,9 @@ class Issue(models.Model):
 
     @cached_property
     def finished_contracts_count(self):
-        url = 'http://zakupki.gov.ru/epz/contract/extendedsearch/rss?openMode=USE_DEFAULT_PARAMS&pageNumber=1&sortDirection=false&recordsPerPage=_50&sortBy=PO_DATE_OBNOVLENIJA&fz44=on&fz94=on&priceFrom=0&priceTo=200000000000&advancePercentFrom=hint&advancePercentTo=hint&contractStageList_1=on&contractStageList=1&supplierTitle=%s' % self.issuer_inn
-        data = feedparser.parse(url)
-        fz_44_contracts = len(data['entries'])
-        url = 'http://zakupki.gov.ru/epz/contractfz223/extendedSearch/rss?morphology=on&pageNumber=1&sortDirection=false&recordsPerPage=_10&statuses_1=on&statuses=1&supplierTitle=%s&currencyId=1&sortBy=BY_UPDATE_DATE' % self.issuer_inn
-        data = feedparser.parse(url)
-        fz_223_contracts = len(data['entries'])
-        return fz_44_contracts + fz_223_contracts
+        if not self.issuer_inn:
+            return 0
+        return SupplierContractStats.get_for_inn(self.issuer_inn).total_count
 
     @cached_property
     def passed_prescoring(self):
@@ -1040,7 +1180,7 @@ class Issue(models.Model):
     def humanized_custom_if_need_additionally_contract_guarantee_issue_with_cost(self):
         if self.bg_type == consts.BG_TYPE_APPLICATION_ENSURE and self.tender_gos_number:
             try:
-                tender_info = get_tender_info(self.tender_gos_number)
+                tender_info = self.beneficiary_snapshot.get_tender(self.tender_gos_number)
                 if tender_info and type(tender_info) == dict:
                     contract_ensure_cost = tender_info['contract_execution_ensure_cost']
                     if contract_ensure_cost and contract_ensure_cost > 0:
@@ -1209,7 +1349,7 @@ class Issue(models.Model):
 
     @property
     def last_account_period_net_assets_great_than_authorized_capital(self):
-        details = kontur.egrDetails(inn=self.issuer_inn, ogrn=self.issuer_ogrn)
+        details = self.issuer_snapshot.get_egr_details()
         authorized_capital = 0
         if details and details.get('UL', False):
             authorized_capital = details.get('UL', {}).get('statedCapital', {}).get('sum', 0)
@@ -1335,29 +1475,30 @@ class Issue(models.Model):
     def beneficiaries_owner(self):
         return list(self.org_beneficiary_owners.order_by('id').all())
 
+    # наборы читаются через all(), чтобы использовать prefetch_related_objects при заполнении документов
     @cached_property
     def management_collegial_org_name(self):
-        return '\n'.join(list(self.org_management_collegial.all().values_list('org_name', flat=True)))
+        return '\n'.join([m.org_name for m in self.org_management_collegial.all()])
 
     @cached_property
     def management_collegial_fio(self):
-        return '\n'.join(list(self.org_management_collegial.all().values_list('fio', flat=True)))
+        return '\n'.join([m.fio for m in self.org_management_collegial.all()])
 
     @cached_property
     def management_directors_org_name(self):
-        return '\n'.join(list(self.org_management_directors.all().values_list('org_name', flat=True)))
+        return '\n'.join([m.org_name for m in self.org_management_directors.all()])
 
     @cached_property
     def management_directors_fio(self):
-        return '\n'.join(list(self.org_management_directors.all().values_list('fio', flat=True)))
+        return '\n'.join([m.fio for m in self.org_management_directors.all()])
 
     @cached_property
     def management_others_org_name(self):
-        return '\n'.join(list(self.org_management_others.all().values_list('org_name', flat=True)))
+        return '\n'.join([m.org_name for m in self.org_management_others.all()])
 
     @cached_property
     def management_others_fio(self):
-        return '\n'.join(list(self.org_management_others.all().values_list('fio', flat=True)))
+        return '\n'.join([m.fio for m in self.org_management_others.all()])
 
     @cached_property
     def bank_accounts(self):
@@ -1369,13 +1510,15 @@ class Issue(models.Model):
 
     @cached_property
     def founders_with_25_share(self):
-        data = list(self.issuer_founders_legal.all().values('name', 'auth_capital_percentage'))
-        physical = list(self.issuer_founders_physical.all().values('fio', 'auth_capital_percentage'))
+        data = [{
+            'name': f.name,
+            'auth_capital_percentage': f.auth_capital_percentage
+        } for f in self.issuer_founders_legal.all()]
         # добираем данные с переименовкой поля для одинакового вывода
         data += [{
-            'name': f['fio'],
-            'auth_capital_percentage': f['auth_capital_percentage']
-        } for f in physical]
+            'name': f.fio,
+            'auth_capital_percentage': f.auth_capital_percentage
+        } for f in self.issuer_founders_physical.all()]
         return data
 
     @cached_property
@@ -1386,6 +1529,19 @@ class Issue(models.Model):
     def issuer_affiliates_with_bank_liabilities(self):
         return [obj.__dict__ for obj in self.issuer_affiliates.filter(bank_liabilities_vol__gt=0).order_by('name')]
 
+    def get_declension_texts(self):
+        """
+        Строки, которые склоняет bg_property.
+        """
+        return [
+            '%s %s %s' % (self.issuer_head_last_name, self.issuer_head_first_name, self.issuer_head_middle_name),
+            self.issuer_head_org_position_and_permissions,
+            self.issuer_full_name,
+            self.tender_responsible_full_name,
+            self.tender_placement_type,
+            self.tender_contract_subject,
+        ]
+
     @cached_property
     def bg_property(self):
         bg_type = {
@@ -1432,6 +1588,7 @@ class Issue(models.Model):
             sign_by = sign_by['signer_2']
         else:
             sign_by = sign_by['signer_3']
+        MorpherApi.prefetch(self.get_declension_texts())
         properties = {
             'bg_number': generate_bg_number(self.created_at),
             'city': 'г. Москва',
@@ -1919,18 +2076,24 @@ class Issue(models.Model):
     def can_send_for_review(self):
         return self.is_application_filled and self.is_application_signed and self.is_all_required_propose_docs_filled
 
-    def fill_application_doc(self, commit=True):
-        template_path = os.path.join(
-            settings.BASE_DIR,
-            'marer',
-            'templates',
-            'documents',
-            'issue_application_doc.docx',
-        )
+    APPLICATION_DOC_TEMPLATE_PATH = os.path.join(
+        settings.BASE_DIR,
+        'marer',
+        'templates',
+        'documents',
+        'issue_application_doc.docx',
+    )
 
+    def fill_application_doc(self, commit=True):
         from marer.utils.documents import fill_docx_file_with_issue_data
-        application_doc_file = fill_docx_file_with_issue_data(template_path, self)
+        application_doc_file = fill_docx_file_with_issue_data(self.APPLICATION_DOC_TEMPLATE_PATH, self)
+        self.application_doc_outdated = False
+        self.application_doc_valid_until = self.get_application_doc_valid_until()
         application_doc_file.name = 'Заявление_на_предоставление_БГ.docx'
+        if self.application_doc and self.application_doc.get_content_hash() == file_content_hash(application_doc_file):
+            # содержимое не изменилось: остается прежний документ вместе с подписью
+            application_doc_file.close()
+            return
 
         app_doc = Document()
         app_doc.file = application_doc_file
@@ -1943,6 +2106,34 @@ class Issue(models.Model):
             self.save()
         application_doc_file.close()
 
+    def get_application_doc_valid_until(self):
+        """
+        Ближайшая дата окончания действующих лицензий: с нее licences_as_string изменится сам по себе.
+        """
+        dates = [l.date_to for l in self.issuer_licences.all() if l.date_to and l.is_active()]
+        return min(dates) if dates else None
+
+    def is_application_doc_outdated(self, changed_fields=None) -> bool:
+        """
+        Нужно ли заново заполнять заявление: изменились поля, которые выводит шаблон заявления,
+        связанные наборы или профиль агента (их изменения отмечает флаг application_doc_outdated),
+        или истекла одна из выведенных лицензий.
+        """
+        if self.pk is None or self.application_doc_id is None:
+            return True
+        if self.application_doc_valid_until is not None and now().date() >= self.application_doc_valid_until:
+            return True
+        from marer.utils.documents import get_compiled_docx_template, get_template_issue_dependencies
+        dependencies = get_template_issue_dependencies(get_compiled_docx_template(self.APPLICATION_DOC_TEMPLATE_PATH))
+        if dependencies is None:
+            return True
+        fields, related_sets = dependencies
+        if changed_fields is None:
+            changed_fields = self.get_changed_fields()
+        if fields & changed_fields:
+            return True
+        return bool(related_sets) and self.application_doc_outdated
+
     def fill_app_docs(self):
         docs = []
         if self.application_doc:
@@ -2119,12 +2310,22 @@ class Issue(models.Model):
         pdocs.extend(self.propose_documents.filter(type=type).order_by('name'))
         return pdocs
 
-    def fill_doc_ops_mgmt_conclusion(self, commit=True, **kwargs):
-
+    # поле заявки, имя файла и сообщение о невозможности заполнения для каждого вида заключения
+    CONCLUSION_DOCUMENTS = {
+        consts.CONCLUSION_DOC_OPS_MGMT: (
+            'doc_ops_mgmt_conclusion_doc', 'doc_ops_mgmt_conclusion.docx', 'Заключение УРДО заполнить невозможно'),
+        consts.CONCLUSION_SEC_DEP: (
+            'sec_dep_conclusion_doc', 'sec_dep_conclusion.docx', 'Заключение ДБ заполнить невозможно'),
+        consts.CONCLUSION_LAWYERS_DEP: (
+            'lawyers_dep_conclusion_doc', 'lawyers_conclusion.docx', 'Заключение ПУ заполнить невозможно'),
+    }
+
+    def validate_conclusion(self, conclusion_type: str):
         ve = ValidationError(None)
         ve.error_list = []
-        if not self.is_org_registered_more_than_6_months_ago:
-            ve.error_list.append('Обнаружен стоп-фактор: организация зарегистрирована менее 6 месецев назад')
+        if conclusion_type in (consts.CONCLUSION_DOC_OPS_MGMT, consts.CONCLUSION_SEC_DEP):
+            if not self.is_org_registered_more_than_6_months_ago:
+                ve.error_list.append('Обнаружен стоп-фактор: организация зарегистрирована менее 6 месецев назад')
 
         # if self.sec_dep_conclusion_doc is None or self.sec_dep_conclusion_doc.file is None:
         #     ve.error_list.append('Отсутствует заключение ДБ')
@@ -2132,93 +2333,56 @@ class Issue(models.Model):
         if len(ve.error_list) > 0:
             raise ve
 
-        if self.bg_sum < 1500000:
-            domc_filename = 'issue_domc_up_to_1500000.docx'
+    def get_conclusion_template_path(self, conclusion_type: str) -> str:
+        if conclusion_type == consts.CONCLUSION_DOC_OPS_MGMT:
+            if self.bg_sum < 1500000:
+                filename = 'issue_domc_up_to_1500000.docx'
+            else:
+                filename = 'issue_domc_from_1500000.docx'
+        elif conclusion_type == consts.CONCLUSION_SEC_DEP:
+            if self.bg_sum < 500000:
+                filename = 'issue_sec_dep_conclusion_up_to_500000.docx'
+            elif self.bg_sum < 1500000:
+                filename = 'issue_sec_dep_conclusion_more_500000_up_to_1500000.docx'
+            elif self.bg_sum < 5000000:
+                filename = 'issue_sec_dep_conclusion_more_1500000_up_to_5000000.docx'
+            else:
+                filename = 'issue_sec_dep_conclusion_more_5000000.docx'
         else:
-            domc_filename = 'issue_domc_from_1500000.docx'
+            filename = 'issue_lawyers_conclusion.docx'
 
-        template_path = os.path.join(
+        return os.path.join(
             settings.BASE_DIR,
             'marer',
             'templates',
             'documents',
-            domc_filename
+            filename
         )
 
-        from marer.utils.documents import fill_docx_file_with_issue_data
-        doc_ops_mgmt_conclusion_file = fill_docx_file_with_issue_data(template_path, self, **kwargs)
-        doc_ops_mgmt_conclusion_file.name = 'doc_ops_mgmt_conclusion.docx'
-        domc_doc = Document()
-        domc_doc.file = doc_ops_mgmt_conclusion_file
-        domc_doc.save()
-        self.doc_ops_mgmt_conclusion_doc = domc_doc
-        if commit:
-            self.save()
-        doc_ops_mgmt_conclusion_file.close()
-
-    def fill_lawyers_dep_conclusion(self, commit=True, **kwargs):
-
-        template_path = os.path.join(
-            settings.BASE_DIR,
-            'marer',
-            'templates',
-            'documents',
-            'issue_lawyers_conclusion.docx'
-        )
+    def fill_conclusion(self, conclusion_type: str, commit=True, **kwargs) -> Document:
+        self.validate_conclusion(conclusion_type)
+        issue_field, file_name, _ = self.CONCLUSION_DOCUMENTS[conclusion_type]
 
         from marer.utils.documents import fill_docx_file_with_issue_data
-        lawyers_conclusion_file = fill_docx_file_with_issue_data(template_path, self, **kwargs)
-        lawyers_conclusion_file.name = 'lawyers_conclusion.docx'
-        lawyers_conclusion_doc = Document()
-        lawyers_conclusion_doc.file = lawyers_conclusion_file
-        lawyers_conclusion_doc.save()
-        self.lawyers_dep_conclusion_doc = lawyers_conclusion_doc
+        conclusion_file = fill_docx_file_with_issue_data(self.get_conclusion_template_path(conclusion_type), self, **kwargs)
+        conclusion_file.name = file_name
+        conclusion_doc = Document()
+        conclusion_doc.file = conclusion_file
+        conclusion_doc.save()
+        setattr(self, issue_field, conclusion_doc)
         if commit:
             self.save()
-        lawyers_conclusion_file.close()
-        return self.lawyers_dep_conclusion_doc
-
-    def fill_sec_dep_conclusion_doc(self, commit=True, **kwargs):
-
-        ve = ValidationError(None)
-        ve.error_list = []
-        issuer_reg_delta = relativedelta(
-            timezone.localdate(timezone.now(), timezone.get_current_timezone()),
-            self.issuer_registration_date,
-        )
-        if not self.is_org_registered_more_than_6_months_ago:
-            ve.error_list.append('Обнаружен стоп-фактор: организация зарегистрирована менее 6 месецев назад')
-
-        if len(ve.error_list) > 0:
-            raise ve
+        conclusion_file.close()
+        return conclusion_doc
 
-        if self.bg_sum < 500000:
-            filename = 'issue_sec_dep_conclusion_up_to_500000.docx'
-        elif self.bg_sum < 1500000:
-            filename = 'issue_sec_dep_conclusion_more_500000_up_to_1500000.docx'
-        elif self.bg_sum < 5000000:
-            filename = 'issue_sec_dep_conclusion_more_1500000_up_to_5000000.docx'
-        else:
-            filename = 'issue_sec_dep_conclusion_more_5000000.docx'
+    def fill_doc_ops_mgmt_conclusion(self, commit=True, **kwargs):
+        self.fill_conclusion(consts.CONCLUSION_DOC_OPS_MGMT, commit, **kwargs)
 
-        template_path = os.path.join(
-            settings.BASE_DIR,
-            'marer',
-            'templates',
-            'documents',
-            filename
-        )
+    def fill_lawyers_dep_conclusion(self, commit=True, **kwargs):
+        return self.fill_conclusion(consts.CONCLUSION_LAWYERS_DEP, commit, **kwargs)
 
-        from marer.utils.documents import fill_docx_file_with_issue_data
-        sec_dep_conclusion_file = fill_docx_file_with_issue_data(template_path, self, **kwargs)
-        sec_dep_conclusion_file.name = 'sec_dep_conclusion.docx'
-        new_doc = Document()
-        new_doc.file = sec_dep_conclusion_file
-        new_doc.save()
-        self.sec_dep_conclusion_doc = new_doc
-        if commit:
-            self.save()
-        sec_dep_conclusion_file.close()
+    def fill_sec_dep_conclusion_doc(self, commit=True, **kwargs):
+        self.fill_conclusion(consts.CONCLUSION_SEC_DEP, commit, **kwargs)
 
     def check_beneficiar_on_zakupkigov(self, kontur_benefitiar_analytics_data=None):
         """
@@ -2230,29 +2394,47 @@ class Issue(models.Model):
         :return:
         """
         if not kontur_benefitiar_analytics_data:
-            kontur_benefitiar_analytics_data = kontur.analytics(inn=self.tender_responsible_inn, ogrn=self.tender_responsible_ogrn)
+            kontur_benefitiar_analytics_data = self.beneficiary_snapshot.get_analytics()
             kontur_benefitiar_analytics_data = kontur_benefitiar_analytics_data.get('analytics', {})
         found = False
         # проверка через контур
         if kontur_benefitiar_analytics_data.get('q4005', 0) > 0:
             found = False
 
-        if not found:
+        if not found and self.tender_gos_number:
             # Запрос на TenderData по госномеру тендера.
             try:
-                tender_info = get_tender_info(self.tender_gos_number)
+                tender_info = self.beneficiary_snapshot.get_tender(self.tender_gos_number)
                 if isinstance(tender_info, dict) and tender_info:
                     found = False
             except:
                 pass
 
-        if not found:
-            # Запрос на zakupki.gov.ru по ИНН бенефициара.
+        if not found and self.tender_responsible_inn:
+            # Поиск в локальной копии реестра заказчиков.
+            found = GovCustomerRegistry.objects.filter(inn=self.tender_responsible_inn).exists()
+
+        if not found and self.tender_responsible_inn:
+            # Запрос на zakupki.gov.ru по ИНН бенефициара; отсутствие в реестре запоминается в кеше,
+            # ошибки запроса не кешируются.
+            missing_key = 'zakupki_customer_missing:{}'.format(self.tender_responsible_inn)
+            try:
+                if cache.get(missing_key):
+                    return found
+            except Exception as e:
+                logger.warning('Unable to read zakupki customer from cache: {}'.format(e))
             try:
                 url = "http://zakupki.gov.ru/epz/organization/quicksearch/rss?searchString=%s&morphology=on&pageNumber=1&sortDirection=true&recordsPerPage=_10&sortBy=PO_NAZVANIYU&fz94=on&fz223=on" % self.tender_responsible_inn
-                data = feedparser.parse(url)
+                data = get_feed('zakupki', url, raise_errors=True)
                 if len(data['entries']):
                     found = True
+                    GovCustomerRegistry.objects.get_or_create(inn=self.tender_responsible_inn, defaults=dict(
+                        ogrn=self.tender_responsible_ogrn,
+                        full_name=self.tender_responsible_full_name,
+                        source=GovCustomerRegistry.SOURCE_RSS,
+                    ))
+                else:
+                    cache.set(missing_key, True, settings.ZAKUPKI_CUSTOMER_NEGATIVE_CACHE_TTL)
             except:
                 pass
         return found
@@ -2262,9 +2444,9 @@ class Issue(models.Model):
         ve.error_list = []
 
         try:
-            kontur_benefitiar_analytics_data = kontur.analytics(inn=self.tender_responsible_inn, ogrn=self.tender_responsible_ogrn)
+            kontur_benefitiar_analytics_data = self.beneficiary_snapshot.get_analytics()
             kontur_benefitiar_analytics_data = kontur_benefitiar_analytics_data.get('analytics', {})
-            kontur_principal_analytics_data = kontur.analytics(inn=self.issuer_inn, ogrn=self.issuer_ogrn)
+            kontur_principal_analytics_data = self.issuer_snapshot.get_analytics()
             kontur_principal_analytics_data = kontur_principal_analytics_data.get('analytics', {})
 
             # principal stop factors
@@ -2304,12 +2486,18 @@ class Issue(models.Model):
         error_list = []
 
         try:
-            kontur_principal_analytics_data = kontur.analytics(inn=self.issuer_inn, ogrn=self.issuer_ogrn).get('analytics', {})
+            kontur_principal_analytics_data = self.issuer_snapshot.get_analytics().get('analytics', {})
             if kontur_principal_analytics_data.get('m5004', False):
                 error_list.append([
                     'Организация была найдена в списке юридических лиц, имеющих задолженность по уплате налогов.', False
                 ])
-            if self.finished_contracts_count < settings.LIMIT_FINISHED_CONTRACTS:
+            # статистику загружает refresh_contract_stats, здесь zakupki.gov.ru не запрашивается
+            if self.issuer_inn and not SupplierContractStats.get_for_inn(self.issuer_inn).is_known:
+                error_list.append([
+                    'Нет данных об исполненных контрактах. Необходимо загрузить документ подтверждающий опыт в пакете документов',
+                    True
+                ])
+            elif self.finished_contracts_count < settings.LIMIT_FINISHED_CONTRACTS:
                 error_list.append(['Опыта нет. Необходимо загрузить документ подтверждающий опыт в пакете документов', True])
         except Exception:
             error_list.append(['Не удалось проверить заявку на стоп-факторы', False])
@@ -2325,7 +2513,7 @@ class Issue(models.Model):
         else:
             return True
 
-    def save(self, force_insert=False, force_update=False, using=None, update_fields=None, create_docs=True):
+    def save(self, force_insert=False, force_update=False, using=None, update_fields=None, create_docs=True, full_save=False):
         if not self.bg_start_date:
             self.bg_start_date = timezone.now()
         if not self.product or self.product == '':
@@ -2337,56 +2525,55 @@ class Issue(models.Model):
         if not self.bg_extradition_date and self.status == consts.ISSUE_STATUS_FINISHED:
             self.bg_extradition_date = today()
 
-        if self.check_all_application_required_fields_filled():
-            self.fill_application_doc(commit=False)
-            if self.old_application_doc is not None and self.application_doc is not None and self.old_application_doc.id != self.application_doc.id:
-                identical = are_docx_files_identical(
-                    self.old_application_doc.file.path,
-                    self.application_doc.file.path
-                )
-                if identical:
-                    self.application_doc = self.old_application_doc
-
         if not self.manager and not self.manager_id and self.user.manager_id and self.bg_sum and self.bg_sum > 1500000:
             self.manager_id = self.user.manager_id
 
-        super().save(force_insert, force_update, using, update_fields)
+        if not self._meta.proxy:
+            # сохранение прокси-моделей (сообщений по заявке) документы рассмотрения не формирует
+            self.fill_review_documents()
+
+        # документы заявки формируются после фиксации транзакции и только при изменении нужных им полей
+        effects = ISSUE_SAVE_EFFECTS.select(
+            self, self.get_changed_fields(), self._state.adding,
+            exclude=() if create_docs else ('create_propose_documents',),
+        )
+        if any(effect.name == 'refresh_application_doc' for effect in effects):
+            # флаг сбрасывает само действие; если оно упадет, заявление перезаполнится при следующем сохранении
+            self.application_doc_outdated = True
+            if update_fields is not None:
+                update_fields = set(update_fields) | {'application_doc_outdated'}
+        super().save(force_insert, force_update, using, update_fields, full_save=full_save)
+        ISSUE_SAVE_EFFECTS.schedule(self, effects, using=using)
+
+    def fill_review_documents(self):
+        """
+        Акты и документы рассмотрения заявки. Заполняются до сохранения,
+        чтобы попасть в UPDATE измененных полей.
+        """
+        from marer.utils.documents import generate_doc
+        if self.old_status != self.status and self.status == consts.ISSUE_STATUS_REVIEW:
+            from marer.utils.documents import generate_acts_for_issue
+            self.bg_property  # даем возможность выпасть исключению здесь, т.к. в format оно не появится
+            if settings.DOCWORKER_ENABLED and self.pk:
+                # акты сформирует docworker, когда заявка будет сохранена
+                self._enqueue_acts = True
+            else:
+                generate_acts_for_issue(self)
+
+        if self.status == consts.ISSUE_STATUS_REVIEW:
+            from marer.utils.documents import generate_underwriting_criteria
+            try:
+                # исключениям выпадать не даем: пусть не заполняется целиком, если есть пропуски
+                underwriting_criteria_doc, underwriting_criteria_score = generate_underwriting_criteria(self)
+                self.underwriting_criteria_doc = underwriting_criteria_doc
+                self.underwriting_criteria_score = underwriting_criteria_score
+            except Exception as e:
+                pass
 
-        if create_docs and bool(self.propose_documents.exists() is False and self.tax_system):
-            pdocs = FinanceOrgProductProposeDocument.objects.filter(
-                Q(Q(tax_system=self.tax_system) | Q(tax_system__isnull=True)),
-                Q(Q(min_bg_sum__lte=self.bg_sum) | Q(min_bg_sum__isnull=True)),
-                Q(Q(max_bg_sum__gte=self.bg_sum) | Q(max_bg_sum__isnull=True)),
-            )
-            if self.finished_contracts_count >= settings.LIMIT_FINISHED_CONTRACTS:
-                pdocs = pdocs.exclude(if_not_finished_contracts=True)
-            if self.issuer_okopf:
-                form_ownership = FormOwnership.objects.filter(okopf_codes__contains=self.issuer_okopf).first()
-                pdocs = pdocs.filter(form_ownership__in=[form_ownership])
-            pdocs_names = pdocs.values_list('name', flat=True)
-
-            prev_issue = Issue.objects.filter(issuer_inn=self.issuer_inn).exclude(id=self.id).order_by('-id').first()
-            if prev_issue:
-                for old_doc in prev_issue.propose_documents.all():
-                    if old_doc.name in pdocs_names:
-                        new_doc = deepcopy(old_doc)
-                        new_doc.pk = None
-                        if old_doc.document:
-                            doc_file = deepcopy(old_doc.document)
-                            doc_file.pk = None
-                            doc_file.save()
-                            new_doc.document = doc_file
-
-                        new_doc.issue_id = self.id
-                        new_doc.save()
-
-            for pdoc in pdocs:
-                IssueProposeDocument.objects.get_or_create(issue=self, name=pdoc.name, defaults={
-                    'code': pdoc.code,
-                    'type': pdoc.type,
-                    'is_required': pdoc.is_required,
-                    'sample': pdoc.sample,
-                })
+            if not self.approval_and_change_sheet:
+                self.approval_and_change_sheet = generate_doc(
+                    os.path.join(settings.BASE_DIR, 'marer/templates/documents/acts/approval_and_change_sheet.docx'),
+                    'Лист_согласования_и_изменения_БГ_%s.docx' % self.id, self)
 
     def __init__(self, *args, **kwargs):
         super(Issue, self).__init__(*args, **kwargs)
@@ -2396,6 +2583,93 @@ class Issue(models.Model):
         self.old_manager_id = self.manager_id
 
 
+def _run_closing_connection(fn):
+    try:
+        return fn()
+    finally:
+        connection.close()
+
+
+class IssueExternalSnapshot(TrackedFieldsModel):
+    """
+    Ответы внешних сервисов по контрагенту заявки, на которых основаны
+    проверки стоп-факторов. Обновляются только явно.
+    """
+    class Meta:
+        verbose_name = 'снимок внешних данных'
+        verbose_name_plural = 'снимки внешних данных'
+        unique_together = (('issue', 'inn'),)
+
+    issue = models.ForeignKey(Issue, on_delete=models.CASCADE, blank=False, null=False, related_name='external_snapshots')
+    inn = models.CharField(verbose_name='ИНН', max_length=32, blank=True, null=False, default='')
+    ogrn = models.CharField(verbose_name='ОГРН', max_length=32, blank=True, null=False, default='')
+    analytics = models.TextField(verbose_name='аналитика Контур.Фокус', blank=True, null=False, default='')
+    analytics_fetched_at = models.DateTimeField(verbose_name='аналитика получена', blank=True, null=True)
+    egr_details = models.TextField(verbose_name='выписка ЕГР Контур.Фокус', blank=True, null=False, default='')
+    egr_details_fetched_at = models.DateTimeField(verbose_name='выписка ЕГР получена', blank=True, null=True)
+    tender_gos_number = models.CharField(verbose_name='госномер тендера', max_length=512, blank=True, null=False, default='')
+    tender = models.TextField(verbose_name='данные тендера', blank=True, null=False, default='')
+    tender_fetched_at = models.DateTimeField(verbose_name='данные тендера получены', blank=True, null=True)
+
+    def __str__(self):
+        return self.inn
+
+    def _load(self, field):
+        value = getattr(self, field)
+        return json.loads(value) if value else {}
+
+    def set_payload(self, field, data):
+        setattr(self, field, json.dumps(data, cls=CustomJSONEncoder))
+        setattr(self, field + '_fetched_at', timezone.now())
+
+    def refresh(self, parts=('analytics', 'egr_details', 'tender'), tender_gos_number=None):
+        """
+        Загружает части снимка заново. Часть, запрос которой не удался, не сохраняется
+        и остается незагруженной; после сохранения удачных частей ошибка выбрасывается.
+        """
+        fetchers = OrderedDict()
+        if 'analytics' in parts:
+            fetchers['analytics'] = partial(kontur.analytics, inn=self.inn, ogrn=self.ogrn)
+        if 'egr_details' in parts:
+            fetchers['egr_details'] = partial(kontur.egrDetails, inn=self.inn, ogrn=self.ogrn)
+        gos_number = tender_gos_number if tender_gos_number is not None else self.tender_gos_number
+        if 'tender' in parts and gos_number:
+            fetchers['tender'] = partial(fetch_tender_info, gos_number)
+
+        error = None
+        for field, fetch in fetchers.items():
+            try:
+                data = fetch()
+            except Exception as e:
+                logger.warning('Unable to refresh {} of external snapshot {}: {}'.format(field, self.inn, e))
+                error = error or e
+                continue
+            if field == 'tender':
+                self.tender_gos_number = gos_number
+                data = data or {}
+            self.set_payload(field, data)
+
+        if self.issue_id and self.get_changed_fields():
+            self.save()
+        if error is not None:
+            raise error
+
+    def get_analytics(self):
+        if self.analytics_fetched_at is None:
+            self.refresh(parts=('analytics',))
+        return self._load('analytics')
+
+    def get_egr_details(self):
+        if self.egr_details_fetched_at is None:
+            self.refresh(parts=('egr_details',))
+        return self._load('egr_details')
+
+    def get_tender(self, gos_number):
+        if self.tender_fetched_at is None or self.tender_gos_number != gos_number:
+            self.refresh(parts=('tender',), tender_gos_number=gos_number)
+        return self._load('tender')
+
+
 class IssueDocument(models.Model):
     class Meta:
         verbose_name = 'общий документ'
@@ -2422,7 +2696,7 @@ class IssueDocument(models.Model):
     )
 
 
-class IssueProposeDocument(models.Model):
+class IssueProposeDocument(TrackedFieldsModel):
     class Meta:
         verbose_name = 'документ для банка'
         verbose_name_plural = 'документы для банка'
@@ -2482,7 +2756,7 @@ class IssueProposeDocument(models.Model):
         super().save(force_insert, force_update, using, update_fields)
 
 
-class IssueClarification(models.Model):
+class IssueClarification(TrackedFieldsModel):
     class Meta:
         verbose_name = 'дозапрос'
         verbose_name_plural = 'дозапросы'
@@ -2510,9 +2784,10 @@ class IssueClarification(models.Model):
         )
         return 'Дозапрос №{} по заявке №{} от {}'.format(*str_args)
 
-    def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
-        set_obj_update_time(self.issue)
-        return super().save(force_insert, force_update, using, update_fields)
+    def save(self, force_insert=False, force_update=False, using=None, update_fields=None, full_save=False):
+        # заявка не загружается: ее время изменения обновляется по issue_id
+        _touch_on_commit(Issue._default_manager, self.issue_id, 'updated_at')
+        return super().save(force_insert, force_update, using, update_fields, full_save=full_save)
 
 
 class IssueClarificationMessage(models.Model):
@@ -2548,7 +2823,7 @@ class IssueClarificationMessage(models.Model):
         )
 
     def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
-        set_obj_update_time(self.issue)
+        _touch_on_commit(Issue._default_manager, self.issue_id, 'updated_at')
         return super().save(force_insert, force_update, using, update_fields)
 
 
@@ -2823,25 +3098,100 @@ class IssueMessagesProxy(Issue):
         verbose_name_plural = 'сообщения по заявке'
 
 
-@receiver(pre_save, sender=Issue, dispatch_uid="pre_save_issue")
-def pre_save_issue(sender, instance, **kwargs):
-    from marer.utils.documents import generate_doc
-    if instance.old_status != instance.status and instance.status == consts.ISSUE_STATUS_REVIEW:
-        from marer.utils.documents import generate_acts_for_issue
-        instance.bg_property  # даем возможность выпасть исключению здесь, т.к. в format оно не появится
-        generate_acts_for_issue(instance)
-
-    if instance.status == consts.ISSUE_STATUS_REVIEW:
-        from marer.utils.documents import generate_underwriting_criteria
-        try:
-            # исключениям выпадать не даем: пусть не заполняется целиком, если есть пропуски
-            underwriting_criteria_doc, underwriting_criteria_score = generate_underwriting_criteria(instance)
-            instance.underwriting_criteria_doc = underwriting_criteria_doc
-            instance.underwriting_criteria_score = underwriting_criteria_score
-        except Exception as e:
-            pass
-
-        if not instance.approval_and_change_sheet:
-            instance.approval_and_change_sheet = generate_doc(
-                os.path.join(settings.BASE_DIR, 'marer/templates/documents/acts/approval_and_change_sheet.docx'),
-                'Лист_согласования_и_изменения_БГ_%s.docx' % instance.id, instance)
+@receiver(post_save, sender=Issue, dispatch_uid="post_save_issue_enqueue_acts")
+def post_save_issue_enqueue_acts(sender, instance, **kwargs):
+    if instance.__dict__.pop('_enqueue_acts', False):
+        from marer.utils.documents import enqueue_documents, get_acts_for_issue
+        acts = get_acts_for_issue(instance)
+        transaction.on_commit(lambda: enqueue_documents(instance, acts))
+
+
+def mark_application_doc_outdated(sender, instance, **kwargs):
+    Issue.objects.filter(id=instance.issue_id, application_doc_outdated=False).update(application_doc_outdated=True)
+
+
+for application_doc_related_model in (
+    IssueOrgManagementCollegial,
+    IssueOrgManagementDirectors,
+    IssueOrgManagementOthers,
+    IssueBGProdFounderLegal,
+    IssueBGProdFounderPhysical,
+    IssuerLicences,
+    IssueOrgBeneficiaryOwner,
+    IssueOrgBankAccount,
+):
+    post_save.connect(mark_application_doc_outdated, sender=application_doc_related_model,
+                      dispatch_uid='post_save_{}_application_doc'.format(application_doc_related_model.__name__))
+    post_delete.connect(mark_application_doc_outdated, sender=application_doc_related_model,
+                        dispatch_uid='post_delete_{}_application_doc'.format(application_doc_related_model.__name__))
+
+# поля агента, которые выводит шаблон заявления
+APPLICATION_DOC_USER_FIELDS = frozenset(['first_name', 'last_name', 'phone', 'email'])
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL, dispatch_uid='post_save_user_application_docs')
+def mark_user_application_docs_outdated(sender, instance, created, update_fields=None, **kwargs):
+    # вход в систему сохраняет только last_login и заявления не затрагивает
+    if created or (update_fields is not None and not APPLICATION_DOC_USER_FIELDS & set(update_fields)):
+        return
+    Issue.objects.filter(user_id=instance.id, application_doc_outdated=False).update(application_doc_outdated=True)
+
+
+@ISSUE_SAVE_EFFECTS.register(condition=lambda issue, changed_fields: issue.is_application_doc_outdated(changed_fields))
+def refresh_application_doc(issue):
+    if not issue.check_all_application_required_fields_filled():
+        return
+    issue.fill_application_doc(commit=False)
+    if issue.old_application_doc is not None and issue.application_doc is not None and issue.old_application_doc.id != issue.application_doc.id:
+        if issue.old_application_doc.get_content_hash() == issue.application_doc.get_content_hash():
+            issue.application_doc = issue.old_application_doc
+    # заявка уже сохранена: обновляются только поля заявления, без Issue.save и его сигналов
+    application_doc_fields = dict(
+        application_doc_id=issue.application_doc_id,
+        prev_signed_application_doc_id=issue.prev_signed_application_doc_id,
+        application_doc_outdated=False,
+        application_doc_valid_until=issue.application_doc_valid_until,
+    )
+    Issue.objects.filter(id=issue.id).update(**application_doc_fields)
+    issue._saved_field_values.update(application_doc_fields)
+
+
+@ISSUE_SAVE_EFFECTS.register(fields=('tax_system', 'bg_sum', 'issuer_okopf', 'issuer_inn'), background=True)
+def create_propose_documents(issue):
+    if not issue.tax_system or issue.propose_documents.exists():
+        return
+    pdocs = FinanceOrgProductProposeDocument.objects.filter(
+        Q(Q(tax_system=issue.tax_system) | Q(tax_system__isnull=True)),
+        Q(Q(min_bg_sum__lte=issue.bg_sum) | Q(min_bg_sum__isnull=True)),
+        Q(Q(max_bg_sum__gte=issue.bg_sum) | Q(max_bg_sum__isnull=True)),
+    )
+    # неизвестная статистика считается нулевой: документы об опыте остаются в списке
+    if issue.finished_contracts_count >= settings.LIMIT_FINISHED_CONTRACTS:
+        pdocs = pdocs.exclude(if_not_finished_contracts=True)
+    if issue.issuer_okopf:
+        form_ownership = FormOwnership.objects.filter(okopf_codes__contains=issue.issuer_okopf).first()
+        pdocs = pdocs.filter(form_ownership__in=[form_ownership])
+    pdocs_names = pdocs.values_list('name', flat=True)
+
+    prev_issue = Issue.objects.filter(issuer_inn=issue.issuer_inn).exclude(id=issue.id).order_by('-id').first()
+    if prev_issue:
+        for old_doc in prev_issue.propose_documents.all():
+            if old_doc.name in pdocs_names:
+                new_doc = deepcopy(old_doc)
+                new_doc.pk = None
+                if old_doc.document:
+                    doc_file = deepcopy(old_doc.document)
+                    doc_file.pk = None
+                    doc_file.save()
+                    new_doc.document = doc_file
+
+                new_doc.issue_id = issue.id
+                new_doc.save()
+
+    for pdoc in pdocs:
+        IssueProposeDocument.objects.get_or_create(issue=issue, name=pdoc.name, defaults={
+            'code': pdoc.code,
+            'type': pdoc.type,
+            'is_required': pdoc.is_required,
+            'sample': pdoc.sample,
+        })
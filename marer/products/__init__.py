@@ -226,15 +226,19 @@ class BankGuaranteeProduct(FinanceProduct):
 
         if inn_should_be_requested or ogrn_should_should_be_requested:
             self._issue.refresh_from_db()
-            kontur_req_data = kontur.req(inn=inn, ogrn=ogrn)
-            kontur_egrDetails_data = kontur.egrDetails(inn=inn, ogrn=ogrn)
-            kontur_beneficialOwners = kontur.beneficialOwners(inn=inn, ogrn=ogrn)
-            kontur_aff_data = kontur.companyAffiliatesReq(inn=inn, ogrn=ogrn)
-            kontur_licences = kontur.licences(inn=inn, ogrn=ogrn)
+            kontur_bundle = kontur.fetch_bundle(inn=inn, ogrn=ogrn, methods=(
+                'req', 'egr_details', 'beneficial_owners', 'company_affiliates', 'licences',
+            ))
+            kontur_req_data = kontur_bundle.req
+            kontur_egrDetails_data = kontur_bundle.egr_details
+            kontur_beneficialOwners = kontur_bundle.beneficial_owners
+            kontur_aff_data = kontur_bundle.company_affiliates
+            kontur_licences = kontur_bundle.licences
             if not kontur_req_data:
                 return True
             self._issue.issuer_registration_date = parser.parse(kontur_req_data['UL']['registrationDate'] if 'UL' in kontur_req_data else kontur_req_data['IP']['registrationDate'])
-            self._issue.issuer_ifns_reg_date = parser.parse(kontur_egrDetails_data['UL']['nalogRegBody']['nalogRegDate'] if 'UL' in kontur_egrDetails_data else kontur_egrDetails_data['IP']['nalogRegBody']['nalogRegDate']).date()
+            if kontur_egrDetails_data:
+                self._issue.issuer_ifns_reg_date = parser.parse(kontur_egrDetails_data['UL']['nalogRegBody']['nalogRegDate'] if 'UL' in kontur_egrDetails_data else kontur_egrDetails_data['IP']['nalogRegBody']['nalogRegDate']).date()
             self._issue.issuer_okopf = kontur_req_data['UL']['okopf'] if 'UL' in kontur_req_data else kontur_req_data['IP']['okopf']
             self._issue.issuer_okpo = kontur_req_data['UL'].get('okpo', '') if 'UL' in kontur_req_data else kontur_req_data['IP'].get('okpo', '')
             self._issue.issuer_okato = kontur_req_data['UL'].get('okato', '') if 'UL' in kontur_req_data else ''
@@ -255,8 +259,8 @@ class BankGuaranteeProduct(FinanceProduct):
                     self._issue.issuer_head_middle_name = head_name_arr[2]
 
             from marer.models.issue import IssueBGProdAffiliate
-            affiliates = IssueBGProdAffiliate.objects.filter(issue=self._issue)
-            affiliates.delete()
+            if kontur_bundle.is_ok('company_affiliates'):
+                IssueBGProdAffiliate.objects.filter(issue=self._issue).delete()
             for aff in kontur_aff_data:
                 if aff['inn'] != self._issue.issuer_inn:
                     new_aff = IssueBGProdAffiliate()
@@ -271,8 +275,8 @@ class BankGuaranteeProduct(FinanceProduct):
                     new_aff.save()
 
             from marer.models.issue import IssueBGProdFounderLegal
-            founders_legal = IssueBGProdFounderLegal.objects.filter(issue=self._issue)
-            founders_legal.delete()
+            if kontur_bundle.is_ok('egr_details'):
+                IssueBGProdFounderLegal.objects.filter(issue=self._issue).delete()
             if 'UL' in kontur_egrDetails_data:
                 for fndr in kontur_egrDetails_data['UL'].get('foundersUL', []):
                     new_fndr = IssueBGProdFounderLegal()
@@ -289,8 +293,8 @@ class BankGuaranteeProduct(FinanceProduct):
                     new_fndr.save()
 
             from marer.models.issue import IssueBGProdFounderPhysical
-            founders_physical = IssueBGProdFounderPhysical.objects.filter(issue=self._issue)
-            founders_physical.delete()
+            if kontur_bundle.is_ok('egr_details'):
+                IssueBGProdFounderPhysical.objects.filter(issue=self._issue).delete()
             if 'UL' in kontur_egrDetails_data:
                 for fndr in kontur_egrDetails_data['UL'].get('foundersFL', []):
                     new_fndr = IssueBGProdFounderPhysical()
@@ -307,9 +311,9 @@ class BankGuaranteeProduct(FinanceProduct):
                     new_fndr.save()
 
             from marer.models.issue import IssueOrgBeneficiaryOwner
-            b_owners = IssueOrgBeneficiaryOwner.objects.filter(issue=self._issue)
-            b_owners.delete()
-            b_owners_fl = list(kontur_beneficialOwners['beneficialOwners'].get('beneficialOwnersFL', []))
+            if kontur_bundle.is_ok('beneficial_owners'):
+                IssueOrgBeneficiaryOwner.objects.filter(issue=self._issue).delete()
+            b_owners_fl = list(kontur_beneficialOwners.get('beneficialOwners', {}).get('beneficialOwnersFL', []))
             b_owners_fl.sort(key=lambda x: x.get('share', 0), reverse=True)
             for b_owner in b_owners_fl:
                 new_bo = IssueOrgBeneficiaryOwner()
@@ -319,8 +323,8 @@ class BankGuaranteeProduct(FinanceProduct):
                 new_bo.save()
 
             from marer.models.issue import IssuerLicences
-            licences = IssuerLicences.objects.filter(issue=self._issue)
-            licences.delete()
+            if kontur_bundle.is_ok('licences'):
+                IssuerLicences.objects.filter(issue=self._issue).delete()
             licences_data = list(kontur_licences.get('licenses', []))
             for data in licences_data:
                 active = data.get('statusDescription') == 'Действующая'
@@ -722,6 +726,7 @@ class BankGuaranteeProduct(FinanceProduct):
                 'lawyers_dep_conclusion_doc_admin_field',
                 'doc_ops_mgmt_conclusion_doc_admin_field',
                 'sec_dep_conclusion_doc_admin_field',
+                'external_snapshots_admin_field',
             ))),
             ('Договора и акты', dict(fields=(
                 'bg_contract_doc_admin_field',
@@ -730,6 +735,7 @@ class BankGuaranteeProduct(FinanceProduct):
                 'payment_of_fee_admin_field',
                 'transfer_acceptance_act_admin_field',
                 'contract_of_guarantee_admin_field',
+                'document_jobs_admin_field',
                 'underwriting_criteria_doc_admin_field',
                 'underwriting_criteria_score',
             ))),
@@ -869,6 +875,8 @@ class BankGuaranteeProduct(FinanceProduct):
             'sec_dep_conclusion_doc_admin_field',
             'tender_gos_number_link',
             'underwriting_criteria_doc_admin_field',
+            'external_snapshots_admin_field',
+            'document_jobs_admin_field',
         ]
 
     def get_admin_issue_inlnes(self):
@@ -1,3 +1,6 @@
+from collections import OrderedDict
+
+from django.conf import settings
 from rest_framework import serializers
 from rest_framework.serializers import ModelSerializer
 from rest_framework.utils import model_meta
@@ -5,6 +8,7 @@ from rest_framework.utils import model_meta
 from marer import consts
 from marer.models import Issue, User, IssueClarificationMessage, IssueFinanceOrgProposeClarificationMessageDocument
 from marer.models.base import Document
+from marer.models.document_job import DocumentGenerationJob, DocumentGenerationTask
 from marer.models.issue import IssueOrgManagementCollegial, IssueOrgManagementDirectors, IssueOrgManagementOthers, \
     IssueOrgBeneficiaryOwner, IssueOrgBankAccount, IssueBGProdFounderPhysical, IssueBGProdFounderLegal, \
     IssueProposeDocument
@@ -181,17 +185,26 @@ class IssueSerializer(ModelSerializer):
             'org_beneficiary_owners', 'org_bank_accounts', 'issuer_founders_legal',
             'issuer_founders_physical'
         ]
+        related_changed = False
         for field in related_fields:
             ids = []
             for data in validated_data[field]:
                 id = data.pop('id')
                 if id:
-                    getattr(instance, field).filter(id=id).update(**data)
+                    # строки без изменений не обновляются
+                    if getattr(instance, field).filter(id=id).exclude(**data).update(**data):
+                        related_changed = True
                     ids.append(id)
                 else:
                     obj = getattr(instance, field).create(**data)
                     ids.append(obj.id)
-            getattr(instance, field).exclude(id__in=ids).delete()
+                    related_changed = True
+            deleted, _ = getattr(instance, field).exclude(id__in=ids).delete()
+            if deleted:
+                related_changed = True
+        if related_changed:
+            # связанные наборы изменены после загрузки заявки: заявление перезаполнится при сохранении
+            instance.application_doc_outdated = True
         info = model_meta.get_field_info(instance)
         for attr, value in validated_data.items():
             if not (attr in info.relations and info.relations[attr].to_many):
@@ -291,3 +304,34 @@ class IssueLawyersDepSerializer(ModelSerializer):
             'is_positive_lawyers_department_conclusion',
             'lawyers_dep_conclusion_doc',
         )
+
+
+class DocumentGenerationTaskSerializer(ModelSerializer):
+    document = DocumentSerializer(read_only=True)
+
+    class Meta:
+        model = DocumentGenerationTask
+        fields = ('id', 'issue_field', 'file_name', 'status', 'error', 'document', 'finished_at')
+
+
+class DocumentGenerationJobSerializer(ModelSerializer):
+    tasks = DocumentGenerationTaskSerializer(many=True, read_only=True)
+    progress = serializers.SerializerMethodField()
+
+    class Meta:
+        model = DocumentGenerationJob
+        fields = ('id', 'status', 'created_at', 'finished_at', 'progress', 'tasks')
+
+    def get_progress(self, obj):
+        return obj.get_progress()
+
+
+class ConclusionBatchSerializer(ReadOnlySerializer):
+    issues = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
+    conclusion_type = serializers.ChoiceField(choices=consts.CONCLUSION_CHOICES)
+
+    def validate_issues(self, value):
+        if len(value) > settings.CONCLUSION_BATCH_MAX_ISSUES:
+            raise serializers.ValidationError(
+                'Не более {} заявок за один раз'.format(settings.CONCLUSION_BATCH_MAX_ISSUES))
+        return list(OrderedDict.fromkeys(value))
@@ -1,10 +1,34 @@
-from django.test import TestCase
+import math
+import os
+import random
+import zipfile
+from decimal import Decimal
+from io import BytesIO
+from unittest import mock
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 
 # Create your tests here.
 from django.utils import timezone
-
-from marer.models import Issue, User
+from django.utils.formats import number_format
+
+from marer import consts
+from marer.models import DocumentGenerationJob, Issue, IssueClarification, IssueClarificationMessage, User
+from marer.models.base import set_obj_update_time
+from marer.models.external import SupplierContractStats
+from marer.models.issue import ISSUE_SAVE_EFFECTS, IssueExternalSnapshot
+from marer.serializers import ConclusionBatchSerializer
+from marer.utils import declension, kontur
+from marer.utils.documents import get_compiled_docx_template, get_compiled_xlsx_template, \
+    get_template_issue_dependencies
+from marer.utils.formatting import sum_str_format, sum_str_format_many
 from marer.utils.issue import CalculateUnderwritingCriteria
+from marer.utils.morph import MorpherApi
+from marer.utils.other import TenderInfoError, fetch_tender_info, file_content_hash, get_tender_info
+from marer.utils.side_effects import SideEffectRegistry
 
 
 class IssueTestCase(TestCase):
@@ -639,3 +663,589 @@ class IssueTestCase(TestCase):
         issue.refresh_from_db()
         data = CalculateUnderwritingCriteria().calc(issue)
         self.assertEqual(data['score_11'], 0)
+
+
+class DeclensionTestCase(SimpleTestCase):
+
+    def test_fio(self):
+        self.assertEqual(declension.decline('Иванов Иван Иванович', 'Р'), 'Иванова Ивана Ивановича')
+        self.assertEqual(declension.decline('Толстой Лев Николаевич', 'Т'), 'Толстым Львом Николаевичем')
+        self.assertEqual(declension.decline('Петрова Анна Сергеевна', 'Д'), 'Петровой Анне Сергеевне')
+        self.assertEqual(declension.decline('Шевченко Ольга Петровна', 'Р'), 'Шевченко Ольги Петровны')
+        self.assertIsNone(declension.decline('Кравец Иван Иванович', 'Р'))
+        self.assertIsNone(declension.decline('Алиев Рашид Гасан оглы', 'Р'))
+
+    def test_legal_forms(self):
+        self.assertEqual(declension.decline('ООО "Ромашка"', 'Т'), 'ООО "Ромашка"')
+        self.assertEqual(
+            declension.decline('Общество с ограниченной ответственностью «Ромашка»', 'Т'),
+            'Обществом с ограниченной ответственностью «Ромашка»'
+        )
+        self.assertEqual(declension.decline('АКЦИОНЕРНОЕ ОБЩЕСТВО "ГАЗ"', 'Р'), 'АКЦИОНЕРНОГО ОБЩЕСТВА "ГАЗ"')
+        self.assertEqual(declension.decline('ИП Сидоров Пётр Кузьмич', 'Р'), 'ИП Сидорова Петра Кузьмича')
+        self.assertIsNone(declension.decline('ГОСУДАРСТВЕННОЕ БЮДЖЕТНОЕ УЧРЕЖДЕНИЕ ГОРОДА МОСКВЫ', 'Р'))
+
+    def test_placement_types(self):
+        self.assertEqual(declension.decline('Электронный аукцион', 'Р'), 'Электронного аукциона')
+        self.assertEqual(
+            declension.decline('Открытый конкурс в электронной форме', 'Р'),
+            'Открытого конкурса в электронной форме'
+        )
+        self.assertEqual(declension.decline('Запрос котировок', 'Р'), 'Запроса котировок')
+        self.assertIsNone(declension.decline('Поставка медицинского оборудования', 'Д'))
+
+
+class MorpherPrefetchTestCase(TestCase):
+
+    def test_prefetch(self):
+        texts = ['ООО "Ромашка"', 'Поставка медицинского оборудования {}'.format(random.random())]
+        response = {'Р': 'Поставки медицинского оборудования'}
+        with mock.patch.object(MorpherApi, '_request', return_value=response) as request:
+            MorpherApi.prefetch(texts)
+            MorpherApi.prefetch(texts)
+        # правила склоняют организацию сами, в сервис уходит только описание и только один раз
+        request.assert_called_once_with(' '.join(texts[1].split()))
+        self.assertEqual(MorpherApi.get_declension(texts[1]), response)
+
+
+class TenderInfoTestCase(SimpleTestCase):
+
+    def get_tender_info(self, gos_number, status_code):
+        client = mock.Mock()
+        client.get.return_value = mock.Mock(status_code=status_code, text='')
+        with mock.patch('marer.utils.other.get_client', return_value=client), \
+                mock.patch('marer.utils.other._cache_get', return_value=None), \
+                mock.patch('marer.utils.other._cache_set') as cache_set:
+            return get_tender_info(gos_number), cache_set
+
+    def test_not_found_is_cached(self):
+        tender_data, cache_set = self.get_tender_info('0123456789012345678', 404)
+        self.assertIsNone(tender_data)
+        cache_set.assert_called_once_with(
+            'tender_info:0123456789012345678', None, settings.TENDER_INFO_NEGATIVE_CACHE_TTL
+        )
+
+    def test_unknown_length_not_found(self):
+        tender_data, cache_set = self.get_tender_info('12345', 404)
+        self.assertEqual(tender_data, {})
+
+    def test_server_error_is_not_cached(self):
+        tender_data, cache_set = self.get_tender_info('0123456789012345678', 503)
+        self.assertEqual(tender_data, {})
+        cache_set.assert_not_called()
+
+    def test_fetch_raises_on_server_error(self):
+        client = mock.Mock()
+        client.get.return_value = mock.Mock(status_code=503, text='')
+        with mock.patch('marer.utils.other.get_client', return_value=client), \
+                mock.patch('marer.utils.other._cache_get', return_value=None):
+            with self.assertRaises(TenderInfoError):
+                fetch_tender_info('0123456789012345678')
+
+
+class DocumentTemplateTestCase(SimpleTestCase):
+
+    def get_template(self, name):
+        return get_compiled_docx_template(os.path.join(settings.BASE_DIR, 'marer', 'templates', 'documents', name))
+
+    def test_issue_attributes(self):
+        template = self.get_template('payment_of_fee.docx')
+        self.assertEqual(
+            template.issue_attributes,
+            {'bank_account_for_payment_fee', 'bank_commission', 'issuer_full_name'},
+        )
+
+        template = self.get_template('issue_application_doc.docx')
+        self.assertIn('founders_with_25_share', template.issue_attributes)
+        self.assertNotIn('bg_property', template.issue_attributes)
+
+    def test_compiled_template_is_reused(self):
+        self.assertIs(self.get_template('payment_of_fee.docx'), self.get_template('payment_of_fee.docx'))
+
+    def get_parts_state(self, template):
+        return [(info.header_offset, info.CRC, info.compress_size) for info, _ in template.parts]
+
+    def test_render_keeps_template_parts(self):
+        template = self.get_template('payment_of_fee.docx')
+        state = self.get_parts_state(template)
+        for _ in range(2):
+            with zipfile.ZipFile(BytesIO(template.render({}))) as archive:
+                self.assertIsNone(archive.testzip())
+        self.assertEqual(self.get_parts_state(template), state)
+
+    def test_xlsx_placeholder_cells(self):
+        template = get_compiled_xlsx_template(
+            os.path.join(settings.BASE_DIR, 'marer', 'templates', 'documents', 'issue_application_doc.xlsx'))
+        self.assertIn('issuer_inn', template.issue_attributes)
+        self.assertEqual(set(template.sheets), {'xl/worksheets/sheet1.xml', 'xl/worksheets/sheet6.xml'})
+        chunks, cells = template.sheets['xl/worksheets/sheet6.xml']
+        self.assertEqual(len(chunks), len(cells) + 1)
+
+        state = self.get_parts_state(template)
+        for _ in range(2):
+            stream = BytesIO()
+            template.render({}, stream)
+            with zipfile.ZipFile(stream) as archive:
+                self.assertIsNone(archive.testzip())
+        self.assertEqual(self.get_parts_state(template), state)
+
+    def test_application_doc_dependencies(self):
+        fields, related_sets = get_template_issue_dependencies(self.get_template('issue_application_doc.docx'))
+        self.assertIn('issuer_head_passport_series', fields)
+        self.assertIn('issuer_finance_situation', fields)
+        self.assertNotIn('private_comment', fields)
+        self.assertNotIn('manager', fields)
+        self.assertIn('org_bank_accounts', related_sets)
+        # профиль агента и лицензии отслеживаются флагом и датой окончания лицензий
+        self.assertIn('user', fields)
+        self.assertIn('user', related_sets)
+        self.assertIn('issuer_licences', related_sets)
+
+        issue = Issue(issuer_inn='7701234567')
+        self.assertEqual(issue.get_changed_fields(), set())
+        issue.private_comment = 'проверка'
+        self.assertEqual(issue.get_changed_fields() & fields, set())
+        issue.issuer_inn = '7707654321'
+        self.assertEqual(issue.get_changed_fields() & fields, {'issuer_inn'})
+
+    def test_content_hash_ignores_relationships(self):
+        def make_docx(rels):
+            buffer = BytesIO()
+            with zipfile.ZipFile(buffer, 'w') as archive:
+                archive.writestr('word/document.xml', '<w:document/>')
+                archive.writestr('word/_rels/document.xml.rels', rels)
+            buffer.seek(0)
+            return buffer
+
+        self.assertEqual(
+            file_content_hash(make_docx('<a/>'), 'a.docx'),
+            file_content_hash(make_docx('<b/>'), 'b.docx')
+        )
+        self.assertNotEqual(file_content_hash(make_docx('<a/>'), 'a.docx'), file_content_hash(BytesIO(b'plain')))
+        # остальные архивы хешируются побайтно
+        self.assertNotEqual(
+            file_content_hash(make_docx('<a/>'), 'a.xlsx'),
+            file_content_hash(make_docx('<b/>'), 'b.xlsx')
+        )
+
+
+class ConclusionBatchTestCase(SimpleTestCase):
+
+    def test_conclusion_template_path(self):
+        self.assertTrue(Issue(bg_sum=400000).get_conclusion_template_path(consts.CONCLUSION_SEC_DEP).endswith(
+            'issue_sec_dep_conclusion_up_to_500000.docx'))
+        self.assertTrue(Issue(bg_sum=2000000).get_conclusion_template_path(consts.CONCLUSION_DOC_OPS_MGMT).endswith(
+            'issue_domc_from_1500000.docx'))
+        self.assertTrue(Issue(bg_sum=2000000).get_conclusion_template_path(consts.CONCLUSION_LAWYERS_DEP).endswith(
+            'issue_lawyers_conclusion.docx'))
+
+    def test_batch_serializer(self):
+        ser = ConclusionBatchSerializer(data=dict(issues=[3, 1, 3], conclusion_type=consts.CONCLUSION_SEC_DEP))
+        self.assertTrue(ser.is_valid())
+        self.assertEqual(ser.validated_data['issues'], [3, 1])
+
+        ser = ConclusionBatchSerializer(data=dict(
+            issues=list(range(settings.CONCLUSION_BATCH_MAX_ISSUES + 1)),
+            conclusion_type=consts.CONCLUSION_SEC_DEP,
+        ))
+        self.assertFalse(ser.is_valid())
+        self.assertFalse(ConclusionBatchSerializer(data=dict(issues=[1], conclusion_type='unknown')).is_valid())
+
+
+def legacy_sum_str_format(value):
+    """ Прежняя реализация sum_str_format, эталон для сравнения """
+    zero = 'ноль'
+    ten = (
+        ('', 'один', 'два', 'три', 'четыре', 'пять', 'шесть', 'семь', 'восемь', 'девять'),
+        ('', 'одна', 'две', 'три', 'четыре', 'пять', 'шесть', 'семь', 'восемь', 'девять'),
+    )
+    a20 = [
+        'десять', 'одиннадцать', 'двенадцать', 'тринадцать', 'четырнадцать', 'пятнадцать',
+        'шестнадцать', 'семнадцать', 'восемнадцать', 'девятнадцать'
+    ]
+    tens = [
+        '', '', 'двадцать', 'тридцать', 'сорок', 'пятьдесят', 'шестьдесят', 'семьдесят', 'восемьдесят', 'девяносто'
+    ]
+    hundred = [
+        '', 'сто', 'двести', 'триста', 'четыреста', 'пятьсот', 'шестьсот', 'семьсот', 'восемьсот', 'девятьсот'
+    ]
+    unit = [  # Units
+        ['копейка', 'копейки', 'копеек', 1],
+        ['рубль', 'рубля', 'рублей', 1],
+        ['тысяча', 'тысячи', 'тысяч', 1],
+        ['миллион', 'миллиона', 'миллионов', 0],
+        ['миллиард', 'милиарда', 'миллиардов', 0],
+    ]
+
+    value = str(value).replace(' ', '')
+    if '.' in value:
+        rub, kop = ('%3.2f' % float(value)).split('.')
+    elif ',' in value:
+        rub, kop = ('%3.2f' % float(value)).split(',')
+    else:
+        rub = float(value)
+        kop = 0
+
+    digits = []
+    currency = []
+
+    def split_by_groups(value: str, count: int):
+        value = str(int(value))
+        extended_length = len(value) * 1.0 / count
+        extended_value = value.rjust(math.ceil(extended_length) * count, '0')
+        return [extended_value[i: i + count] for i in range(0, len(extended_value), count)]
+
+    def morph(value, var1, var2, var3):
+        value = abs(int(value)) % 100
+        if value > 10 and value < 20:
+            return var3
+        value = value % 10
+        if value > 1 and value < 5:
+            return var2
+        if value == 1:
+            return var1
+        return var3
+
+    if int(rub) > 0:
+        groups = split_by_groups(rub, 3)
+        rub_formatted = str(number_format(rub, force_grouping=True))
+        for id, group in enumerate(groups):
+            i1, i2, i3 = list([int(g) for g in group])
+            unit_id = len(groups) - id
+            current_unit = unit[unit_id]
+            gender = current_unit[3]
+            if i1 > 0:
+                digits.append(hundred[i1])
+            if i2 > 1:
+                if i3 != 0:
+                    text = tens[i2] + ' ' + ten[gender][i3]
+                else:
+                    text = tens[i2]  # 20-99
+                digits.append(text)
+            else:
+                if i2 > 0:
+                    text = a20[i3]
+                else:
+                    text = ten[gender][i3]  # 10-19 | 1-9
+                digits.append(text)
+            if unit_id > 0:
+                if id == len(groups) - 1:
+                    currency.append(morph(group, *current_unit[:3]))
+                elif int(group) > 0:
+                    digits.append(morph(group, *current_unit[:3]))
+        currency.append(str(kop))
+        currency.append(morph(kop, *unit[0][:3]))
+    digits_str = ' '.join(digits).strip()
+    return rub_formatted + ' (' + digits_str.capitalize() + ') ' + ' '.join(currency).strip()
+
+
+class SumStrFormatTestCase(SimpleTestCase):
+
+    def random_amounts(self, count):
+        rnd = random.Random(20180323)
+        for _ in range(count):
+            value = rnd.randint(100, 10 ** rnd.randint(3, 14) - 1)
+            kind = rnd.choice(('decimal', 'int', 'float', 'str'))
+            if kind == 'decimal':
+                yield (Decimal(value) / 100).quantize(Decimal('0.01'))
+            elif kind == 'int':
+                yield value // 100
+            elif kind == 'float':
+                yield value / 100
+            else:
+                yield '{:,}'.format(value // 100).replace(',', ' ')
+
+    def test_same_as_legacy(self):
+        for value in self.random_amounts(2000):
+            try:
+                expected = legacy_sum_str_format(value)
+            except IndexError:
+                with self.assertRaises(IndexError):
+                    sum_str_format(value)
+                continue
+            self.assertEqual(sum_str_format(value), expected, value)
+
+    def test_many(self):
+        values = list(self.random_amounts(200)) * 2
+        self.assertEqual(sum_str_format_many(values), [sum_str_format(value) for value in values])
+
+    def test_less_than_one_rouble(self):
+        for value in (0, Decimal('0.50'), -10):
+            with self.assertRaises(ValueError):
+                sum_str_format(value)
+
+
+class SideEffectRegistryTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.calls = []
+        self.registry = SideEffectRegistry()
+
+        @self.registry.register(fields=('bg_sum', 'tax_system'))
+        def by_fields(instance):
+            self.calls.append('by_fields')
+
+        @self.registry.register(condition=lambda instance, changed_fields: 'comment' not in changed_fields)
+        def by_condition(instance):
+            self.calls.append('by_condition')
+
+        @self.registry.register(fields=('tax_system',), background=True)
+        def in_background(instance):
+            self.calls.append('in_background')
+
+    def selected(self, changed_fields, created=False, exclude=()):
+        return [e.name for e in self.registry.select(None, set(changed_fields), created, exclude=exclude)]
+
+    def test_select(self):
+        self.assertEqual(self.selected({'comment'}), [])
+        self.assertEqual(self.selected({'bg_sum'}), ['by_fields', 'by_condition'])
+        self.assertEqual(self.selected({'tax_system', 'comment'}), ['by_fields', 'in_background'])
+        self.assertEqual(self.selected({'comment'}, created=True), ['by_fields', 'by_condition', 'in_background'])
+        self.assertEqual(self.selected({'tax_system'}, exclude=('by_fields',)), ['by_condition', 'in_background'])
+
+    @override_settings(SIDE_EFFECTS_BACKGROUND=False)
+    def test_run_inline_without_background_pool(self):
+        for effect in self.registry.effects.values():
+            self.registry.run(effect, None)
+        self.assertEqual(self.calls, ['by_fields', 'by_condition', 'in_background'])
+
+    def test_run_inline_logs_errors(self):
+        @self.registry.register()
+        def failing(instance):
+            raise IOError('storage is unavailable')
+
+        with self.assertLogs('django', 'ERROR'):
+            self.registry.run(self.registry.effects['failing'], None)
+
+    def test_issue_effects(self):
+        effects = ISSUE_SAVE_EFFECTS.effects
+        self.assertEqual(list(effects), ['refresh_application_doc', 'create_propose_documents'])
+        self.assertTrue(effects['create_propose_documents'].background)
+        # сохранение, меняющее только комментарий, не запускает формирование документов
+        issue = Issue(id=1)
+        # заявление задается после создания, чтобы __init__ не загружал его из базы
+        issue.application_doc_id = 1
+        issue.comment = 'комментарий'
+        self.assertEqual(ISSUE_SAVE_EFFECTS.select(issue, {'comment'}, False), [])
+        # но после окончания выведенной в заявлении лицензии заявление перезаполняется
+        issue.application_doc_valid_until = timezone.now().date()
+        self.assertEqual(
+            [effect.name for effect in ISSUE_SAVE_EFFECTS.select(issue, {'comment'}, False)],
+            ['refresh_application_doc']
+        )
+
+
+class TrackedFieldsTestCase(SimpleTestCase):
+
+    def loaded_issue(self):
+        issue = Issue(id=1, comment='комментарий', bg_sum=Decimal('1000000.00'), tax_system=consts.TAX_USN)
+        issue._state.adding = False
+        return issue
+
+    def test_new_issue_is_saved_entirely(self):
+        self.assertIsNone(Issue(comment='комментарий').get_update_fields())
+
+    def test_only_changed_fields_and_updated_at(self):
+        issue = self.loaded_issue()
+        issue.comment = 'новый комментарий'
+        issue.bg_sum = Decimal('1000000.00')
+        issue.tax_system = consts.TAX_USN
+        self.assertEqual(issue.get_changed_fields(), {'comment'})
+        self.assertEqual(issue.get_update_fields(), {'comment', 'updated_at'})
+
+    def test_unchanged_issue_updates_only_updated_at(self):
+        self.assertEqual(self.loaded_issue().get_update_fields(), {'updated_at'})
+
+
+class BeneficiarZakupkiTestCase(TestCase):
+
+    def test_missing_customer_is_cached(self):
+        with mock.patch('marer.models.issue.cache') as cache, \
+                mock.patch('marer.models.issue.get_feed', return_value=dict(entries=[])):
+            cache.get.return_value = None
+            self.assertFalse(Issue(tender_responsible_inn='7701234567').check_beneficiar_on_zakupkigov({'q4005': 0}))
+        cache.set.assert_called_once_with(
+            'zakupki_customer_missing:7701234567', True, settings.ZAKUPKI_CUSTOMER_NEGATIVE_CACHE_TTL)
+
+    def test_cached_or_empty_inn_is_not_requested(self):
+        with mock.patch('marer.models.issue.cache') as cache, \
+                mock.patch('marer.models.issue.get_feed') as get_feed:
+            cache.get.return_value = True
+            self.assertFalse(Issue(tender_responsible_inn='7701234567').check_beneficiar_on_zakupkigov({'q4005': 0}))
+            self.assertFalse(Issue().check_beneficiar_on_zakupkigov({'q4005': 0}))
+        get_feed.assert_not_called()
+
+
+class TouchIssueTestCase(TestCase):
+
+    def test_touch_is_coalesced_in_transaction(self):
+        user = User()
+        user.save()
+        issue = Issue(user=user)
+        issue.save()
+
+        with CaptureQueriesContext(connection) as queries:
+            with transaction.atomic():
+                for _ in range(8):
+                    set_obj_update_time(issue)
+                touches = [func for _, func in connection.run_on_commit if getattr(func, 'touch_key', None)]
+        # до фиксации заявка не сохраняется, при фиксации будет один UPDATE updated_at
+        self.assertEqual([q for q in queries.captured_queries if q['sql'].startswith('UPDATE')], [])
+        self.assertEqual(len(touches), 1)
+        self.assertEqual(issue.get_changed_fields(), set())
+
+    def test_clarification_touches_issue_without_loading_it(self):
+        user = User()
+        user.save()
+        issue = Issue(user=user)
+        issue.save()
+
+        with CaptureQueriesContext(connection) as queries:
+            with transaction.atomic():
+                IssueClarification(issue_id=issue.id, initiator=consts.IFOPC_INITIATOR_ISSUER).save()
+                IssueClarificationMessage(issue_id=issue.id, message='вопрос').save()
+                touches = [func.touch_key for _, func in connection.run_on_commit if getattr(func, 'touch_key', None)]
+        self.assertEqual([q for q in queries.captured_queries if '"marer_issue"' in q['sql']], [])
+        self.assertEqual(touches, [('marer.Issue', issue.id, 'updated_at')])
+
+
+class ApplicationDocOutdatedTestCase(TestCase):
+
+    def test_user_profile_change(self):
+        user = User()
+        user.save()
+        issue = Issue(user=user)
+        issue.save()
+        Issue.objects.filter(id=issue.id).update(application_doc_outdated=False)
+
+        user.last_login = timezone.now()
+        user.save(update_fields=['last_login'])
+        self.assertFalse(Issue.objects.get(id=issue.id).application_doc_outdated)
+
+        user.phone = '+7 495 000-00-00'
+        user.save()
+        self.assertTrue(Issue.objects.get(id=issue.id).application_doc_outdated)
+
+    def test_save_marks_outdated_until_refreshed(self):
+        user = User()
+        user.save()
+        issue = Issue(user=user)
+        issue.save()
+        Issue.objects.filter(id=issue.id).update(application_doc_outdated=False)
+
+        # действие выполняется после фиксации; пока оно не сбросило флаг, заявление считается устаревшим
+        issue = Issue.objects.get(id=issue.id)
+        issue.issuer_inn = '7701234567'
+        issue.save()
+        self.assertTrue(Issue.objects.get(id=issue.id).application_doc_outdated)
+
+
+class SupplierContractStatsTestCase(TestCase):
+
+    def test_unknown_inn_is_not_requested(self):
+        with mock.patch('marer.utils.zakupki.get_finished_contracts_counts') as get_counts:
+            stats = SupplierContractStats.get_for_inn('7701234567')
+        get_counts.assert_not_called()
+        self.assertFalse(stats.is_known)
+        self.assertEqual(stats.total_count, 0)
+        self.assertFalse(SupplierContractStats.objects.filter(inn='7701234567').exists())
+
+    def test_prefetch_stores_counts(self):
+        issue = Issue(issuer_inn='7701234567')
+        with mock.patch('marer.utils.zakupki.get_finished_contracts_counts', return_value=(3, 2)):
+            issue.prefetch_external_data(['contracts'])
+        self.assertEqual(issue.finished_contracts_count, 5)
+
+
+class DocumentGenerationJobTestCase(TestCase):
+
+    def test_late_refresh_does_not_reopen_job(self):
+        user = User()
+        user.save()
+        issue = Issue(user=user)
+        issue.save()
+        job = DocumentGenerationJob.objects.create(issue=issue)
+        first, second = [job.tasks.create(issue_field=field, template_path='', file_name='') for field in ('one', 'two')]
+
+        first.status = second.status = consts.DOCUMENT_JOB_STATUS_DONE
+        first.save()
+        second.save()
+        job.refresh_status()
+        self.assertEqual(job.status, consts.DOCUMENT_JOB_STATUS_DONE)
+
+        # пересчет, посчитавший задачи до фиксации соседней, видит пакет незавершенным
+        with mock.patch.object(DocumentGenerationJob, 'get_progress', return_value=dict(total=2, done=1, failed=0)):
+            job.refresh_status()
+        self.assertEqual(job.status, consts.DOCUMENT_JOB_STATUS_DONE)
+        self.assertEqual(DocumentGenerationJob.objects.get(id=job.id).status, consts.DOCUMENT_JOB_STATUS_DONE)
+
+
+class ExternalSnapshotTestCase(TestCase):
+
+    def test_failed_request_is_not_stored(self):
+        user = User()
+        user.save()
+        issue = Issue(user=user, issuer_inn='7701234567', issuer_ogrn='1027700000000')
+        issue.save()
+        snapshot = issue.issuer_snapshot
+
+        with mock.patch('marer.utils.kontur.analytics', side_effect=kontur.KonturError('status code 500')):
+            with self.assertRaises(kontur.KonturError):
+                snapshot.get_analytics()
+        snapshot.refresh_from_db()
+        self.assertIsNone(snapshot.analytics_fetched_at)
+
+        with mock.patch('marer.utils.kontur.analytics', return_value={'analytics': {'m4001': True}}):
+            self.assertTrue(issue.issuer_presence_in_unfair_suppliers_registry)
+        snapshot.refresh_from_db()
+        self.assertIsNotNone(snapshot.analytics_fetched_at)
+
+    def test_prefetch_stores_only_successful_methods(self):
+        user = User()
+        user.save()
+        issue = Issue(user=user, issuer_inn='7701234567', issuer_ogrn='1027700000000')
+        issue.save()
+
+        def api_request(method, inn, ogrn):
+            if method == 'analytics':
+                raise kontur.KonturError('status code 503')
+            return [{'inn': inn}]
+
+        with mock.patch('marer.utils.kontur._cached_api_request', side_effect=api_request):
+            issue.prefetch_external_data(['issuer_analytics', 'issuer_egr_details'])
+        snapshot = IssueExternalSnapshot.objects.get(issue=issue, inn=issue.issuer_inn)
+        self.assertIsNone(snapshot.analytics_fetched_at)
+        self.assertEqual(snapshot.get_egr_details(), {'inn': issue.issuer_inn})
+
+    def test_failed_tender_is_not_stored(self):
+        user = User()
+        user.save()
+        issue = Issue(user=user, tender_responsible_inn='7702345678', tender_gos_number='0373100000000000001')
+        issue.save()
+        snapshot = issue.beneficiary_snapshot
+
+        with mock.patch('marer.models.issue.fetch_tender_info', side_effect=TenderInfoError('timed out')):
+            with self.assertRaises(TenderInfoError):
+                snapshot.get_tender(issue.tender_gos_number)
+        snapshot.refresh_from_db()
+        self.assertIsNone(snapshot.tender_fetched_at)
+
+        with mock.patch('marer.models.issue.fetch_tender_info', return_value=None):
+            self.assertEqual(snapshot.get_tender(issue.tender_gos_number), {})
+        snapshot.refresh_from_db()
+        self.assertIsNotNone(snapshot.tender_fetched_at)
+
+    def test_ogrn_change_resets_snapshot(self):
+        user = User()
+        user.save()
+        issue = Issue(user=user, issuer_inn='7701234567', issuer_ogrn='1027700000000')
+        issue.save()
+        snapshot = issue.issuer_snapshot
+        snapshot.set_payload('analytics', {})
+        snapshot.save()
+
+        issue = Issue.objects.get(id=issue.id)
+        issue.issuer_ogrn = '1027700000001'
+        snapshot = issue.issuer_snapshot
+        self.assertEqual(snapshot.ogrn, '1027700000001')
+        self.assertIsNone(snapshot.analytics_fetched_at)
@@ -45,6 +45,7 @@ urlpatterns = [
     url(r'^rest/bank_commission$', csrf_exempt(rest.IssueBankCommissionView.as_view()), name='rest_bank_commission'),
 
     url(r'^rest/issues$', rest.IssuesView.as_view(), name='rest_issues'),
+    url(r'^rest/issues/generate_conclusions$', rest.IssuesGenerateConclusionsView.as_view(), name='rest_issues_generate_conclusions'),
     url(r'^rest/issue/(?P<iid>\d+)$', rest.IssueView.as_view(), name='rest_issue'),
     url(r'^rest/issue/(?P<iid>\d+)/sec-dep-mgmt$', rest.IssueSecDepView.as_view(), name='rest_issue_sec_dep_mgmt'),
     url(r'^rest/issue/(?P<iid>\d+)/doc-ops-mgmt$', rest.IssueDocOpsView.as_view(), name='rest_issue_doc_ops_mgmt'),
@@ -53,6 +54,7 @@ urlpatterns = [
     url(r'^rest/issue/(?P<iid>\d+)/generate_lawyers_dep_conclusion_doc$', rest.IssueGenerateLawyersDepConclusionDocView.as_view(), name='rest_generate_lawyers_dep_conclusion_doc'),
     url(r'^rest/issue/(?P<iid>\d+)/generate_sec-dep-mgmt$', rest.IssueGenerateSecDepMgmtView.as_view(), name='rest_generate_sec-dep-mgmt'),
     url(r'^rest/issue/(?P<iid>\d+)/messages$', rest.IssueMessagesView.as_view(), name='rest_issue_messages'),
+    url(r'^rest/issue/(?P<iid>\d+)/document_jobs$', rest.IssueDocumentJobsView.as_view(), name='rest_issue_document_jobs'),
     url(r'^rest/profile$', rest.ProfileView.as_view(), name='rest_profile'),
 
     url(r'^issue/(?P<iid>\d+)/docs-zip/$', rest.DocsZipView.as_view(), name='docs_zip'),
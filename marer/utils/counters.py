@@ -0,0 +1,44 @@
+import logging
+
+from django.core.cache import cache
+
+logger = logging.getLogger('django')
+
+COUNTER_KEY = 'counters:{}:{}:{}'
+
+
+def _counter_key(namespace: str, name: str, field: str):
+    return COUNTER_KEY.format(namespace, name, field)
+
+
+def incr(namespace: str, name: str, field: str, delta: int=1):
+    """
+    Увеличивает счетчик в общем кеше, чтобы статистика собиралась
+    со всех воркеров. Ошибки кеша не должны ломать основной запрос.
+    """
+    key = _counter_key(namespace, name, field)
+    try:
+        if not cache.add(key, delta, None):
+            cache.incr(key, delta)
+    except Exception as e:
+        logger.warning('Unable to increment counter {}: {}'.format(key, e))
+
+
+def get_counters(namespace: str, names, fields) -> dict:
+    keys = {(name, field): _counter_key(namespace, name, field) for name in names for field in fields}
+    try:
+        values = cache.get_many(list(keys.values()))
+    except Exception as e:
+        logger.warning('Unable to read counters {}: {}'.format(namespace, e))
+        values = {}
+    result = {}
+    for (name, field), key in keys.items():
+        result.setdefault(name, {})[field] = values.get(key, 0) or 0
+    return result
+
+
+def reset_counters(namespace: str, names, fields):
+    try:
+        cache.delete_many([_counter_key(namespace, name, field) for name in names for field in fields])
+    except Exception as e:
+        logger.warning('Unable to reset counters {}: {}'.format(namespace, e))
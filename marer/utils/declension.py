@@ -0,0 +1,300 @@
+import re
+
+CASES = ('Р', 'Д', 'Т')
+
+VOWELS = 'аеёиоуыэюя'
+HUSHING = 'жшчщц'
+VELAR_OR_HUSHING = 'гкхжшчщ'
+
+QUOTES = '«"“\''
+
+CYRILLIC_WORD = re.compile(r'^[А-Яа-яЁё]+$')
+
+LEGAL_FORM_ABBREVIATIONS = ('ООО', 'АО', 'ПАО', 'НАО', 'ЗАО', 'ОАО', 'ГУП', 'МУП', 'ФГУП')
+INDIVIDUAL_ABBREVIATION = 'ИП'
+
+# полные наименования организационно-правовых форм: именительный, родительный, дательный, творительный
+LEGAL_FORMS = (
+    ('общество с ограниченной ответственностью',
+     'общества с ограниченной ответственностью',
+     'обществу с ограниченной ответственностью',
+     'обществом с ограниченной ответственностью'),
+    ('публичное акционерное общество',
+     'публичного акционерного общества',
+     'публичному акционерному обществу',
+     'публичным акционерным обществом'),
+    ('непубличное акционерное общество',
+     'непубличного акционерного общества',
+     'непубличному акционерному обществу',
+     'непубличным акционерным обществом'),
+    ('закрытое акционерное общество',
+     'закрытого акционерного общества',
+     'закрытому акционерному обществу',
+     'закрытым акционерным обществом'),
+    ('открытое акционерное общество',
+     'открытого акционерного общества',
+     'открытому акционерному обществу',
+     'открытым акционерным обществом'),
+    ('акционерное общество',
+     'акционерного общества',
+     'акционерному обществу',
+     'акционерным обществом'),
+)
+INDIVIDUAL_FORM = (
+    'индивидуальный предприниматель',
+    'индивидуального предпринимателя',
+    'индивидуальному предпринимателю',
+    'индивидуальным предпринимателем',
+)
+
+# главные слова способов определения поставщика: формы и род
+PLACEMENT_NOUNS = {
+    'аукцион': (('аукциона', 'аукциону', 'аукционом'), 'm'),
+    'конкурс': (('конкурса', 'конкурсу', 'конкурсом'), 'm'),
+    'запрос': (('запроса', 'запросу', 'запросом'), 'm'),
+    'отбор': (('отбора', 'отбору', 'отбором'), 'm'),
+    'закупка': (('закупки', 'закупке', 'закупкой'), 'f'),
+    'торги': (('торгов', 'торгам', 'торгами'), 'pl'),
+}
+
+ADJECTIVE_ENDINGS = {
+    'm': (
+        (('ый', 'ой'), ('ого', 'ому', 'ым')),
+        (('кий', 'гий', 'хий'), ('ого', 'ому', 'им')),
+        (('ий',), ('его', 'ему', 'им')),
+    ),
+    'f': (
+        (('ая',), ('ой', 'ой', 'ой')),
+        (('яя',), ('ей', 'ей', 'ей')),
+    ),
+    'pl': (
+        (('ые',), ('ых', 'ым', 'ыми')),
+        (('ие',), ('их', 'им', 'ими')),
+    ),
+}
+
+MALE_NAME_EXCEPTIONS = {
+    'павел': ('павла', 'павлу', 'павлом'),
+    'лев': ('льва', 'льву', 'львом'),
+    'пётр': ('петра', 'петру', 'петром'),
+    'петр': ('петра', 'петру', 'петром'),
+    'илья': ('ильи', 'илье', 'ильёй'),
+}
+FEMALE_NAME_EXCEPTIONS = {
+    'любовь': ('любови', 'любови', 'любовью'),
+}
+
+INDECLINABLE_SURNAME_ENDINGS = ('о', 'е', 'э', 'и', 'у', 'ю', 'ых', 'их')
+
+
+def _styled(source: str, result: str) -> str:
+    if len(source) > 1 and source.isupper():
+        return result.upper()
+    if source[:1].isupper():
+        return result[:1].upper() + result[1:]
+    return result
+
+
+def _with_endings(word: str, cut: int, endings) -> tuple:
+    stem = word[:len(word) - cut]
+    return tuple(_styled(word, stem.lower() + ending) for ending in endings)
+
+
+def _exact(word: str, forms) -> tuple:
+    return tuple(_styled(word, form) for form in forms)
+
+
+def _unchanged(word: str) -> tuple:
+    return word, word, word
+
+
+def _male_first_name(word: str):
+    w = word.lower()
+    if w in MALE_NAME_EXCEPTIONS:
+        return _exact(word, MALE_NAME_EXCEPTIONS[w])
+    last = w[-1]
+    if last in 'йь':
+        return _with_endings(word, 1, ('я', 'ю', 'ем'))
+    if last == 'а':
+        return _with_endings(word, 1, (
+            'и' if w[-2] in VELAR_OR_HUSHING else 'ы', 'е', 'ей' if w[-2] in HUSHING else 'ой'
+        ))
+    if last == 'я':
+        return _with_endings(word, 1, ('и', 'и' if w.endswith('ия') else 'е', 'ей'))
+    if last in VOWELS:
+        return None
+    return _with_endings(word, 0, ('а', 'у', 'ем' if last in HUSHING else 'ом'))
+
+
+def _female_first_name(word: str):
+    w = word.lower()
+    if w in FEMALE_NAME_EXCEPTIONS:
+        return _exact(word, FEMALE_NAME_EXCEPTIONS[w])
+    last = w[-1]
+    if last == 'а':
+        return _with_endings(word, 1, (
+            'и' if w[-2] in VELAR_OR_HUSHING else 'ы', 'е', 'ей' if w[-2] in HUSHING else 'ой'
+        ))
+    if last == 'я':
+        return _with_endings(word, 1, ('и', 'и' if w.endswith('ия') else 'е', 'ей'))
+    if last == 'ь':
+        return _with_endings(word, 1, ('и', 'и', 'ью'))
+    if last in VOWELS:
+        return None
+    return _unchanged(word)
+
+
+def _male_surname(word: str):
+    w = word.lower()
+    if w.endswith(INDECLINABLE_SURNAME_ENDINGS):
+        return _unchanged(word)
+    if w.endswith(('ский', 'цкий')):
+        return _with_endings(word, 2, ('ого', 'ому', 'им'))
+    if w.endswith(('ый', 'ой')):
+        return _with_endings(word, 2, ('ого', 'ому', 'ым'))
+    if w.endswith(('ов', 'ев', 'ёв', 'ин', 'ын')):
+        return _with_endings(word, 0, ('а', 'у', 'ым'))
+    if w.endswith(('ец', 'ок', 'ек', 'ёк', 'ей', 'ий')):
+        # беглые гласные и прилагательные на -ий без словаря не определить
+        return None
+    last = w[-1]
+    if last in 'йь':
+        return _with_endings(word, 1, ('я', 'ю', 'ем'))
+    if last in VOWELS:
+        return None
+    return _with_endings(word, 0, ('а', 'у', 'ем' if last in HUSHING else 'ом'))
+
+
+def _female_surname(word: str):
+    w = word.lower()
+    if w.endswith(INDECLINABLE_SURNAME_ENDINGS):
+        return _unchanged(word)
+    if w.endswith(('ова', 'ева', 'ёва', 'ина', 'ына')):
+        return _with_endings(word, 1, ('ой', 'ой', 'ой'))
+    if w.endswith('ая'):
+        return _with_endings(word, 2, ('ой', 'ой', 'ой'))
+    if w.endswith('яя'):
+        return _with_endings(word, 2, ('ей', 'ей', 'ей'))
+    if w[-1] in VOWELS:
+        return None
+    return _unchanged(word)
+
+
+def _fio_forms(words):
+    if len(words) != 3 or not all(CYRILLIC_WORD.match(word) for word in words):
+        return None
+    surname, name, patronymic = words
+    if patronymic.lower().endswith('ич'):
+        parts = (
+            _male_surname(surname),
+            _male_first_name(name),
+            _with_endings(patronymic, 0, ('а', 'у', 'ем')),
+        )
+    elif patronymic.lower().endswith('на'):
+        parts = (
+            _female_surname(surname),
+            _female_first_name(name),
+            _with_endings(patronymic, 1, ('ы', 'е', 'ой')),
+        )
+    else:
+        return None
+    if not all(parts):
+        return None
+    return tuple(' '.join(part[i] for part in parts) for i in range(3))
+
+
+def _adjective_forms(word: str, gender: str):
+    w = word.lower()
+    for endings, case_endings in ADJECTIVE_ENDINGS[gender]:
+        for ending in endings:
+            if w.endswith(ending):
+                return _with_endings(word, len(ending), case_endings)
+    return None
+
+
+def _placement_forms(words):
+    for index, word in enumerate(words):
+        noun = PLACEMENT_NOUNS.get(word.lower())
+        if noun is not None:
+            break
+    else:
+        return None
+
+    noun_forms, gender = noun
+    declined = []
+    for adjective in words[:index]:
+        forms = _adjective_forms(adjective, gender)
+        if forms is None:
+            return None
+        declined.append(forms)
+    declined.append(_exact(words[index], noun_forms))
+    tail = words[index + 1:]
+    return tuple(' '.join([forms[i] for forms in declined] + tail) for i in range(3))
+
+
+def _phrase_style_forms(source: str, forms) -> tuple:
+    if source.isupper():
+        return tuple(form.upper() for form in forms)
+    if source[:1].isupper():
+        return tuple(form[:1].upper() + form[1:] for form in forms)
+    return tuple(forms)
+
+
+def _legal_form_forms(text: str):
+    words = text.split()
+    if words[0] in LEGAL_FORM_ABBREVIATIONS:
+        rest = text[len(words[0]):].strip()
+        if rest[:1] in QUOTES:
+            return _unchanged(text)
+        return None
+    if words[0] == INDIVIDUAL_ABBREVIATION:
+        fio = _fio_forms(words[1:])
+        if fio is None:
+            return None
+        return tuple('{} {}'.format(INDIVIDUAL_ABBREVIATION, form) for form in fio)
+
+    lower_text = text.lower()
+    if lower_text.startswith(INDIVIDUAL_FORM[0]):
+        prefix = text[:len(INDIVIDUAL_FORM[0])]
+        fio = _fio_forms(text[len(prefix):].split())
+        if fio is None:
+            return None
+        prefix_forms = _phrase_style_forms(prefix, INDIVIDUAL_FORM[1:])
+        return tuple('{} {}'.format(prefix_forms[i], fio[i]) for i in range(3))
+
+    for legal_form in LEGAL_FORMS:
+        if lower_text.startswith(legal_form[0]):
+            prefix = text[:len(legal_form[0])]
+            rest = text[len(prefix):].strip()
+            if rest[:1] not in QUOTES:
+                return None
+            prefix_forms = _phrase_style_forms(prefix, legal_form[1:])
+            return tuple('{} {}'.format(prefix_forms[i], rest) for i in range(3))
+    return None
+
+
+def get_forms(text: str):
+    """
+    Родительный, дательный и творительный падежи для ФИО, наименований
+    организаций с организационно-правовой формой и способов определения
+    поставщика. Возвращает None, если правила не дают уверенного результата.
+    """
+    text = ' '.join((text or '').split())
+    if not text:
+        return None
+    words = text.split()
+    forms = _legal_form_forms(text)
+    if forms is None:
+        forms = _placement_forms(words)
+    if forms is None:
+        forms = _fio_forms(words)
+    if forms is None:
+        return None
+    return dict(zip(CASES, forms))
+
+
+def decline(text: str, case: str):
+    if case not in CASES:
+        return None
+    forms = get_forms(text)
+    return forms[case] if forms else None
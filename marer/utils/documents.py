@@ -1,46 +1,148 @@
-from copy import deepcopy
+from collections import ChainMap, OrderedDict
+from collections.abc import Mapping
+from copy import copy, deepcopy
 from io import BytesIO
 from string import Formatter
+from tempfile import SpooledTemporaryFile
+from xml.sax.saxutils import escape, quoteattr
+import logging
 import re
+import threading
+import time
+import zipfile
 
 import os
 
 import xlrd
 from django.conf import settings
-from django.core.files.base import ContentFile
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db import connection
+from django.db.models import prefetch_related_objects
+from django.core.files.base import ContentFile, File
 from django.utils import timezone
-from docx import Document
+from docx.oxml import parse_xml
+from docx.oxml.ns import qn
+from docx.table import Table
 from docx.text.paragraph import Paragraph
-from openpyxl import load_workbook
-from openpyxl.writer.excel import save_virtual_workbook
 from lxml import etree
 
 from marer import consts
 from marer.models import Issue, User
 
-
-def fill_xlsx_file_with_issue_data(path: str, issue: Issue, user: User = None) -> ContentFile:
-    wb = load_workbook(path)
-    self_data = issue.__dict__
-    self_data['clean_on_empty'] = ''
-    self_data['user'] = user
-    self_data['issue'] = issue
-    self_data['date_now'] = timezone.localdate(timezone.now(), timezone.get_current_timezone()).strftime('%d.%m.%Y')
-    for ws_name in wb.sheetnames:
-        ws = wb.get_sheet_by_name(ws_name)
-        for cell in ws.get_cell_collection():
-            if cell.value is not None:
-                old_cell_value = str(cell.value)
-                try:
-                    new_cell_value = old_cell_value.format(**self_data)
-                except KeyError:
-                    new_cell_value = old_cell_value
-                if new_cell_value != old_cell_value:
-                    cell.value = new_cell_value
-                cell.value = new_cell_value
-    cf = ContentFile(save_virtual_workbook(wb))
-    wb.close()
-    return cf
+logger = logging.getLogger('django')
+
+
+SPREADSHEET_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+
+
+def _xlsx_text(string_item) -> str:
+    """ Текст строки si/is без фонетических подсказок """
+    return ''.join(t.text or '' for t in string_item.xpath('./m:t|./m:r/m:t', namespaces={'m': SPREADSHEET_NS}))
+
+
+class CompiledXlsxTemplate:
+    """
+    Разобранный один раз xlsx-шаблон: для каждого листа запоминаются ячейки
+    с подстановками, а XML листа хранится кусками между ними. При заполнении
+    пишутся только эти ячейки (inline-строкой), остальные байты архива
+    переносятся без изменений.
+    """
+    SHARED_STRINGS_PART = 'xl/sharedStrings.xml'
+    WORKSHEET_PREFIX = 'xl/worksheets/'
+
+    def __init__(self, path: str):
+        self.path = path
+        self.mtime = os.path.getmtime(path)
+        with zipfile.ZipFile(path) as archive:
+            self.parts = [(info, archive.read(info.filename)) for info in archive.infolist()]
+
+        shared_strings = []
+        for info, data in self.parts:
+            if info.filename == self.SHARED_STRINGS_PART:
+                shared_strings = [_xlsx_text(si) for si in etree.fromstring(data).iterchildren('{%s}si' % SPREADSHEET_NS)]
+
+        placeholders = set()
+        # имя части листа -> (куски XML между ячейками, ячейки с подстановками)
+        self.sheets = {}
+        for info, data in self.parts:
+            if not (info.filename.startswith(self.WORKSHEET_PREFIX) and info.filename.endswith('.xml')):
+                continue
+            sheet = etree.fromstring(data)
+            cells = []
+            for c in sheet.iter('{%s}c' % SPREADSHEET_NS):
+                cell_type = c.get('t')
+                if cell_type == 's':
+                    value = c.find('{%s}v' % SPREADSHEET_NS)
+                    text = shared_strings[int(value.text)] if value is not None and value.text else ''
+                elif cell_type == 'inlineStr':
+                    string_item = c.find('{%s}is' % SPREADSHEET_NS)
+                    text = _xlsx_text(string_item) if string_item is not None else ''
+                else:
+                    continue
+                cell_placeholders = re.findall('{([^{}]*)}', text)
+                if not cell_placeholders:
+                    continue
+                placeholders.update(cell_placeholders)
+                cells.append((self._cell_open_tag(c), self._cell_close_tag(c), text))
+                c.addprevious(etree.Comment('xlsx-cell-{}'.format(len(cells) - 1)))
+                c.getparent().remove(c)
+            if cells:
+                chunks = re.split(
+                    b'<!--xlsx-cell-[0-9]+-->',
+                    etree.tostring(sheet, encoding='UTF-8', xml_declaration=True, standalone=True),
+                )
+                self.sheets[info.filename] = (chunks, cells)
+
+        self.placeholders = frozenset(placeholders)
+        self.issue_attributes = _referenced_attributes(self.placeholders)
+
+    @staticmethod
+    def _cell_open_tag(c) -> str:
+        prefix = c.prefix + ':' if c.prefix else ''
+        attributes = ''.join(
+            ' {}={}'.format(name, quoteattr(value)) for name, value in c.attrib.items() if name != 't'
+        )
+        return '<{p}c{attrs} t="inlineStr"><{p}is><{p}t xml:space="preserve">'.format(p=prefix, attrs=attributes)
+
+    @staticmethod
+    def _cell_close_tag(c) -> str:
+        prefix = c.prefix + ':' if c.prefix else ''
+        return '</{p}t></{p}is></{p}c>'.format(p=prefix)
+
+    def render_cell(self, text: str, data) -> str:
+        try:
+            return text.format_map(data)
+        except (KeyError, ValueError, IndexError):
+            return text
+
+    def render(self, data, stream) -> None:
+        with zipfile.ZipFile(stream, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for info, part_data in self.parts:
+                # writestr и open меняют смещение и размеры ZipInfo, а шаблон общий для потоков процесса
+                info = copy(info)
+                if info.filename not in self.sheets:
+                    archive.writestr(info, part_data)
+                    continue
+                chunks, cells = self.sheets[info.filename]
+                # ZipFile.open на запись появился только в python 3.6, лист собирается целиком
+                part = [chunks[0]]
+                for (open_tag, close_tag, text), chunk in zip(cells, chunks[1:]):
+                    value = re.sub('[\x00-\x08\x0b\x0c\x0e-\x1f]', '', self.render_cell(text, data))
+                    part.append((open_tag + escape(value) + close_tag).encode('utf-8'))
+                    part.append(chunk)
+                archive.writestr(info, b''.join(part))
+
+
+def fill_xlsx_file_with_issue_data(path: str, issue: Issue, user: User = None) -> File:
+    """
+    Результат пишется во временный файл, который остается в памяти только пока невелик.
+    """
+    template = get_compiled_xlsx_template(path)
+    prepare_issue_for_render(issue, template.issue_attributes)
+    stream = SpooledTemporaryFile(max_size=settings.DOCUMENT_SPOOL_MAX_SIZE)
+    template.render(get_issue_render_context(issue, user), stream)
+    stream.seek(0)
+    return File(stream, name=os.path.basename(path))
 
 
 def _optimize_paragraph(paragraph: Paragraph):
@@ -61,56 +163,287 @@ def _optimize_paragraph(paragraph: Paragraph):
             run.text = run.text[:open_brace_last_pos]
 
 
-def _fill_docx_paragraph_with_dict(paragraph: Paragraph, data: dict) -> None:
-    runs = paragraph.runs
-    _optimize_paragraph(paragraph)
-
-    for run in runs:
-        old_text = str(run.text)
+def _compile_paragraph_runs(p) -> list:
+    """
+    Шаблоны строк для прогонов абзаца с подстановками: каждая подстановка
+    обернута в ^...^, чтобы пустое значение превратилось в «нет».
+    """
+    compiled = []
+    for run_idx, r in enumerate(p.r_lst):
+        text = r.text
+        if '{' in text:
+            for found in set(re.findall('{[^}]*?}', text)):
+                text = text.replace(found, '^%s^' % found)
+            compiled.append((run_idx, text))
+    return compiled
+
+
+def _render_paragraph_runs(p, compiled_runs: list, data) -> None:
+    runs = p.r_lst
+    for run_idx, template in compiled_runs:
         try:
-            if '{' in old_text:
-                for found in set(re.findall('{[^}]*?}', old_text)):
-                    old_text = old_text.replace(found, '^%s^' % found)
-                new_text = old_text.format(**data)
-                new_text = new_text.replace('^^', 'нет').replace('^', '')
-            else:
-                new_text = old_text
-        except KeyError:
-            pass
-        except ValueError:
-            pass
-        except IndexError:
-            pass
-        else:
-            if old_text != new_text:
-                run.text = new_text
+            new_text = template.format_map(data)
+        except (KeyError, ValueError, IndexError):
+            continue
+        new_text = new_text.replace('^^', 'нет').replace('^', '')
+        if new_text != template:
+            runs[run_idx].text = new_text
+
+
+# связанные наборы, которые читают свойства заявки из шаблонов
+ISSUE_ATTRIBUTE_RELATED_SETS = {
+    'management_collegial_org_name': ('org_management_collegial',),
+    'management_collegial_fio': ('org_management_collegial',),
+    'management_directors_org_name': ('org_management_directors',),
+    'management_directors_fio': ('org_management_directors',),
+    'management_others_org_name': ('org_management_others',),
+    'management_others_fio': ('org_management_others',),
+    'founders_with_25_share': ('issuer_founders_legal', 'issuer_founders_physical'),
+    'licences_as_string': ('issuer_licences',),
+    # профиль агента: его изменения отмечает mark_user_application_docs_outdated
+    'user': ('user',),
+}
+
+# внешние данные, которые читают свойства заявки из шаблонов (см. Issue.prefetch_external_data)
+ISSUE_ATTRIBUTE_SOURCES = {
+    'bg_property': ('declension',),
+    'finished_contracts_count': ('contracts',),
+    'scoring_finished_contracts_count': ('contracts',),
+    'scoring_rating_sum': ('contracts',),
+    'scoring_credit_rating': ('contracts',),
+    'humanized_issuer_presence_in_unfair_suppliers_registry': ('issuer_analytics',),
+    'humanized_issuer_is_not_present_in_unfair_suppliers_registry': ('issuer_analytics',),
+    'humanized_is_not_issuer_liquidating_or_bankrupt': ('issuer_analytics',),
+    'humanized_last_account_period_net_assets_great_than_authorized_capital': ('issuer_egr_details',),
+    'humanized_final_documents_operations_management_conclusion': ('issuer_analytics', 'issuer_egr_details'),
+    'humanized_custom_if_need_additionally_contract_guarantee_issue_with_cost': ('beneficiary_tender',),
+}
+
+# поля и связанные наборы, из которых свойства заявки собирают текст для шаблонов
+ISSUE_ATTRIBUTE_DEPENDENCIES = {
+    'issuer_head_passport_info': (
+        'issuer_head_passport_series',
+        'issuer_head_passport_number',
+        'issuer_head_passport_issued_by',
+        'issuer_head_passport_issue_date',
+    ),
+    'humanized_issuer_finance_siuation': ('issuer_finance_situation',),
+    'bank_accounts': ('org_bank_accounts',),
+    'beneficiaries_owner': ('org_beneficiary_owners',),
+}
+
+# имена из контекста заполнения, которые не зависят от данных заявки
+TEMPLATE_CONTEXT_NAMES = frozenset(['issue', 'obj', 'clean_on_empty'])
+
+
+def _referenced_attributes(placeholders) -> frozenset:
+    """
+    Имена атрибутов заявки из подстановок: {issue.bg_property[bg_number]} -> bg_property,
+    {issuer_inn} -> issuer_inn, {issue.bank_accounts|for} -> bank_accounts.
+    """
+    attributes = set()
+    for placeholder in placeholders:
+        field = re.split(r'[!:|]', placeholder, 1)[0]
+        parts = re.split(r'[.\[]', field)
+        if parts[0] == 'issue' and len(parts) > 1:
+            attributes.add(parts[1])
+        elif parts[0]:
+            attributes.add(parts[0])
+    return frozenset(attributes)
+
+
+def _table_paragraphs(tbl) -> list:
+    return tbl.xpath('./w:tr/w:tc/w:p')
+
+
+class _DocumentBody:
+    """
+    Минимальная замена docx.Document для WordDocumentHelper: только таблицы тела документа.
+    """
+
+    def __init__(self, body):
+        self.tables = [Table(tbl, None) for tbl in body.iterchildren(qn('w:tbl'))]
+
+
+class CompiledDocxTemplate:
+    """
+    Разобранный один раз docx-шаблон. При заполнении копируется только дерево
+    word/document.xml, остальные части архива переносятся без изменений.
+    """
+    DOCUMENT_PART = 'word/document.xml'
+
+    def __init__(self, path: str):
+        self.path = path
+        self.mtime = os.path.getmtime(path)
+        with zipfile.ZipFile(path) as archive:
+            self.parts = [(info, archive.read(info.filename)) for info in archive.infolist()]
+
+        self.document = parse_xml(dict((info.filename, data) for info, data in self.parts)[self.DOCUMENT_PART])
+        body = self.document.find(qn('w:body'))
+        for p in body.iter(qn('w:p')):
+            _optimize_paragraph(Paragraph(p, None))
+        self.placeholders = frozenset(re.findall('{([^{}]*)}', ''.join(body.itertext())))
+        self.issue_attributes = _referenced_attributes(self.placeholders)
+
+        # абзацы тела и таблицы без циклов не меняют положения при заполнении
+        self.body_paragraphs = []
+        for p_idx, p in enumerate(body.iterchildren(qn('w:p'))):
+            compiled_runs = _compile_paragraph_runs(p)
+            if compiled_runs:
+                self.body_paragraphs.append((p_idx, compiled_runs))
+
+        self.static_tables = []
+        self.loop_tables = []
+        for tbl_idx, tbl in enumerate(body.iterchildren(qn('w:tbl'))):
+            if re.search(r'{[^{}]*\|for}', ''.join(tbl.itertext())):
+                self.loop_tables.append(tbl_idx)
+                continue
+            paragraphs = []
+            for p_idx, p in enumerate(_table_paragraphs(tbl)):
+                compiled_runs = _compile_paragraph_runs(p)
+                if compiled_runs:
+                    paragraphs.append((p_idx, compiled_runs))
+            if paragraphs:
+                self.static_tables.append((tbl_idx, paragraphs))
+
+    def expand_loops(self, document, data):
+        WordDocumentHelper().prepare(_DocumentBody(document.find(qn('w:body'))), data, optimize=False)
+
+    def render(self, data) -> bytes:
+        document = deepcopy(self.document)
+        body = document.find(qn('w:body'))
+
+        if self.loop_tables:
+            self.expand_loops(document, data)
+
+        body_paragraphs = list(body.iterchildren(qn('w:p')))
+        for p_idx, compiled_runs in self.body_paragraphs:
+            _render_paragraph_runs(body_paragraphs[p_idx], compiled_runs, data)
+
+        tables = list(body.iterchildren(qn('w:tbl')))
+        for tbl_idx, paragraphs in self.static_tables:
+            table_paragraphs = _table_paragraphs(tables[tbl_idx])
+            for p_idx, compiled_runs in paragraphs:
+                _render_paragraph_runs(table_paragraphs[p_idx], compiled_runs, data)
+        for tbl_idx in self.loop_tables:
+            for p in _table_paragraphs(tables[tbl_idx]):
+                compiled_runs = _compile_paragraph_runs(p)
+                if compiled_runs:
+                    _render_paragraph_runs(p, compiled_runs, data)
+
+        document_xml = etree.tostring(document, encoding='UTF-8', standalone=True)
+        stream = BytesIO()
+        with zipfile.ZipFile(stream, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for info, part_data in self.parts:
+                if info.filename == self.DOCUMENT_PART:
+                    part_data = document_xml
+                # writestr меняет смещение и размеры ZipInfo, а шаблон общий для потоков процесса
+                archive.writestr(copy(info), part_data)
+        return stream.getvalue()
+
+
+_compiled_templates = {}
+_compiled_templates_lock = threading.Lock()
+
+
+def _get_compiled_template(template_class, path: str):
+    path = os.path.abspath(path)
+    mtime = os.path.getmtime(path)
+    template = _compiled_templates.get(path)
+    if template is None or template.mtime != mtime:
+        with _compiled_templates_lock:
+            template = _compiled_templates.get(path)
+            if template is None or template.mtime != mtime:
+                template = template_class(path)
+                _compiled_templates[path] = template
+    return template
+
+
+def get_compiled_docx_template(path: str) -> CompiledDocxTemplate:
+    return _get_compiled_template(CompiledDocxTemplate, path)
+
+
+def get_compiled_xlsx_template(path: str) -> CompiledXlsxTemplate:
+    return _get_compiled_template(CompiledXlsxTemplate, path)
+
+
+def get_template_issue_dependencies(template: CompiledDocxTemplate):
+    """
+    Поля заявки и связанные наборы, от которых зависит текст шаблона: (fields, related_sets).
+    В related_sets попадают и связанные объекты вроде user: их изменения отмечает флаг
+    Issue.application_doc_outdated. None, если зависимости определить нельзя
+    (внешние данные, дата заполнения и т.п.).
+    """
+    if not hasattr(template, 'issue_dependencies'):
+        fields = set()
+        related_sets = set()
+        dependencies = (fields, related_sets)
+        for attribute in template.issue_attributes - TEMPLATE_CONTEXT_NAMES:
+            if attribute in ISSUE_ATTRIBUTE_SOURCES:
+                dependencies = None
+                break
+            names = ISSUE_ATTRIBUTE_DEPENDENCIES.get(attribute) or ISSUE_ATTRIBUTE_RELATED_SETS.get(attribute)
+            if names is None:
+                names = (attribute[len('humanized_'):] if attribute.startswith('humanized_') else attribute,)
+            try:
+                model_fields = [Issue._meta.get_field(name) for name in names]
+            except FieldDoesNotExist:
+                dependencies = None
+                break
+            for field in model_fields:
+                if field.concrete:
+                    fields.add(field.name)
+                if not field.concrete or attribute in ISSUE_ATTRIBUTE_RELATED_SETS:
+                    related_sets.add(field.name)
+        template.issue_dependencies = dependencies
+    return template.issue_dependencies
+
+
+def prepare_issue_for_render(issue: Issue, attributes) -> None:
+    """
+    Заранее загружает только то, что нужно шаблону: связанные наборы одним
+    проходом prefetch_related_objects, внешние данные параллельно.
+    Сами значения по-прежнему вычисляются лениво при подстановке.
+    """
+    prepare_issues_for_render([issue], attributes)
+
+
+def prepare_issues_for_render(issues: list, attributes) -> None:
+    """
+    То же для нескольких заявок: связанные наборы загружаются одним запросом
+    на набор сразу для всех заявок.
+    """
+    lookups = set()
+    sources = set()
+    for attribute in attributes:
+        if all(attribute in issue.__dict__ for issue in issues):
+            continue
+        lookups.update(ISSUE_ATTRIBUTE_RELATED_SETS.get(attribute, ()))
+        sources.update(ISSUE_ATTRIBUTE_SOURCES.get(attribute, ()))
+    saved_issues = [issue for issue in issues if issue.pk]
+    if lookups and saved_issues:
+        prefetch_related_objects(saved_issues, *sorted(lookups))
+    if sources:
+        for issue in issues:
+            issue.prefetch_external_data(sources)
+
+
+def get_issue_render_context(issue: Issue, user: User = None) -> Mapping:
+    return ChainMap(
+        dict(
+            clean_on_empty='',
+            user=user,
+            issue=issue,
+            date_now=timezone.localdate(timezone.now(), timezone.get_current_timezone()).strftime('%d.%m.%Y'),
+        ),
+        issue.__dict__,
+    )
 
 
 def fill_docx_file_with_issue_data(path: str, issue: Issue, user: User = None) -> ContentFile:
-    self_data = issue.__dict__
-    self_data['clean_on_empty'] = ''
-    self_data['user'] = user
-    self_data['issue'] = issue
-    self_data['date_now'] = timezone.localdate(timezone.now(), timezone.get_current_timezone()).strftime('%d.%m.%Y')
-
-    doc = Document(path)
-    helper = WordDocumentHelper()
-    doc = helper.prepare(doc, self_data)
-    for paragraph in doc.paragraphs:
-        _fill_docx_paragraph_with_dict(paragraph, self_data)
-    for table in doc.tables:
-        rows_cnt = len(table.rows)
-        for row_idx in range(0, rows_cnt):
-            for cell in table.row_cells(row_idx):
-                for p in cell.paragraphs:
-                    _fill_docx_paragraph_with_dict(p, self_data)
-
-    stream = BytesIO()
-    doc.save(stream)
-
-    stream.seek(0)
-    cf = ContentFile(stream.read())
-    return cf
+    template = get_compiled_docx_template(path)
+    prepare_issue_for_render(issue, template.issue_attributes)
+    return ContentFile(template.render(get_issue_render_context(issue, user)))
 
 
 class WordDocumentHelper:
@@ -128,7 +461,7 @@ class WordDocumentHelper:
     def get_count(self, data, field):
         value = data
         for path in field.split('.'):
-            if isinstance(value, dict):
+            if isinstance(value, Mapping):
                 value = value.get(path)
             elif hasattr(value, path):
                 if callable(getattr(value, path)):
@@ -137,26 +470,63 @@ class WordDocumentHelper:
                     value = getattr(value, path)
         return len(value or [])
 
-    def prepare(self, doc, data):
+    def expand_loop(self, template_rows, field, count):
+        """ Разворачивает строки цикла за один проход: шаблон клонируется по разу на элемент,
+        а признаки цикла и {obj...} переписываются прямо в текстовых узлах
+        :param template_rows: строки от {field|for} до {field|endfor} включительно
+        :param field: путь к списку, например issue.bank_accounts
+        :param count: количество элементов списка
+        :return: строки для всех элементов, первыми идут сами строки шаблона
+        """
+        markers = ('{%s|for}' % field, '{%s|endfor}' % field)
+        if not count:
+            for row in template_rows:
+                for cell in row[self.TD_OFFSET:]:
+                    if any('{clean_on_empty}' in (t.text or '') for t in cell.iter(qn('w:t'))):
+                        for t in cell.xpath('./w:p/w:r/w:t'):
+                            t.text = ''
+                    for t in cell.iter(qn('w:t')):
+                        if t.text and '{' in t.text:
+                            text = t.text
+                            for marker in markers:
+                                text = text.replace(marker, '')
+                            t.text = re.sub('{obj[^{}]*}', 'нет', text)
+            return list(template_rows)
+
+        rows = list(template_rows)
+        rows += [deepcopy(row) for index in range(1, count) for row in template_rows]
+        for i, row in enumerate(rows):
+            obj = '{%s[%s]' % (field, i // len(template_rows))
+            for cell in row[self.TD_OFFSET:]:
+                for t in cell.iter(qn('w:t')):
+                    if t.text and '{' in t.text:
+                        text = t.text
+                        for marker in markers:
+                            text = text.replace(marker, '')
+                        t.text = text.replace('{obj', obj)
+        return rows
+
+    def prepare(self, doc, data, optimize=True):
         """ Обработка циклов для word документа
         :param doc: редактируемый документ
         :param data: данные для вставки, нужны для расчета количества элементов в списках
+        :param optimize: False, если абзацы уже оптимизированы при компиляции шаблона
         :return:
         """
         for table in doc.tables:
             # сначала все оптимизируем, иначе потом это делать трудоемко
-            for row_idx in range(len(table.rows)):
-                for c in table.row_cells(row_idx + self.TR_OFFSET):
-                    for p in c.paragraphs:
-                        _optimize_paragraph(p)
+            if optimize:
+                for row_idx in range(len(table.rows)):
+                    for c in table.row_cells(row_idx + self.TR_OFFSET):
+                        for p in c.paragraphs:
+                            _optimize_paragraph(p)
             # ищем признаки начала и конца цикла
-            data_for_replace = []
-            rows_cnt = len(table._tbl)
+            rows = list(table._tbl)  # строки по индексам, как в table._tbl
             row_idx = self.TR_OFFSET
-            while row_idx < rows_cnt:
+            while row_idx < len(rows):
                 end_row = None  # конечная строка для копирования
                 # ищем в первой ячейке признак начала цикла
-                first_cell = self.get_cells(table, row_idx)
+                first_cell = rows[row_idx][self.TD_OFFSET:]
                 if not first_cell:
                     row_idx += 1
                     continue
@@ -165,82 +535,34 @@ class WordDocumentHelper:
                 if found:  # как только нашли начало цикла, ищем его конец
                     found = found[0][1:-5]
                     start_row = row_idx
-                    for row_i in range(row_idx, rows_cnt):
-                        for cell in self.get_cells(table, row_i):
-                            pattern = r'{%s*\|endfor}' % found
-                            found_end = re.findall(pattern, self.get_text(cell))
-                            if found_end:
+                    pattern = r'{%s*\|endfor}' % found
+                    for row_i in range(row_idx, len(rows)):
+                        for cell in rows[row_i][self.TD_OFFSET:]:
+                            if re.findall(pattern, self.get_text(cell)):
                                 end_row = row_i
                                 break
                         if end_row:
                             break
                     if not end_row:
                         end_row = start_row
-                    # нашли конец, теперь клонируем строки с start_end по end_row включительно
-                    position = end_row
-                    cloned_rows = end_row - start_row
-                    count = self.get_count(data, found)
-                    for i in range(count - 1):
-                        for j in range(start_row, end_row + 1):
-                            clone = deepcopy(table._tbl[j])
-                            table._tbl[position].addnext(clone)
-                            rows_cnt += 1
-                            position += 1
-                            cloned_rows += 1
-                    # сохраняем данные для будущей замены
-                    data_for_replace.append([
-                        start_row,
-                        end_row - start_row + 1,
-                        found,
-                        cloned_rows + 1,  # количество строк, в которых возможно нужна замена obj
-                        count,  # количество элементов массива
-                    ])
-                    row_idx = position + 1
+                    template_rows = rows[start_row:end_row + 1]
+                    expanded = self.expand_loop(template_rows, found, self.get_count(data, found))
+                    # клоны вставляем сразу после строк шаблона
+                    position = template_rows[-1]
+                    for row in expanded[len(template_rows):]:
+                        position.addnext(row)
+                        position = row
+                    rows[start_row:end_row + 1] = expanded
+                    row_idx = start_row + len(expanded)
 
                 row_idx += 1
-            # собственно замена
-            for data in data_for_replace:
-                replace_dict = {
-                    "{%s|for}" % data[2]: '',
-                    "{%s|endfor}" % data[2]: ''
-                }
-                if data[4] == 0:
-
-                    for row_idx in range(data[0], data[0] + data[3]):
-                        for cell in self.get_cells(table, row_idx):
-                            cell_text = etree.tostring(cell)
-                            if '{clean_on_empty}' in str(cell_text):
-                                for p in cell.p_lst:
-                                    for r in p.r_lst:
-                                        for t in r.t_lst:
-                                            t.text = ''
-                # пробегамся только по отмеченным участкам для замены
-                for row_idx in range(data[0], data[0] + data[3]):
-                    index = (row_idx - data[0]) // data[1]  # индекс для вставки
-                    for i, cell in enumerate(self.get_cells(table, row_idx)):
-                        cell_text = etree.tostring(cell)
-                        old_text = cell_text
-                        new_text = old_text
-                        # скрываем признаки начала и конца цикла, заменяем obj на переменную с индексом
-                        for key, value in replace_dict.items():
-                            new_text = new_text.replace(bytes(key, encoding='utf-8'), bytes(value, encoding='utf-8'))
-                        if data[4]: # если данные имеются,
-                            new_text = new_text.replace(bytes('{obj', encoding='utf-8'),
-                                                        bytes('{' + data[2] + '[%s]' % index, encoding='utf-8'))
-                        else:
-                            found = re.findall('{obj[^{}]*}', str(old_text))
-                            for f in found:
-                                new_text = new_text.replace(bytes(f, encoding='utf-8'),
-                                                            bytes('нет', encoding='utf-8'))
-                        # заменяем содержимое ячейки на новое содержимое
-                        table._tbl[row_idx][i + 1] = etree.fromstring(new_text)
 
         return doc
 
 
-def generate_doc(path: str, new_name: str, data: Issue):
+def generate_doc(path: str, new_name: str, data: Issue, user: User = None):
     from marer.models import Document
-    doc_file = fill_docx_file_with_issue_data(path, data)
+    doc_file = fill_docx_file_with_issue_data(path, data, user)
     doc_file.name = new_name
     doc = Document()
     doc.file = doc_file
@@ -255,13 +577,17 @@ def generate_underwriting_criteria(issue: Issue):
     return doc, float(score)
 
 
-def generate_acts_for_issue(issue: Issue)-> Issue:
+def get_acts_for_issue(issue: Issue) -> list:
+    """
+    Акты заявки к формированию: поле заявки, путь к шаблону и имя файла.
+    """
+    acts = []
     transfer_acceptance_path = {
         12: os.path.join(settings.BASE_DIR, 'marer/templates/documents/acts/transfer_acceptance_ip.docx'),
         10: os.path.join(settings.BASE_DIR, 'marer/templates/documents/acts/transfer_acceptance_ul.docx')
     }.get(len(issue.issuer_inn))
     if transfer_acceptance_path:
-        issue.transfer_acceptance_act = generate_doc(transfer_acceptance_path, 'Акт.docx', issue)
+        acts.append(('transfer_acceptance_act', transfer_acceptance_path, 'Акт.docx'))
 
     bg_contract_path = {
         (consts.TENDER_EXEC_LAW_44_FZ, consts.BG_TYPE_APPLICATION_ENSURE): 'marer/templates/documents/acts/fz44_participation.docx',
@@ -280,16 +606,146 @@ def generate_acts_for_issue(issue: Issue)-> Issue:
         (consts.TENDER_EXEC_LAW_185_FZ, consts.BG_TYPE_WARRANTY_ENSURE): 'marer/templates/documents/acts/fz185_execution.docx',
     }.get((issue.tender_exec_law, issue.bg_type))
     if bg_contract_path:
-        issue.bg_doc = generate_doc(os.path.join(settings.BASE_DIR, bg_contract_path), 'Проект.docx', issue)
+        acts.append(('bg_doc', os.path.join(settings.BASE_DIR, bg_contract_path), 'Проект.docx'))
 
-    issue.bg_contract_doc = generate_doc(os.path.join(settings.BASE_DIR, 'marer/templates/documents/acts/one_commission.docx'), 'Договор.docx', issue)
+    acts.append(('bg_contract_doc', os.path.join(settings.BASE_DIR, 'marer/templates/documents/acts/one_commission.docx'), 'Договор.docx'))
     if any([issue.issuer_inn.startswith(x) for x in ['77', '97', '99', '177', '199', '197']]) and issue.tender_exec_law == consts.TENDER_EXEC_LAW_185_FZ:
         path = 'marer/templates/documents/acts/fz185_additional_for_msk.docx'
-        issue.additional_doc = generate_doc(os.path.join(settings.BASE_DIR, path), 'Дополнительный_документ.docx', issue)
+        acts.append(('additional_doc', os.path.join(settings.BASE_DIR, path), 'Дополнительный_документ.docx'))
     if issue.bg_sum > 5000000 and not len(issue.issuer_inn) == 12:
-        issue.contract_of_guarantee = generate_doc(os.path.join(settings.BASE_DIR, 'marer/templates/documents/acts/contract_of_guarantee.docx'), 'Договор_поручительства.docx', issue)
+        acts.append(('contract_of_guarantee', os.path.join(settings.BASE_DIR, 'marer/templates/documents/acts/contract_of_guarantee.docx'), 'Договор_поручительства.docx'))
+
+    acts.append(('payment_of_fee', os.path.join(settings.BASE_DIR, 'marer/templates/documents/payment_of_fee.docx'), 'Счет.docx'))
+    return acts
 
-    issue.payment_of_fee = generate_doc(
-        os.path.join(settings.BASE_DIR, 'marer/templates/documents/payment_of_fee.docx'),
-        'Счет.docx', issue)
+
+def generate_acts_for_issue(issue: Issue)-> Issue:
+    for issue_field, path, file_name in get_acts_for_issue(issue):
+        setattr(issue, issue_field, generate_doc(path, file_name, issue))
     return issue
+
+
+def generate_conclusions(issue_ids: list, conclusion_type: str, user: User = None) -> list:
+    """
+    Пакетное заполнение заключений одного вида. Заявки и их связанные наборы
+    загружаются общими запросами, внешние данные кешируются для всего пакета,
+    шаблоны разбираются один раз. Если включен docworker, пакет формируют его
+    процессы, а веб-процесс ждет их не дольше CONCLUSION_BATCH_TIMEOUT:
+    процессы не порождаются из веб-процесса с его пулами потоков и блокировками.
+    :return: отчет по каждой заявке: issue_id, success, errors, document_id
+    """
+    from marer.models import Document
+    issue_field, file_name, render_error = Issue.CONCLUSION_DOCUMENTS[conclusion_type]
+    issues = Issue.objects.in_bulk(issue_ids)
+
+    report = OrderedDict((issue_id, dict(issue_id=issue_id, success=False, errors=[], document_id=None))
+                         for issue_id in issue_ids)
+    jobs = OrderedDict()
+    for issue_id, result in report.items():
+        issue = issues.get(issue_id)
+        if issue is None:
+            result['errors'].append('Заявка не найдена')
+            continue
+        try:
+            issue.validate_conclusion(conclusion_type)
+            path = issue.get_conclusion_template_path(conclusion_type)
+        except ValidationError as ve:
+            result['errors'].extend(str(err) for err in ve.error_list)
+            continue
+        except (ValueError, TypeError):
+            result['errors'].append(render_error)
+            continue
+        jobs.setdefault(path, []).append(issue)
+
+    for path, path_issues in jobs.items():
+        prepare_issues_for_render(path_issues, get_compiled_docx_template(path).issue_attributes)
+
+    tasks = [(issue, path) for path, path_issues in jobs.items() for issue in path_issues]
+    # внутри транзакции задачи не увидит docworker, пока она не зафиксирована
+    if settings.DOCWORKER_ENABLED and len(tasks) > 1 and not connection.in_atomic_block:
+        _generate_conclusions_in_docworker(tasks, report, issue_field, file_name, render_error, user)
+        return list(report.values())
+
+    for issue, path in tasks:
+        result = report[issue.id]
+        try:
+            content = get_compiled_docx_template(path).render(get_issue_render_context(issue, user))
+        except Exception as e:
+            logger.warning('Unable to render {} conclusion for issue {}: {}'.format(conclusion_type, issue.id, e))
+            result['errors'].append(render_error)
+            continue
+        document = Document()
+        document.file = ContentFile(content, name=file_name)
+        document.save()
+        # как и в docworker, заявка обновляется без Issue.save и его побочных действий
+        Issue.objects.filter(id=issue.id).update(**{issue_field: document})
+        result['success'] = True
+        result['document_id'] = document.id
+    return list(report.values())
+
+
+def _generate_conclusions_in_docworker(tasks: list, report: OrderedDict, issue_field: str, file_name: str,
+                                       render_error: str, user: User = None) -> None:
+    """
+    Ставит заключения пакета в очередь docworker и ждет их завершения.
+    Внешние данные уже сохранены prepare_issues_for_render, и процессы docworker
+    читают их из базы. Не успевшие заключения сформируются позже.
+    """
+    from marer.models import DocumentGenerationTask
+    job_ids = [enqueue_documents(issue, [(issue_field, path, file_name)], user=user).id for issue, path in tasks]
+    tasks_qs = DocumentGenerationTask.objects.filter(job_id__in=job_ids)
+    unfinished = [consts.DOCUMENT_JOB_STATUS_PENDING, consts.DOCUMENT_JOB_STATUS_RUNNING]
+    deadline = time.monotonic() + settings.CONCLUSION_BATCH_TIMEOUT
+    while tasks_qs.filter(status__in=unfinished).exists() and time.monotonic() < deadline:
+        time.sleep(settings.DOCWORKER_POLL_INTERVAL)
+
+    for issue_id, task_status, document_id in tasks_qs.values_list('job__issue_id', 'status', 'document_id'):
+        result = report[issue_id]
+        if task_status == consts.DOCUMENT_JOB_STATUS_DONE:
+            result['success'] = True
+            result['document_id'] = document_id
+        elif task_status == consts.DOCUMENT_JOB_STATUS_FAILED:
+            result['errors'].append(render_error)
+        else:
+            result['errors'].append('Заключение еще формируется, обновите заявку позже')
+
+
+def enqueue_documents(issue: Issue, documents: list, user: User = None):
+    """
+    Ставит документы заявки в очередь обработчика docworker и сразу возвращает пакет.
+    :param documents: список (поле заявки, путь к шаблону, имя файла)
+    :param user: пользователь, от имени которого заполняются документы
+    """
+    from marer.models import DocumentGenerationJob, DocumentGenerationTask
+    job = DocumentGenerationJob.objects.create(issue=issue, user=user)
+    DocumentGenerationTask.objects.bulk_create([DocumentGenerationTask(
+        job=job,
+        issue_field=issue_field,
+        template_path=os.path.relpath(path, settings.BASE_DIR),
+        file_name=file_name,
+    ) for issue_field, path, file_name in documents])
+    return job
+
+
+def run_document_task(task_id: int):
+    """
+    Формирует документ задачи; выполняется в процессе пула docworker.
+    Заявка обновляется через update, чтобы не запускать Issue.save и его сигналы.
+    """
+    from marer.models import DocumentGenerationTask
+    task = DocumentGenerationTask.objects.select_related('job__issue', 'job__user').get(id=task_id)
+    try:
+        document = generate_doc(os.path.join(settings.BASE_DIR, task.template_path), task.file_name, task.job.issue,
+                                task.job.user)
+        Issue.objects.filter(id=task.job.issue_id).update(**{task.issue_field: document})
+    except Exception as e:
+        logger.exception('Unable to generate document task {}'.format(task_id))
+        task.status = consts.DOCUMENT_JOB_STATUS_FAILED
+        task.error = str(e)
+    else:
+        task.status = consts.DOCUMENT_JOB_STATUS_DONE
+        task.document = document
+    task.finished_at = timezone.now()
+    task.save(update_fields=['status', 'error', 'document', 'finished_at'])
+    task.job.refresh_status()
+    return task.status
@@ -0,0 +1,138 @@
+import math
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils import translation
+from django.utils.formats import number_format
+
+from marer.utils.datetime_utils import get_datetime_as_excel_number
+
+ZERO = 'ноль'
+TEN = (
+    ('', 'один', 'два', 'три', 'четыре', 'пять', 'шесть', 'семь', 'восемь', 'девять'),
+    ('', 'одна', 'две', 'три', 'четыре', 'пять', 'шесть', 'семь', 'восемь', 'девять'),
+)
+A20 = (
+    'десять', 'одиннадцать', 'двенадцать', 'тринадцать', 'четырнадцать', 'пятнадцать',
+    'шестнадцать', 'семнадцать', 'восемнадцать', 'девятнадцать'
+)
+TENS = (
+    '', '', 'двадцать', 'тридцать', 'сорок', 'пятьдесят', 'шестьдесят', 'семьдесят', 'восемьдесят', 'девяносто'
+)
+HUNDRED = (
+    '', 'сто', 'двести', 'триста', 'четыреста', 'пятьсот', 'шестьсот', 'семьсот', 'восемьсот', 'девятьсот'
+)
+# формы единиц для 1, 2-4 и 5-20, род числительного (1 - женский)
+UNIT = (
+    ('копейка', 'копейки', 'копеек', 1),
+    ('рубль', 'рубля', 'рублей', 1),
+    ('тысяча', 'тысячи', 'тысяч', 1),
+    ('миллион', 'миллиона', 'миллионов', 0),
+    ('миллиард', 'милиарда', 'миллиардов', 0),
+)
+
+
+def _plural_form(value: int) -> int:
+    value = abs(value) % 100
+    if 10 < value < 20:
+        return 2
+    value = value % 10
+    if 1 < value < 5:
+        return 1
+    if value == 1:
+        return 0
+    return 2
+
+
+def _group_words(group: int, gender: int) -> tuple:
+    i1, i2, i3 = group // 100, group // 10 % 10, group % 10
+    words = []
+    if i1 > 0:
+        words.append(HUNDRED[i1])
+    if i2 > 1:
+        words.append(TENS[i2] + ' ' + TEN[gender][i3] if i3 != 0 else TENS[i2])
+    elif i2 > 0:
+        words.append(A20[i3])
+    else:
+        # для нулевых групп остается пустое слово, как и раньше
+        words.append(TEN[gender][i3])
+    return tuple(words)
+
+
+# форма единицы по остатку от деления на 100 и слова для каждой группы из трех цифр
+PLURAL_FORMS = tuple(_plural_form(value) for value in range(100))
+GROUP_WORDS = tuple(tuple(_group_words(group, gender) for group in range(1000)) for gender in (0, 1))
+
+
+def _morph(value, unit: tuple) -> str:
+    return unit[PLURAL_FORMS[abs(int(value)) % 100]]
+
+
+@lru_cache(maxsize=settings.AMOUNT_IN_WORDS_CACHE_SIZE)
+def _sum_str_format(value: str, language: str) -> str:
+    if '.' in value:
+        rub, kop = ('%3.2f' % float(value)).split('.')
+    elif ',' in value:
+        rub, kop = ('%3.2f' % float(value)).split(',')
+    else:
+        rub = float(value)
+        kop = 0
+
+    if int(rub) <= 0:
+        raise ValueError('Сумма прописью возможна только от одного рубля: {}'.format(value))
+
+    rub_int = int(rub)
+    groups = []
+    while rub_int:
+        groups.insert(0, rub_int % 1000)
+        rub_int //= 1000
+
+    digits = []
+    currency = []
+    for id, group in enumerate(groups):
+        unit_id = len(groups) - id
+        current_unit = UNIT[unit_id]
+        digits.extend(GROUP_WORDS[current_unit[3]][group])
+        if id == len(groups) - 1:
+            currency.append(_morph(group, current_unit))
+        elif group > 0:
+            digits.append(_morph(group, current_unit))
+    currency.append(str(kop))
+    currency.append(_morph(kop, UNIT[0]))
+
+    rub_formatted = str(number_format(rub, force_grouping=True))
+    digits_str = ' '.join(digits).strip()
+    return rub_formatted + ' (' + digits_str.capitalize() + ') ' + ' '.join(currency).strip()
+
+
+def sum_str_format(value) -> str:
+    """
+    Сумма цифрами и прописью: 1 450 000,00 (Один миллион четыреста пятьдесят тысяч) рублей 00 копеек.
+    Результаты кешируются по сумме и языку, от которого зависит формат числа.
+    """
+    return _sum_str_format(str(value).replace(' ', ''), translation.get_language())
+
+
+def sum_str_format_many(values) -> list:
+    """
+    Сумма прописью для целого столбца: каждая различная сумма форматируется один раз.
+    """
+    language = translation.get_language()
+    formatted = {}
+    result = []
+    for value in values:
+        key = str(value).replace(' ', '')
+        if key not in formatted:
+            formatted[key] = _sum_str_format(key, language)
+        result.append(formatted[key])
+    return result
+
+
+@lru_cache(maxsize=settings.AMOUNT_IN_WORDS_CACHE_SIZE)
+def generate_bg_number(date) -> str:
+    prefix = '19/'
+    suffix = 'ЭГ-18'
+    today = get_datetime_as_excel_number(date)
+    part1 = math.floor(today) - 42900
+    part2 = math.floor((math.fmod(today, 1) * 100000))
+    return '%s%s-%s%s' % (prefix, part1, part2, suffix)
@@ -1,17 +1,15 @@
 import os
-import math
 import zipfile
 import io
 
 from decimal import Decimal
 from django.core.exceptions import ObjectDoesNotExist
-from django.utils.formats import number_format
 from django.utils.timezone import now
 from django.conf import settings
 
 from marer import consts
 from marer.models import BankMinimalCommission
-from marer.utils.datetime_utils import get_datetime_as_excel_number, get_date_diff_in_days
+from marer.utils.datetime_utils import get_date_diff_in_days
 
 
 def issue_term_in_months(start_date, end_date):
@@ -112,101 +110,6 @@ def calculate_bank_commission(bg_start_date, bg_end_date, bg_sum, bg_is_benefici
     return round(Q20, 2)
 
 
-def generate_bg_number(date):
-    prefix = '19/'
-    suffix = 'ЭГ-18'
-    today = get_datetime_as_excel_number(date)
-    part1 = math.floor(today) - 42900
-    part2 = math.floor((math.fmod(today, 1) * 100000))
-    return '%s%s-%s%s' % (prefix, part1, part2, suffix)
-
-
-def sum_str_format(value):
-    zero = 'ноль'
-    ten = (
-        ('', 'один', 'два', 'три', 'четыре', 'пять', 'шесть', 'семь', 'восемь', 'девять'),
-        ('', 'одна', 'две', 'три', 'четыре', 'пять', 'шесть', 'семь', 'восемь', 'девять'),
-    )
-    a20 = [
-        'десять', 'одиннадцать', 'двенадцать', 'тринадцать', 'четырнадцать', 'пятнадцать',
-        'шестнадцать', 'семнадцать', 'восемнадцать', 'девятнадцать'
-    ]
-    tens = [
-        '', '', 'двадцать', 'тридцать', 'сорок', 'пятьдесят', 'шестьдесят', 'семьдесят', 'восемьдесят', 'девяносто'
-    ]
-    hundred = [
-        '', 'сто', 'двести', 'триста', 'четыреста', 'пятьсот', 'шестьсот', 'семьсот', 'восемьсот', 'девятьсот'
-    ]
-    unit = [  # Units
-        ['копейка', 'копейки', 'копеек', 1],
-        ['рубль', 'рубля', 'рублей', 1],
-        ['тысяча', 'тысячи', 'тысяч', 1],
-        ['миллион', 'миллиона', 'миллионов', 0],
-        ['миллиард', 'милиарда', 'миллиардов', 0],
-    ]
-
-    value = str(value).replace(' ', '')
-    if '.' in value:
-        rub, kop = ('%3.2f' % float(value)).split('.')
-    elif ',' in value:
-        rub, kop = ('%3.2f' % float(value)).split(',')
-    else:
-        rub = float(value)
-        kop = 0
-
-    digits = []
-    currency = []
-
-    def split_by_groups(value: str, count: int):
-        value = str(int(value))
-        extended_length = len(value) * 1.0 / count
-        extended_value = value.rjust(math.ceil(extended_length) * count, '0')
-        return [extended_value[i: i + count] for i in range(0, len(extended_value), count)]
-
-    def morph(value, var1, var2, var3):
-        value = abs(int(value)) % 100
-        if value > 10 and value < 20:
-            return var3
-        value = value % 10
-        if value > 1 and value < 5:
-            return var2
-        if value == 1:
-            return var1
-        return var3
-
-    if int(rub) > 0:
-        groups = split_by_groups(rub, 3)
-        rub_formatted = str(number_format(rub, force_grouping=True))
-        for id, group in enumerate(groups):
-            i1, i2, i3 = list([int(g) for g in group])
-            unit_id = len(groups) - id
-            current_unit = unit[unit_id]
-            gender = current_unit[3]
-            if i1 > 0:
-                digits.append(hundred[i1])
-            if i2 > 1:
-                if i3 != 0:
-                    text = tens[i2] + ' ' + ten[gender][i3]
-                else:
-                    text = tens[i2]  # 20-99
-                digits.append(text)
-            else:
-                if i2 > 0:
-                    text = a20[i3]
-                else:
-                    text = ten[gender][i3]  # 10-19 | 1-9
-                digits.append(text)
-            if unit_id > 0:
-                if id == len(groups) - 1:
-                    currency.append(morph(group, *current_unit[:3]))
-                elif int(group) > 0:
-                    digits.append(morph(group, *current_unit[:3]))
-        currency.append(str(kop))
-        currency.append(morph(kop, *unit[0][:3]))
-    digits_str = ' '.join(digits).strip()
-    return rub_formatted + ' (' + digits_str.capitalize() + ') ' + ' '.join(currency).strip()
-
-
 class CalculateUnderwritingCriteria:
 
     def score_1(self, value):
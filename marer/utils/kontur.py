@@ -1,67 +1,281 @@
+import hashlib
 import json
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-import requests
 from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+from marer.utils import counters, singleflight
+from marer.utils.ratelimit import TokenBucket
+from marer.utils.outbound import get_client
 
 logger = logging.getLogger('django')
 
+CACHE_KEY = 'kontur:{method}:{inn}:{ogrn}'
+REVALIDATE_LOCK_KEY = 'kontur:revalidate:{method}:{inn}:{ogrn}'
+STATS_NAMESPACE = 'kontur'
+STATS_FIELDS = ('hits', 'stale_hits', 'misses', 'api_calls', 'api_latency_ms')
+CACHED_METHODS = ('req', 'analytics', 'egrDetails', 'companyAffiliates/req', 'beneficialOwners', 'licences')
+
+
+class KonturError(Exception):
+    pass
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def _get_bucket(api_key: str) -> TokenBucket:
+    bucket = _buckets.get(api_key)
+    if bucket is None:
+        with _buckets_lock:
+            bucket = _buckets.get(api_key)
+            if bucket is None:
+                bucket = TokenBucket(
+                    'kontur:' + hashlib.sha1(api_key.encode('utf-8')).hexdigest()[:12],
+                    rate=settings.KONTUR_RATE_LIMIT['rate'],
+                    burst=settings.KONTUR_RATE_LIMIT['burst'],
+                )
+                _buckets[api_key] = bucket
+    return bucket
+
+
+def _record_usage(method: str):
+    from marer.models.external import KonturUsage
+    try:
+        KonturUsage.record(method)
+    except Exception as e:
+        logger.warning('Unable to record Kontur.Focus usage for {}: {}'.format(method, e))
+
 
 def _api_request(method: str, **kwargs):
     api_key = settings.KONTUR_FOCUS_API_KEY
 
+    def before_attempt():
+        # повторы клиента тоже платные и тоже расходуют лимит частоты
+        _get_bucket(api_key).acquire(settings.KONTUR_RATE_LIMIT['deadline'])
+        _record_usage(method)
+
     get_addr = 'https://focus-api.kontur.ru/api3/{}?key={}'.format(method, api_key)
     kwargs_strings = ['&' + str(k) + '=' + kwargs[k] for k in kwargs]
-    result = requests.get(get_addr + ''.join(kwargs_strings))
+    result = get_client('kontur').get(get_addr + ''.join(kwargs_strings), before_attempt=before_attempt)
 
-    if 200 <= result.status_code < 300:
-        logger.debug('Request finished successfully, status code: {}'.format(result.status_code))
-        json_data = json.loads(result.text)
-    else:
+    if not 200 <= result.status_code < 300:
         logger.warning('Error in response, status code: {}'.format(result.status_code))
-        json_data = {}
+        # ошибка не должна выглядеть как пустой ответ: такой ответ кешируется и сохраняется в снимках
+        raise KonturError('Kontur.Focus {} responded with status code {}'.format(method, result.status_code))
 
+    logger.debug('Request finished successfully, status code: {}'.format(result.status_code))
     logger.debug('Result data: ' + result.text)
-    return json_data
+    return json.loads(result.text)
+
+
+def _timed_api_request(method: str, inn: str, ogrn: str):
+    started = time.time()
+    try:
+        return _api_request(method, inn=inn, ogrn=ogrn)
+    finally:
+        counters.incr(STATS_NAMESPACE, method, 'api_calls')
+        counters.incr(STATS_NAMESPACE, method, 'api_latency_ms', int((time.time() - started) * 1000))
+
+
+def _store(cache_key: str, method: str, data):
+    """
+    Кладет ответ в кеш. Пустые ответы (нет данных) живут меньше и не отдаются
+    как устаревшие. Ошибки не кешируются: исключение доходит до вызывающего.
+    """
+    if data:
+        ttl = settings.KONTUR_CACHE_TTL.get(method, settings.KONTUR_CACHE_DEFAULT_TTL)
+        timeout = ttl + settings.KONTUR_CACHE_STALE_TTL
+    else:
+        ttl = settings.KONTUR_CACHE_EMPTY_TTL
+        timeout = ttl
+    try:
+        cache.set(cache_key, dict(data=data, fresh_until=time.time() + ttl), timeout)
+    except Exception as e:
+        logger.warning('Unable to store Kontur.Focus response in cache: {}'.format(e))
+
+
+def _revalidate(cache_key: str, method: str, inn: str, ogrn: str, stale_data):
+    try:
+        data = _timed_api_request(method, inn, ogrn)
+    except Exception as e:
+        logger.warning('Kontur.Focus revalidation of {} failed: {}'.format(cache_key, e))
+        data = None
+    finally:
+        connection.close()
+    if data:
+        _store(cache_key, method, data)
+    else:
+        # оставляем устаревшие данные, но не ходим за ними повторно до истечения короткого ttl
+        try:
+            cache.set(cache_key, dict(data=stale_data, fresh_until=time.time() + settings.KONTUR_CACHE_EMPTY_TTL),
+                      settings.KONTUR_CACHE_EMPTY_TTL + settings.KONTUR_CACHE_STALE_TTL)
+        except Exception as e:
+            logger.warning('Unable to store Kontur.Focus response in cache: {}'.format(e))
+
+
+def _schedule_revalidation(cache_key: str, method: str, inn: str, ogrn: str, stale_data):
+    lock_key = REVALIDATE_LOCK_KEY.format(method=method, inn=inn, ogrn=ogrn)
+    try:
+        acquired = cache.add(lock_key, 1, settings.KONTUR_CACHE_REVALIDATE_LOCK_TTL)
+    except Exception:
+        acquired = False
+    if acquired:
+        thread = threading.Thread(target=_revalidate, args=(cache_key, method, inn, ogrn, stale_data), daemon=True)
+        thread.start()
+
+
+def _cached_api_request(method: str, inn: str, ogrn: str):
+    cache_key = CACHE_KEY.format(method=method, inn=inn, ogrn=ogrn)
+    try:
+        cached = cache.get(cache_key)
+    except Exception as e:
+        logger.warning('Unable to read Kontur.Focus response from cache: {}'.format(e))
+        cached = None
+
+    if cached is not None:
+        if cached['fresh_until'] >= time.time():
+            counters.incr(STATS_NAMESPACE, method, 'hits')
+        else:
+            counters.incr(STATS_NAMESPACE, method, 'stale_hits')
+            _schedule_revalidation(cache_key, method, inn, ogrn, cached['data'])
+        return cached['data']
+
+    counters.incr(STATS_NAMESPACE, method, 'misses')
+
+    def fetch():
+        data = _timed_api_request(method, inn, ogrn)
+        _store(cache_key, method, data)
+        return data
+
+    return singleflight.do(cache_key, fetch)
+
+
+def get_cache_stats() -> dict:
+    """
+    Статистика кеша по методам: сколько запросов обслужено из кеша
+    и сколько платных обращений к API было сделано на самом деле.
+    """
+    stats = counters.get_counters(STATS_NAMESPACE, CACHED_METHODS, STATS_FIELDS)
+    for method_stats in stats.values():
+        method_stats['saved_api_calls'] = method_stats['hits'] + method_stats['stale_hits']
+        if method_stats['api_calls']:
+            method_stats['avg_api_latency_ms'] = method_stats['api_latency_ms'] // method_stats['api_calls']
+        else:
+            method_stats['avg_api_latency_ms'] = 0
+    return stats
+
+
+def reset_cache_stats():
+    counters.reset_counters(STATS_NAMESPACE, CACHED_METHODS, STATS_FIELDS)
 
 
 def req(inn: str=None, ogrn: str=None):
     inn = inn or ''
     ogrn = ogrn or ''
-    data = _api_request('req', inn=inn, ogrn=ogrn)
+    data = _cached_api_request('req', inn=inn, ogrn=ogrn)
     return data[0] if len(data) == 1 else data
 
 
 def analytics(inn: str=None, ogrn: str=None):
     inn = inn or ''
     ogrn = ogrn or ''
-    data = _api_request('analytics', inn=inn, ogrn=ogrn)
+    data = _cached_api_request('analytics', inn=inn, ogrn=ogrn)
     return data[0] if len(data) == 1 else data
 
 
 def egrDetails(inn: str=None, ogrn: str=None):
     inn = inn or ''
     ogrn = ogrn or ''
-    data = _api_request('egrDetails', inn=inn, ogrn=ogrn)
+    data = _cached_api_request('egrDetails', inn=inn, ogrn=ogrn)
     return data[0] if len(data) == 1 else data
 
 
 def companyAffiliatesReq(inn: str=None, ogrn: str=None):
     inn = inn or ''
     ogrn = ogrn or ''
-    data = _api_request('companyAffiliates/req', inn=inn, ogrn=ogrn)
+    data = _cached_api_request('companyAffiliates/req', inn=inn, ogrn=ogrn)
     return data
 
 
 def beneficialOwners(inn: str=None, ogrn: str=None):
     inn = inn or ''
     ogrn = ogrn or ''
-    data = _api_request('beneficialOwners', inn=inn, ogrn=ogrn)
+    data = _cached_api_request('beneficialOwners', inn=inn, ogrn=ogrn)
     return data[0] if len(data) == 1 else data
 
 
 def licences(inn: str=None, ogrn: str=None):
     inn = inn or ''
     ogrn = ogrn or ''
-    data = _api_request('licences', inn=inn, ogrn=ogrn)
-    return data[0] if len(data) == 1 else data
\ No newline at end of file
+    data = _cached_api_request('licences', inn=inn, ogrn=ogrn)
+    return data[0] if len(data) == 1 else data
+
+
+BUNDLE_METHODS = dict(
+    req=(req, {}),
+    analytics=(analytics, {}),
+    egr_details=(egrDetails, {}),
+    company_affiliates=(companyAffiliatesReq, []),
+    beneficial_owners=(beneficialOwners, {}),
+    licences=(licences, {}),
+)
+
+_bundle_executor = None
+_bundle_executor_lock = threading.Lock()
+
+
+def _get_bundle_executor() -> ThreadPoolExecutor:
+    global _bundle_executor
+    if _bundle_executor is None:
+        with _bundle_executor_lock:
+            if _bundle_executor is None:
+                _bundle_executor = ThreadPoolExecutor(max_workers=settings.KONTUR_BUNDLE_MAX_WORKERS)
+    return _bundle_executor
+
+
+def _run_in_pool(fn, inn, ogrn):
+    try:
+        return fn(inn=inn, ogrn=ogrn)
+    finally:
+        # учет запросов пишется в базу, соединение потока пула не должно висеть открытым
+        connection.close()
+
+
+class KonturBundle:
+    """
+    Результат параллельного запроса нескольких методов Контур.Фокуса.
+    Для упавших методов атрибут содержит пустое значение,
+    а исключение лежит в errors под именем метода.
+    """
+
+    def __init__(self, inn: str, ogrn: str):
+        self.inn = inn
+        self.ogrn = ogrn
+        self.errors = {}
+        for name, (_, empty) in BUNDLE_METHODS.items():
+            setattr(self, name, type(empty)())
+
+    def is_ok(self, name: str) -> bool:
+        return name not in self.errors
+
+
+def fetch_bundle(inn: str=None, ogrn: str=None, methods=tuple(BUNDLE_METHODS.keys())) -> KonturBundle:
+    bundle = KonturBundle(inn, ogrn)
+    executor = _get_bundle_executor()
+    futures = {name: executor.submit(_run_in_pool, BUNDLE_METHODS[name][0], inn, ogrn) for name in methods}
+    for name, future in futures.items():
+        try:
+            data = future.result(timeout=settings.KONTUR_BUNDLE_TIMEOUT)
+        except Exception as e:
+            logger.warning('Kontur.Focus method {} failed for inn={} ogrn={}: {}'.format(name, inn, ogrn, e))
+            bundle.errors[name] = e
+        else:
+            setattr(bundle, name, data)
+    return bundle
@@ -1,19 +1,173 @@
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import quote
 
-import requests
+from django.conf import settings
+from django.db import IntegrityError
+
+from marer.utils import counters, declension, singleflight
+from marer.utils.outbound import get_client
+
+logger = logging.getLogger('django')
+
+STATS_NAMESPACE = 'morpher'
+STATS_NAME = 'declension'
+STATS_FIELDS = ('lookups', 'rule_hits', 'lru_hits', 'db_hits', 'api_calls', 'api_errors')
+
+
+def normalize_text(text: str) -> str:
+    return ' '.join((text or '').split())
+
+
+def text_hash(normalized_text: str) -> str:
+    return hashlib.sha256(normalized_text.encode('utf-8')).hexdigest()
+
+
+class _LRU:
+
+    def __init__(self, size: int):
+        self.size = size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
 
 
 class MorpherApi:
+    """
+    Склонение через ws3.morpher.ru. Ответ сервиса содержит все падежи сразу,
+    поэтому он целиком сохраняется в базе и переиспользуется для любого падежа.
+    """
     url = 'https://ws3.morpher.ru/russian/declension?s={}&format=json'
+    _lru = _LRU(settings.MORPHER_LRU_SIZE)
+
+    @classmethod
+    def _request(cls, text):
+        url = cls.url.format(quote(text))
+        counters.incr(STATS_NAMESPACE, STATS_NAME, 'api_calls')
+        try:
+            response = singleflight.do('morpher:' + url, lambda: get_client('morpher').get(url).json())
+        except Exception as e:
+            counters.incr(STATS_NAMESPACE, STATS_NAME, 'api_errors')
+            logger.warning('Morpher request failed for {}: {}'.format(text, e))
+            return None
+        if not isinstance(response, dict) or 'code' in response:
+            counters.incr(STATS_NAMESPACE, STATS_NAME, 'api_errors')
+            return None
+        return response
+
+    @classmethod
+    def _store(cls, normalized_text, response):
+        from marer.models.external import MorpherDeclension
+        try:
+            MorpherDeclension.objects.get_or_create(
+                text_hash=text_hash(normalized_text),
+                defaults=dict(text=normalized_text, response=json.dumps(response, ensure_ascii=False)),
+            )
+        except IntegrityError:
+            pass
+        cls._lru.set(normalized_text, response)
+
+    @classmethod
+    def prefetch(cls, texts):
+        """
+        Загружает склонения для набора строк: сначала из памяти,
+        затем одним запросом из базы, оставшиеся — параллельно из сервиса.
+        """
+        from marer.models.external import MorpherDeclension
+
+        missed = {normalize_text(text) for text in texts if text}
+        missed = {
+            text for text in missed
+            if text and cls._lru.get(text) is None and declension.get_forms(text) is None
+        }
+        if not missed:
+            return
+
+        hashes = {text_hash(text): text for text in missed}
+        for row in MorpherDeclension.objects.filter(text_hash__in=list(hashes.keys())):
+            cls._lru.set(row.text, json.loads(row.response))
+            missed.discard(row.text)
+            counters.incr(STATS_NAMESPACE, STATS_NAME, 'db_hits')
+        if not missed:
+            return
+
+        missed = list(missed)
+        with ThreadPoolExecutor(max_workers=min(len(missed), settings.MORPHER_PREFETCH_MAX_WORKERS)) as executor:
+            responses = list(executor.map(cls._request, missed))
+        for text, response in zip(missed, responses):
+            if response:
+                cls._store(text, response)
+
+    @classmethod
+    def get_declension(cls, text):
+        normalized_text = normalize_text(text)
+        if not normalized_text:
+            return None
+
+        counters.incr(STATS_NAMESPACE, STATS_NAME, 'lookups')
+        response = cls._lru.get(normalized_text)
+        if response is not None:
+            counters.incr(STATS_NAMESPACE, STATS_NAME, 'lru_hits')
+            return response
+
+        from marer.models.external import MorpherDeclension
+        row = MorpherDeclension.objects.filter(text_hash=text_hash(normalized_text)).first()
+        if row is not None:
+            counters.incr(STATS_NAMESPACE, STATS_NAME, 'db_hits')
+            response = json.loads(row.response)
+            cls._lru.set(normalized_text, response)
+            return response
+
+        response = cls._request(normalized_text)
+        if response:
+            cls._store(normalized_text, response)
+        return response
 
     @classmethod
     def get_response(cls, text, form=None):
+        if form in declension.CASES:
+            local_form = declension.decline(text, form)
+            if local_form:
+                counters.incr(STATS_NAMESPACE, STATS_NAME, 'lookups')
+                counters.incr(STATS_NAMESPACE, STATS_NAME, 'rule_hits')
+                return local_form
+
         response_form = None
         try:
-            url = cls.url.format(quote(text))
-            response = requests.get(url=url).json()
-            response_form = response if not form else response.get(form)
-        except Exception:
-            pass
+            response = cls.get_declension(text)
+            if response:
+                response_form = response if not form else response.get(form)
+        except Exception as e:
+            logger.warning('Unable to decline {}: {}'.format(text, e))
 
         return response_form or text
+
+    @classmethod
+    def get_stats(cls) -> dict:
+        stats = counters.get_counters(STATS_NAMESPACE, [STATS_NAME], STATS_FIELDS)[STATS_NAME]
+        if stats['lookups']:
+            stats['hit_ratio'] = max(0, 1 - stats['api_calls'] / stats['lookups'])
+        else:
+            stats['hit_ratio'] = 0
+        return stats
+
+    @classmethod
+    def reset_stats(cls):
+        counters.reset_counters(STATS_NAMESPACE, [STATS_NAME], STATS_FIELDS)
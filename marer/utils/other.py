@@ -1,155 +1,298 @@
 import hashlib
+import logging
+import threading
 import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError
+from functools import partial
 
 import requests
+from django.conf import settings
+from django.core.cache import cache
 from django.utils.dateparse import parse_datetime
-from urllib3.exceptions import MaxRetryError
 
 from marer import consts
+from marer.utils import singleflight
+from marer.utils.outbound import get_client
+
+logger = logging.getLogger('django')
+
+TENDER_CACHE_KEY = 'tender_info:{}'
+TENDER_ORG_CACHE_KEY = 'tender_info:org44:{}'
+TENDER_NOT_FOUND_STATUS_CODES = (204, 404)
+HASH_CHUNK_SIZE = 64 * 2 ** 10
+
+
+class TenderInfoError(Exception):
+    """
+    Сервис тендеров недоступен, ответил ошибкой или не успел ответить.
+    """
+    pass
 
 
 def parse_date_to_frontend_format(src_date_raw):
     return parse_datetime(src_date_raw).strftime('%d.%m.%Y')
 
 
+_tender_executor = None
+_tender_executor_lock = threading.Lock()
+
+
+def _get_tender_executor() -> ThreadPoolExecutor:
+    global _tender_executor
+    if _tender_executor is None:
+        with _tender_executor_lock:
+            if _tender_executor is None:
+                _tender_executor = ThreadPoolExecutor(max_workers=settings.TENDER_INFO_MAX_WORKERS)
+    return _tender_executor
+
+
+def _cache_get(key):
+    try:
+        return cache.get(key)
+    except Exception as e:
+        logger.warning('Unable to read tender info from cache: {}'.format(e))
+        return None
+
+
+def _cache_set(key, value, timeout):
+    try:
+        cache.set(key, dict(value=value), timeout)
+    except Exception as e:
+        logger.warning('Unable to store tender info in cache: {}'.format(e))
+
+
 def get_tender_info(gos_number):
-    tdata = {}
-    tender_data = {}
+    """
+    Данные тендера по госномеру; при ошибке сервиса - пустой словарь.
+    """
+    try:
+        return fetch_tender_info(gos_number)
+    except TenderInfoError as e:
+        logger.warning('Tender info for {} is unavailable: {}'.format(gos_number, e))
+        return {}
 
+
+def fetch_tender_info(gos_number):
+    """
+    Данные тендера по госномеру. Опубликованные данные почти не меняются,
+    поэтому и найденные, и ненайденные номера кешируются. При ошибке сервиса
+    выбрасывает TenderInfoError, чтобы сохраняющие ответ не приняли сбой за данные.
+    """
     if gos_number.startswith('http://zakupki.gov.ru/'):
         gos_number = gos_number.split('=', 1)[1]
 
+    cached = _cache_get(TENDER_CACHE_KEY.format(gos_number))
+    if cached is not None:
+        return cached['value']
+
+    return singleflight.do('tender:' + gos_number, lambda: _fetch_tender_info(gos_number))
+
+
+def _fetch_tender_info(gos_number):
+    # ненайденный номер известного формата - None, номер неизвестной длины - пустой словарь
+    not_found = None
+    if len(gos_number) == 19:
+        candidates = [_fetch_tender44]
+    elif len(gos_number) == 11:
+        candidates = [_fetch_tender223]
+    else:
+        candidates = [_fetch_tender44, _fetch_tender223]
+        not_found = {}
+
+    executor = _get_tender_executor()
+    futures = [executor.submit(fetch, gos_number) for fetch in candidates]
+    error = None
     try:
-        if len(gos_number) == 19:
-            req = requests.get('http://cbcom.ru:8080/tender44?gosNumber=' + gos_number, timeout=5)
-            if req and req.status_code != 200:
-                return None
-            if req.text:
-                tdata = req.json()
-
-            lot_data = tdata.get('lot', None)
-            if not lot_data:
-                lots = lot_data.get('lots', [])
-                if len(lots) > 0:
-                    lot_data = lots[0]
-
-            requirements = lot_data.get('customerRequirements', [])
-            cust_req_data = {}
-            if len(requirements) > 0:
-                cust_req_data = requirements[0]
-
-            collecting_data = tdata.get('procedureInfo', {}).get('collecting', {})
-            if len(collecting_data) == 0:
-                collecting_data = None
-
-            if tdata.get('purchaseResponsible', {}).get('responsibleRole', '') == 'CU':
-                publisher = dict(
-                    full_name=tdata.get('purchaseResponsible', {}).get('responsibleOrg', {}).get('fullName'),
-                    legal_address=tdata.get('purchaseResponsible', {}).get('responsibleOrg', {}).get('factAddress'),
-                    inn=tdata.get('purchaseResponsible', {}).get('responsibleOrg', {}).get('inn'),
-                    kpp=tdata.get('purchaseResponsible', {}).get('responsibleOrg', {}).get('kpp'),
-                )
-                beneficiary_reg_number = tdata.get('purchaseResponsible', {}).get('responsibleOrg', {}).get('regNum')
-            else:
-                publisher = dict()
-                beneficiary_reg_number = cust_req_data.get('customer', {}).get('regNum')
-
-            req = requests.get('http://cbcom.ru:8080/tender44org?regNumber=' + beneficiary_reg_number, timeout=5)
-            if req and req.status_code != 200:
-                pass
-            if req.text:
-                bdata = req.json()
-
-                publisher_additional = dict(
-                    full_name=bdata.get('fullName'),
-                    legal_address=bdata.get('postalAddress'),
-                    ogrn=bdata.get('ogrn'),
-                    inn=bdata.get('inn'),
-                    kpp=bdata.get('kpp'),
-                )
-                publisher.update(publisher_additional)
-
-            tender_data = dict(
-                gos_number=tdata.get('gosNumber'),
-                law=consts.TENDER_EXEC_LAW_44_FZ,
-                description=tdata.get('purchaseObjectInfo'),
-                placement_type=tdata.get('placingWay', {}).get('name'),
-                publish_date=parse_date_to_frontend_format(tdata.get('publishDate')),
-                collect_start_date=parse_date_to_frontend_format(collecting_data.get('startDate')) if collecting_data else None,
-                collect_end_date=parse_date_to_frontend_format(collecting_data.get('endDate')) if collecting_data else None,
-                finish_date=None,
-                start_cost=lot_data.get('maxPrice'),
-                application_ensure_cost=cust_req_data.get('applicationGuarantee', {}).get('amount',
-                                                                                          None) if cust_req_data.get(
-                    'applicationGuarantee', None) else None,
-                contract_execution_ensure_cost=cust_req_data.get('contractGuarantee', {}).get('amount',
-                                                                                              None) if cust_req_data.get(
-                    'contractGuarantee', None) else None,
-                currency_code=consts.CURRENCY_RUR,
-                publisher=publisher,
-            )
+        for future in as_completed(futures, timeout=settings.TENDER_INFO_TIMEOUT):
+            try:
+                tender_data = future.result()
+            except Exception as e:
+                logger.warning('Tender info request for {} failed: {}'.format(gos_number, e))
+                error = error or e
+                continue
+            if tender_data:
+                _cache_set(TENDER_CACHE_KEY.format(gos_number), tender_data, settings.TENDER_INFO_CACHE_TTL)
+                return tender_data
+    except TimeoutError:
+        raise TenderInfoError('Tender info request for {} timed out'.format(gos_number))
 
-        elif len(gos_number) == 11:
-            req = requests.get('http://cbcom.ru:8080/tender223?gosNumber=' + gos_number, timeout=5)
-            if req and req.status_code != 200:
-                return None
-            if req.text:
-                tdata = req.json()
-
-            publisher = dict(
-                full_name=tdata.get('customer', {}).get('mainInfo', {}).get('fullName', ''),
-                legal_address=tdata.get('customer', {}).get('mainInfo', {}).get('fullName', ''),
-                ogrn=tdata.get('customer', {}).get('mainInfo', {}).get('ogrn', ''),
-                inn=tdata.get('customer', {}).get('mainInfo', {}).get('inn', ''),
-                kpp=tdata.get('customer', {}).get('mainInfo', {}).get('kpp', ''),
-            )
+    if error is not None:
+        raise TenderInfoError('Tender info request for {} failed: {}'.format(gos_number, error))
+    _cache_set(TENDER_CACHE_KEY.format(gos_number), not_found, settings.TENDER_INFO_NEGATIVE_CACHE_TTL)
+    return not_found
 
-            tender_data = dict(
-                gos_number=tdata.get('purchaseNumber'),
-                law=consts.TENDER_EXEC_LAW_223_FZ,
-                description=tdata.get('purchaseObjectInfo'),
-                placement_type=tdata.get('placingWayName'),
-                publish_date=parse_date_to_frontend_format(tdata.get('publishDate')),
-                collect_start_date=None,
-                collect_end_date=None,
-                finish_date=None,
-                start_cost=tdata.get('lots', [])[0].get('lotData', {}).get('initialSum'),
-                application_ensure_cost=None,
-                contract_execution_ensure_cost=None,
-                currency_code=consts.CURRENCY_RUR,
-                publisher=publisher,
+
+def _is_found(req) -> bool:
+    """
+    False, если сервис ответил, что данных нет. Ошибки сервиса выбрасываются,
+    чтобы их не приняли за отсутствие данных и не закешировали.
+    """
+    if req.status_code in TENDER_NOT_FOUND_STATUS_CODES:
+        return False
+    if req.status_code != 200:
+        raise requests.HTTPError('Unexpected status code {}'.format(req.status_code), response=req)
+    return bool(req.text)
+
+
+def _get_tender44_org(beneficiary_reg_number):
+    cache_key = TENDER_ORG_CACHE_KEY.format(beneficiary_reg_number)
+    cached = _cache_get(cache_key)
+    if cached is not None:
+        return cached['value']
+
+    req = get_client('cbcom').get('http://cbcom.ru:8080/tender44org?regNumber=' + beneficiary_reg_number)
+    if not _is_found(req):
+        return {}
+    bdata = req.json()
+    _cache_set(cache_key, bdata, settings.TENDER_INFO_CACHE_TTL)
+    return bdata
+
+
+def _fetch_tender44(gos_number):
+    req = get_client('cbcom').get('http://cbcom.ru:8080/tender44?gosNumber=' + gos_number)
+    if not _is_found(req):
+        return None
+    tdata = req.json()
+
+    lot_data = tdata.get('lot', None)
+    if not lot_data:
+        lots = tdata.get('lots', [])
+        if len(lots) > 0:
+            lot_data = lots[0]
+    lot_data = lot_data or {}
+
+    requirements = lot_data.get('customerRequirements', [])
+    cust_req_data = {}
+    if len(requirements) > 0:
+        cust_req_data = requirements[0]
+
+    collecting_data = tdata.get('procedureInfo', {}).get('collecting', {})
+    if len(collecting_data) == 0:
+        collecting_data = None
+
+    if tdata.get('purchaseResponsible', {}).get('responsibleRole', '') == 'CU':
+        publisher = dict(
+            full_name=tdata.get('purchaseResponsible', {}).get('responsibleOrg', {}).get('fullName'),
+            legal_address=tdata.get('purchaseResponsible', {}).get('responsibleOrg', {}).get('factAddress'),
+            inn=tdata.get('purchaseResponsible', {}).get('responsibleOrg', {}).get('inn'),
+            kpp=tdata.get('purchaseResponsible', {}).get('responsibleOrg', {}).get('kpp'),
+        )
+        beneficiary_reg_number = tdata.get('purchaseResponsible', {}).get('responsibleOrg', {}).get('regNum')
+    else:
+        publisher = dict()
+        beneficiary_reg_number = cust_req_data.get('customer', {}).get('regNum')
+
+    if beneficiary_reg_number:
+        bdata = _get_tender44_org(beneficiary_reg_number)
+        if bdata:
+            publisher_additional = dict(
+                full_name=bdata.get('fullName'),
+                legal_address=bdata.get('postalAddress'),
+                ogrn=bdata.get('ogrn'),
+                inn=bdata.get('inn'),
+                kpp=bdata.get('kpp'),
             )
+            publisher.update(publisher_additional)
 
-    except MaxRetryError:
-        pass
+    return dict(
+        gos_number=tdata.get('gosNumber'),
+        law=consts.TENDER_EXEC_LAW_44_FZ,
+        description=tdata.get('purchaseObjectInfo'),
+        placement_type=tdata.get('placingWay', {}).get('name'),
+        publish_date=parse_date_to_frontend_format(tdata.get('publishDate')),
+        collect_start_date=parse_date_to_frontend_format(collecting_data.get('startDate')) if collecting_data else None,
+        collect_end_date=parse_date_to_frontend_format(collecting_data.get('endDate')) if collecting_data else None,
+        finish_date=None,
+        start_cost=lot_data.get('maxPrice'),
+        application_ensure_cost=cust_req_data.get('applicationGuarantee', {}).get('amount',
+                                                                                  None) if cust_req_data.get(
+            'applicationGuarantee', None) else None,
+        contract_execution_ensure_cost=cust_req_data.get('contractGuarantee', {}).get('amount',
+                                                                                      None) if cust_req_data.get(
+            'contractGuarantee', None) else None,
+        currency_code=consts.CURRENCY_RUR,
+        publisher=publisher,
+    )
 
-    return tender_data
+
+def _fetch_tender223(gos_number):
+    req = get_client('cbcom').get('http://cbcom.ru:8080/tender223?gosNumber=' + gos_number)
+    if not _is_found(req):
+        return None
+    tdata = req.json()
+
+    publisher = dict(
+        full_name=tdata.get('customer', {}).get('mainInfo', {}).get('fullName', ''),
+        legal_address=tdata.get('customer', {}).get('mainInfo', {}).get('fullName', ''),
+        ogrn=tdata.get('customer', {}).get('mainInfo', {}).get('ogrn', ''),
+        inn=tdata.get('customer', {}).get('mainInfo', {}).get('inn', ''),
+        kpp=tdata.get('customer', {}).get('mainInfo', {}).get('kpp', ''),
+    )
+
+    return dict(
+        gos_number=tdata.get('purchaseNumber'),
+        law=consts.TENDER_EXEC_LAW_223_FZ,
+        description=tdata.get('purchaseObjectInfo'),
+        placement_type=tdata.get('placingWayName'),
+        publish_date=parse_date_to_frontend_format(tdata.get('publishDate')),
+        collect_start_date=None,
+        collect_end_date=None,
+        finish_date=None,
+        start_cost=tdata.get('lots', [])[0].get('lotData', {}).get('initialSum'),
+        application_ensure_cost=None,
+        contract_execution_ensure_cost=None,
+        currency_code=consts.CURRENCY_RUR,
+        publisher=publisher,
+    )
+
+
+def _update_digest(digest, fileobj):
+    for chunk in iter(partial(fileobj.read, HASH_CHUNK_SIZE), b''):
+        digest.update(chunk)
+    return digest
+
+
+def file_sha256(fileobj) -> str:
+    """
+    sha256 байтов файла; файл читается частями, а не целиком в память.
+    """
+    fileobj.seek(0)
+    try:
+        return _update_digest(hashlib.sha256(), fileobj).hexdigest()
+    finally:
+        fileobj.seek(0)
+
+
+def file_content_hash(fileobj, name: str = None) -> str:
+    """
+    Канонический sha256 содержимого файла. Для docx считается по частям архива
+    в порядке имен без .rels, поэтому не зависит от сжатия и дат в архиве;
+    остальные файлы хешируются побайтно.
+    :param name: имя файла, по умолчанию fileobj.name
+    """
+    name = name or getattr(fileobj, 'name', None) or ''
+    if name.lower().endswith('.docx'):
+        fileobj.seek(0)
+        try:
+            with zipfile.ZipFile(fileobj) as archive:
+                digest = hashlib.sha256(b'zip')
+                for member in sorted(set(archive.namelist())):
+                    if member.endswith('.rels'):
+                        continue
+                    digest.update(member.encode('utf-8') + b'\0')
+                    with archive.open(member) as f:
+                        digest.update(_update_digest(hashlib.sha256(), f).digest())
+                return digest.hexdigest()
+        except zipfile.BadZipFile:
+            pass
+        finally:
+            fileobj.seek(0)
+    return file_sha256(fileobj)
 
 
 def are_docx_files_identical(zip1_path: str, zip2_path: str) -> bool:
-    zip1 = zipfile.ZipFile(zip1_path)
-    zip2 = zipfile.ZipFile(zip2_path)
-
-    def _check_zip_filelist_for_identity(z1, z2):
-        fnames_z1 = [z.filename for z in z1.filelist]
-        fnames_z2 = [z.filename for z in z2.filelist]
-        for fname in fnames_z1:
-            if str(fname).endswith('.rels'):
-                continue
-            if fname not in fnames_z2:
-                return False
-            zfile1 = z1.read(fname)
-            zfile2 = z2.read(fname)
-            md5_1 = hashlib.md5(zfile1).hexdigest()
-            md5_2 = hashlib.md5(zfile2).hexdigest()
-            if md5_1 != md5_2:
-                return False
-        return True
-
-    check_z1_z2 = _check_zip_filelist_for_identity(zip1, zip2)
-    check_z2_z1 = _check_zip_filelist_for_identity(zip2, zip1)
-
-    return check_z1_z2 and check_z2_z1
+    with open(zip1_path, 'rb') as zip1, open(zip2_path, 'rb') as zip2:
+        return file_content_hash(zip1) == file_content_hash(zip2)
 
 
 # TODO: нормальзировать форму
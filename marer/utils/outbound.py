@@ -0,0 +1,172 @@
+import logging
+import random
+import threading
+import time
+
+import feedparser
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from marer.utils import singleflight
+
+logger = logging.getLogger('django')
+
+DEFAULT_INTEGRATION_SETTINGS = dict(
+    connect_timeout=3,
+    read_timeout=10,
+    retries=2,
+    backoff=0.3,
+    breaker_threshold=5,
+    breaker_reset_timeout=30,
+    pool_size=10,
+)
+
+RETRY_STATUS_CODES = (500, 502, 503, 504)
+
+
+class CircuitOpenError(requests.RequestException):
+    """
+    Интеграция временно отключена после серии ошибок апстрима.
+    """
+    pass
+
+
+class FeedError(Exception):
+    """
+    Лента не загрузилась или не разбирается.
+    """
+    pass
+
+
+class CircuitBreaker:
+
+    def __init__(self, name: str, threshold: int, reset_timeout: int):
+        self.name = name
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._lock = threading.Lock()
+
+    def before_request(self):
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if time.time() - self._opened_at < self.reset_timeout:
+                raise CircuitOpenError('Circuit for {} is open'.format(self.name))
+            # пропускаем пробный запрос; при ошибке цепь откроется снова
+            self._opened_at = None
+            self._failures = self.threshold - 1
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self.threshold and self._opened_at is None:
+                self._opened_at = time.time()
+                logger.warning('Circuit for {} opened after {} failures'.format(self.name, self._failures))
+
+
+class OutboundClient:
+    """
+    HTTP-клиент внешней интеграции: пул keep-alive соединений,
+    таймауты, ограниченные повторы и размыкатель цепи.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        conf = dict(DEFAULT_INTEGRATION_SETTINGS)
+        conf.update(settings.OUTBOUND_INTEGRATIONS.get(name, {}))
+        self.timeout = (conf['connect_timeout'], conf['read_timeout'])
+        self.retries = conf['retries']
+        self.backoff = conf['backoff']
+        self.breaker = CircuitBreaker(name, conf['breaker_threshold'], conf['breaker_reset_timeout'])
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=conf['pool_size'], pool_maxsize=conf['pool_size'])
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def _sleep_before_retry(self, attempt: int):
+        time.sleep(self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5))
+
+    def request(self, method: str, url: str, before_attempt=None, **kwargs) -> requests.Response:
+        """
+        :param before_attempt: вызывается перед каждой попыткой, включая повторы,
+            например для ограничения частоты и учета платных запросов
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        attempt = 0
+        while True:
+            self.breaker.before_request()
+            if before_attempt is not None:
+                before_attempt()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self.breaker.record_failure()
+                if attempt >= self.retries:
+                    raise
+                logger.info('{} request to {} failed ({}), retrying'.format(self.name, url, e))
+            else:
+                if response.status_code not in RETRY_STATUS_CODES:
+                    self.breaker.record_success()
+                    return response
+                self.breaker.record_failure()
+                if attempt >= self.retries:
+                    return response
+                logger.info('{} request to {} returned {}, retrying'.format(self.name, url, response.status_code))
+            self._sleep_before_retry(attempt)
+            attempt += 1
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(name: str) -> OutboundClient:
+    client = _clients.get(name)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(name)
+            if client is None:
+                client = OutboundClient(name)
+                _clients[name] = client
+    return client
+
+
+def get_feed(name: str, url: str, raise_errors: bool = False):
+    """
+    Загружает RSS через клиент интеграции и разбирает его feedparser'ом.
+    При ошибке возвращает пустую ленту, как feedparser для недоступного адреса.
+    :param raise_errors: выбросить FeedError, чтобы сбой не приняли за пустую ленту
+    """
+    def fetch():
+        response = get_client(name).get(url)
+        if response.status_code == 200:
+            return response.content
+        if raise_errors:
+            raise FeedError('{} returned {} for {}'.format(name, response.status_code, url))
+        return b''
+
+    try:
+        content = singleflight.do('feed:' + url, fetch)
+    except requests.RequestException as e:
+        if raise_errors:
+            raise FeedError('Unable to load feed {}: {}'.format(url, e))
+        logger.warning('Unable to load feed {}: {}'.format(url, e))
+        content = b''
+    data = feedparser.parse(content)
+    if raise_errors and data.get('bozo') and not data['entries']:
+        raise FeedError('Unable to parse feed {}: {}'.format(url, data.get('bozo_exception')))
+    return data
@@ -0,0 +1,94 @@
+import logging
+import threading
+import time
+
+import requests
+
+logger = logging.getLogger('django')
+
+BUCKET_KEY = 'ratelimit:{}'
+
+# возвращает время ожидания в секундах; 0 — токен выдан
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local data = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(data[1])
+local ts = tonumber(data[2])
+if tokens == nil then
+    tokens = burst
+    ts = now
+end
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HMSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(wait)
+"""
+
+
+class RateLimitExceeded(requests.RequestException):
+    """
+    Токен не удалось получить до истечения срока ожидания.
+    """
+    pass
+
+
+class _LocalBucket:
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.ts = time.time()
+        self._lock = threading.Lock()
+
+    def take(self) -> float:
+        with self._lock:
+            now = time.time()
+            self.tokens = min(self.burst, self.tokens + max(0, now - self.ts) * self.rate)
+            self.ts = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+
+class TokenBucket:
+    """
+    Общий для всех воркеров token bucket в Redis. Если Redis недоступен,
+    ограничение действует в пределах процесса.
+    """
+
+    def __init__(self, name: str, rate: float, burst: int):
+        self.key = BUCKET_KEY.format(name)
+        self.rate = rate
+        self.burst = burst
+        self._local = _LocalBucket(rate, burst)
+        self._script = None
+
+    def _take(self) -> float:
+        try:
+            if self._script is None:
+                from django_redis import get_redis_connection
+                self._script = get_redis_connection('default').register_script(TOKEN_BUCKET_SCRIPT)
+            return float(self._script(keys=[self.key], args=[self.rate, self.burst, time.time()]))
+        except Exception as e:
+            logger.warning('Shared rate limiter {} is unavailable, using local one: {}'.format(self.key, e))
+            return self._local.take()
+
+    def acquire(self, timeout: float):
+        deadline = time.time() + timeout
+        while True:
+            wait = self._take()
+            if wait <= 0:
+                return
+            if time.time() + wait > deadline:
+                raise RateLimitExceeded('Rate limit {} exceeded'.format(self.key))
+            time.sleep(wait)
@@ -0,0 +1,94 @@
+import logging
+import threading
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.db import connection, transaction
+
+logger = logging.getLogger('django')
+
+SideEffect = namedtuple('SideEffect', ['name', 'func', 'fields', 'condition', 'background'])
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=settings.SIDE_EFFECTS_MAX_WORKERS)
+    return _executor
+
+
+def _run_in_background(effect: SideEffect, model, pk):
+    try:
+        # объект перечитывается: экземпляр из запроса не передается в другой поток
+        effect.func(model._default_manager.get(pk=pk))
+    except Exception:
+        logger.exception('Side effect {} failed for {} {}'.format(effect.name, model.__name__, pk))
+    finally:
+        connection.close()
+
+
+class SideEffectRegistry:
+    """
+    Побочные действия сохранения модели. Каждое действие объявляет поля, от которых зависит,
+    и выполняется после фиксации транзакции: сразу в том же потоке или в фоновом пуле.
+    """
+
+    def __init__(self):
+        self.effects = OrderedDict()
+
+    def register(self, fields=None, condition=None, background=False):
+        """
+        :param fields: действие нужно, только если изменилось одно из этих полей
+        :param condition: condition(instance, changed_fields) решает, нужно ли действие, вместо fields
+        :param background: выполнять в фоновом пуле, если он включен настройкой SIDE_EFFECTS_BACKGROUND
+        """
+        def decorator(func):
+            self.effects[func.__name__] = SideEffect(
+                name=func.__name__,
+                func=func,
+                fields=frozenset(fields) if fields is not None else None,
+                condition=condition,
+                background=background,
+            )
+            return func
+        return decorator
+
+    def select(self, instance, changed_fields: set, created: bool, exclude=()) -> list:
+        """
+        Действия, которые нужны после сохранения; вызывается до сохранения,
+        пока известны измененные поля.
+        """
+        selected = []
+        for effect in self.effects.values():
+            if effect.name in exclude:
+                continue
+            if created:
+                selected.append(effect)
+            elif effect.condition is not None:
+                if effect.condition(instance, changed_fields):
+                    selected.append(effect)
+            elif effect.fields is None or effect.fields & changed_fields:
+                selected.append(effect)
+        return selected
+
+    def schedule(self, instance, effects: list, using=None):
+        for effect in effects:
+            transaction.on_commit(partial(self.run, effect, instance), using=using)
+
+    def run(self, effect: SideEffect, instance):
+        if effect.background and settings.SIDE_EFFECTS_BACKGROUND:
+            _get_executor().submit(_run_in_background, effect, type(instance), instance.pk)
+            return
+        try:
+            effect.func(instance)
+        except Exception:
+            # данные уже зафиксированы, ошибка действия не должна превращаться в ошибку запроса
+            logger.exception('Side effect {} failed for {} {}'.format(
+                effect.name, type(instance).__name__, getattr(instance, 'pk', None)))
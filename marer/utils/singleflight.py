@@ -0,0 +1,97 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger('django')
+
+LOCK_KEY = 'singleflight:lock:{}'
+RESULT_KEY = 'singleflight:result:{}'
+
+
+class _Call:
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+_calls = {}
+_calls_lock = threading.Lock()
+
+
+def _run_across_workers(key: str, fn):
+    """
+    Межпроцессная часть: первый воркер берет блокировку в кеше и выполняет запрос,
+    остальные ждут опубликованный результат. Если лидер пропал или упал,
+    ожидающий выполняет запрос сам.
+    """
+    lock_key = LOCK_KEY.format(key)
+    result_key = RESULT_KEY.format(key)
+    lock_ttl = settings.SINGLEFLIGHT_LOCK_TTL
+    try:
+        acquired = cache.add(lock_key, 1, lock_ttl)
+    except Exception as e:
+        logger.warning('Single-flight lock for {} is unavailable: {}'.format(key, e))
+        return fn()
+
+    if acquired:
+        try:
+            result = fn()
+            try:
+                cache.set(result_key, dict(value=result), settings.SINGLEFLIGHT_RESULT_TTL)
+            except Exception as e:
+                logger.warning('Unable to publish single-flight result for {}: {}'.format(key, e))
+            return result
+        finally:
+            try:
+                cache.delete(lock_key)
+            except Exception:
+                pass
+
+    deadline = time.time() + lock_ttl
+    while time.time() < deadline:
+        time.sleep(settings.SINGLEFLIGHT_POLL_INTERVAL)
+        try:
+            published = cache.get(result_key)
+            if published is not None:
+                return published['value']
+            if cache.get(lock_key) is None:
+                break
+        except Exception:
+            break
+    return fn()
+
+
+def do(key: str, fn):
+    """
+    Выполняет fn один раз для всех одновременных вызовов с одинаковым ключом:
+    внутри процесса потоки ждут одного исполнителя, между воркерами
+    координация идет через общий кеш. Результат должен сериализоваться в кеш.
+    """
+    with _calls_lock:
+        call = _calls.get(key)
+        is_leader = call is None
+        if is_leader:
+            call = _Call()
+            _calls[key] = call
+
+    if not is_leader:
+        call.event.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    try:
+        call.result = _run_across_workers(key, fn)
+    except Exception as e:
+        call.error = e
+        raise
+    finally:
+        with _calls_lock:
+            del _calls[key]
+        call.event.set()
+    return call.result
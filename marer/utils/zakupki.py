@@ -0,0 +1,14 @@
+from marer.utils.outbound import get_feed
+
+FZ44_FINISHED_CONTRACTS_RSS = 'http://zakupki.gov.ru/epz/contract/extendedsearch/rss?openMode=USE_DEFAULT_PARAMS&pageNumber=1&sortDirection=false&recordsPerPage=_50&sortBy=PO_DATE_OBNOVLENIJA&fz44=on&fz94=on&priceFrom=0&priceTo=200000000000&advancePercentFrom=hint&advancePercentTo=hint&contractStageList_1=on&contractStageList=1&supplierTitle={}'
+FZ223_FINISHED_CONTRACTS_RSS = 'http://zakupki.gov.ru/epz/contractfz223/extendedSearch/rss?morphology=on&pageNumber=1&sortDirection=false&recordsPerPage=_10&statuses_1=on&statuses=1&supplierTitle={}&currencyId=1&sortBy=BY_UPDATE_DATE'
+
+
+def get_finished_contracts_counts(inn: str):
+    """
+    Количество исполненных контрактов поставщика по 44-ФЗ и 223-ФЗ.
+    Ошибки не глотаются, чтобы не сохранить ноль вместо реального значения.
+    """
+    fz44_count = len(get_feed('zakupki', FZ44_FINISHED_CONTRACTS_RSS.format(inn), raise_errors=True)['entries'])
+    fz223_count = len(get_feed('zakupki', FZ223_FINISHED_CONTRACTS_RSS.format(inn), raise_errors=True)['entries'])
+    return fz44_count, fz223_count
@@ -9,6 +9,7 @@ from django.contrib.auth import logout
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.core.files.base import ContentFile
 from django.core.mail import send_mail
+from django.db import transaction
 from django.http import HttpResponseRedirect, HttpResponse
 from django.shortcuts import get_object_or_404
 from django.template.loader import get_template
@@ -71,31 +72,32 @@ class IssueChatView(IssueView):
 
             if comment_form.is_valid():
 
-                new_msg = IssueClarificationMessage()
-                new_msg.issue = self.get_issue()
-                new_msg.message = comment_form.cleaned_data['message']
-                new_msg.user = request.user
-                new_msg.save()
-
-                for ffield in ['doc%s' % dnum for dnum in range(1, 9)]:
-                    ffile = comment_form.cleaned_data[ffield]
-                    if ffile:
-                        new_doc = Document()
-                        new_doc.file = ffile
-                        new_doc.save()
-
-                        new_clarif_doc_link = IssueFinanceOrgProposeClarificationMessageDocument()
-                        new_clarif_doc_link.clarification_message = new_msg
-                        new_clarif_doc_link.name = ffile.name
-                        new_clarif_doc_link.document = new_doc
-                        new_clarif_doc_link.save()
-
-                        new_other_propose_doc = IssueProposeDocument()
-                        new_other_propose_doc.issue = self.get_issue()
-                        new_other_propose_doc.name = ffile.name
-                        new_other_propose_doc.document = new_doc
-                        new_other_propose_doc.type = consts.DOCUMENT_TYPE_OTHER
-                        new_other_propose_doc.save()
+                with transaction.atomic():
+                    new_msg = IssueClarificationMessage()
+                    new_msg.issue = self.get_issue()
+                    new_msg.message = comment_form.cleaned_data['message']
+                    new_msg.user = request.user
+                    new_msg.save()
+
+                    for ffield in ['doc%s' % dnum for dnum in range(1, 9)]:
+                        ffile = comment_form.cleaned_data[ffield]
+                        if ffile:
+                            new_doc = Document()
+                            new_doc.file = ffile
+                            new_doc.save()
+
+                            new_clarif_doc_link = IssueFinanceOrgProposeClarificationMessageDocument()
+                            new_clarif_doc_link.clarification_message = new_msg
+                            new_clarif_doc_link.name = ffile.name
+                            new_clarif_doc_link.document = new_doc
+                            new_clarif_doc_link.save()
+
+                            new_other_propose_doc = IssueProposeDocument()
+                            new_other_propose_doc.issue = self.get_issue()
+                            new_other_propose_doc.name = ffile.name
+                            new_other_propose_doc.document = new_doc
+                            new_other_propose_doc.type = consts.DOCUMENT_TYPE_OTHER
+                            new_other_propose_doc.save()
 
                 notify_managers_about_new_message_in_chat(new_msg)
 
@@ -598,31 +600,32 @@ class IssueAdditionalDocumentsRequestsView(IssueView):
                 if self.get_issue() and 'issue_additional_documents_requests' not in self.get_issue().editable_dashboard_views():
                     return self.get(request, *args, **kwargs)
 
-                new_msg = IssueClarificationMessage()
-                new_msg.issue = self.get_issue()
-                new_msg.message = comment_form.cleaned_data['message']
-                new_msg.user = request.user
-                new_msg.save()
-
-                for ffield in ['doc%s' % dnum for dnum in range(1, 9)]:
-                    ffile = comment_form.cleaned_data[ffield]
-                    if ffile:
-                        new_doc = Document()
-                        new_doc.file = ffile
-                        new_doc.save()
-
-                        new_clarif_doc_link = IssueFinanceOrgProposeClarificationMessageDocument()
-                        new_clarif_doc_link.clarification_message = new_msg
-                        new_clarif_doc_link.name = ffile.name
-                        new_clarif_doc_link.document = new_doc
-                        new_clarif_doc_link.save()
-
-                        new_other_propose_doc = IssueProposeDocument()
-                        new_other_propose_doc.issue = self.get_issue()
-                        new_other_propose_doc.name = ffile.name
-                        new_other_propose_doc.document = new_doc
-                        new_other_propose_doc.type = consts.DOCUMENT_TYPE_OTHER
-                        new_other_propose_doc.save()
+                with transaction.atomic():
+                    new_msg = IssueClarificationMessage()
+                    new_msg.issue = self.get_issue()
+                    new_msg.message = comment_form.cleaned_data['message']
+                    new_msg.user = request.user
+                    new_msg.save()
+
+                    for ffield in ['doc%s' % dnum for dnum in range(1, 9)]:
+                        ffile = comment_form.cleaned_data[ffield]
+                        if ffile:
+                            new_doc = Document()
+                            new_doc.file = ffile
+                            new_doc.save()
+
+                            new_clarif_doc_link = IssueFinanceOrgProposeClarificationMessageDocument()
+                            new_clarif_doc_link.clarification_message = new_msg
+                            new_clarif_doc_link.name = ffile.name
+                            new_clarif_doc_link.document = new_doc
+                            new_clarif_doc_link.save()
+
+                            new_other_propose_doc = IssueProposeDocument()
+                            new_other_propose_doc.issue = self.get_issue()
+                            new_other_propose_doc.name = ffile.name
+                            new_other_propose_doc.document = new_doc
+                            new_other_propose_doc.type = consts.DOCUMENT_TYPE_OTHER
+                            new_other_propose_doc.save()
 
                 notify_managers_about_new_message_in_chat(new_msg)
 
@@ -657,35 +660,36 @@ class IssueAdditionalDocumentsRequestView(IssueView):
             if self.get_issue() and 'issue_additional_documents_requests' not in self.get_issue().editable_dashboard_views():
                 return self.get(request, *args, **kwargs)
 
-            clarification = self._get_clarification()
-            clarification_change = True
-            if not clarification:
-                propose_id = request.GET.get('pid', 0)
-
-                clarification = IssueClarification()
-                clarification.initiator = consts.IFOPC_INITIATOR_ISSUER
-                clarification.issue = self.get_issue()
-                clarification.save()
-                clarification_change = False
-
-            new_msg = IssueClarificationMessage()
-            new_msg.clarification = clarification
-            new_msg.message = comment_form.cleaned_data['message']
-            new_msg.user = request.user
-            new_msg.save()
-
-            for ffield in ['doc%s' % dnum for dnum in range(1, 9)]:
-                ffile = comment_form.cleaned_data[ffield]
-                if ffile:
-                    new_doc = Document()
-                    new_doc.file = ffile
-                    new_doc.save()
+            with transaction.atomic():
+                clarification = self._get_clarification()
+                clarification_change = True
+                if not clarification:
+                    propose_id = request.GET.get('pid', 0)
+
+                    clarification = IssueClarification()
+                    clarification.initiator = consts.IFOPC_INITIATOR_ISSUER
+                    clarification.issue = self.get_issue()
+                    clarification.save()
+                    clarification_change = False
+
+                new_msg = IssueClarificationMessage()
+                new_msg.clarification = clarification
+                new_msg.message = comment_form.cleaned_data['message']
+                new_msg.user = request.user
+                new_msg.save()
+
+                for ffield in ['doc%s' % dnum for dnum in range(1, 9)]:
+                    ffile = comment_form.cleaned_data[ffield]
+                    if ffile:
+                        new_doc = Document()
+                        new_doc.file = ffile
+                        new_doc.save()
 
-                    new_clarif_doc_link = IssueFinanceOrgProposeClarificationMessageDocument()
-                    new_clarif_doc_link.clarification_message = new_msg
-                    new_clarif_doc_link.name = ffile.name
-                    new_clarif_doc_link.document = new_doc
-                    new_clarif_doc_link.save()
+                        new_clarif_doc_link = IssueFinanceOrgProposeClarificationMessageDocument()
+                        new_clarif_doc_link.clarification_message = new_msg
+                        new_clarif_doc_link.name = ffile.name
+                        new_clarif_doc_link.document = new_doc
+                        new_clarif_doc_link.save()
 
             if clarification_change:
                 notify_about_user_adds_message(new_msg)
@@ -9,8 +9,10 @@ from rest_framework.views import APIView, View
 
 from marer.models import Issue
 from marer.serializers import ProfileSerializer, IssueListSerializer, IssueSerializer, IssueSecDepSerializer, \
-    IssueLawyersDepSerializer, IssueMessagesSerializer, IssueDocOpsSerializer, DocumentSerializer
+    IssueLawyersDepSerializer, IssueMessagesSerializer, IssueDocOpsSerializer, DocumentSerializer, \
+    DocumentGenerationJobSerializer, ConclusionBatchSerializer
 from marer.forms import RestTenderForm, IssueBankCommissionForm
+from marer.utils.documents import enqueue_documents, generate_conclusions, get_acts_for_issue
 from marer.utils.issue import calculate_bank_commission, zip_docs
 from marer.utils.other import parse_date_to_frontend_format, get_tender_info
 
@@ -202,6 +204,46 @@ class IssueGenerateSecDepMgmtView(IssueBaseAPIView):
             errors.append('Заключение ДБ заполнить невозможно')
         return Response(errors, status=status.HTTP_400_BAD_REQUEST)
 
+
+class IssuesGenerateConclusionsView(APIView):
+    """
+    Пакетное заполнение заключений: {"issues": [id, ...], "conclusion_type": "sec_dep"}.
+    Отвечает отчетом по каждой заявке.
+    """
+
+    def post(self, request):
+        if not request.user.is_staff:
+            return Response(status=status.HTTP_403_FORBIDDEN)
+        ser = ConclusionBatchSerializer(data=request.data['body'])
+        if not ser.is_valid():
+            return Response(ser.errors, status=status.HTTP_400_BAD_REQUEST)
+        report = generate_conclusions(
+            ser.validated_data['issues'],
+            ser.validated_data['conclusion_type'],
+            user=request.user,
+        )
+        return Response(report)
+
+
+class IssueDocumentJobsView(APIView):
+    """
+    Фоновое формирование актов заявки: POST ставит пакет в очередь
+    и сразу отвечает, GET показывает ход последнего пакета.
+    """
+
+    def get(self, request, iid):
+        issue = Issue.objects.get(id=iid)
+        job = issue.document_generation_jobs.order_by('-id').first()
+        if job is None:
+            return Response(None)
+        return Response(DocumentGenerationJobSerializer(job).data)
+
+    def post(self, request, iid):
+        issue = Issue.objects.get(id=iid)
+        job = enqueue_documents(issue, get_acts_for_issue(issue))
+        return Response(DocumentGenerationJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+
 class IssueLawyersDepView(IssueBaseAPIView):
     serializer = IssueLawyersDepSerializer
 
@@ -204,8 +204,85 @@ AUTH_CERT_SIGN_CHECK_CLASS = ''
 FILE_SIGN_CHECK_CLASS = ''
 
 KONTUR_FOCUS_API_KEY = ''
+# время жизни ответов Контур.Фокуса в кеше, секунды
+KONTUR_CACHE_DEFAULT_TTL = 60 * 60 * 24
+KONTUR_CACHE_TTL = {
+    'req': 60 * 60 * 24,
+    'analytics': 60 * 60 * 6,
+    'egrDetails': 60 * 60 * 24 * 3,
+    'companyAffiliates/req': 60 * 60 * 24 * 3,
+    'beneficialOwners': 60 * 60 * 24 * 3,
+    'licences': 60 * 60 * 24 * 7,
+}
+KONTUR_CACHE_EMPTY_TTL = 60 * 5
+KONTUR_CACHE_STALE_TTL = 60 * 60 * 24 * 7
+KONTUR_CACHE_REVALIDATE_LOCK_TTL = 60
+# общий пул потоков для параллельных запросов к Контур.Фокусу
+KONTUR_BUNDLE_MAX_WORKERS = 10
+KONTUR_BUNDLE_TIMEOUT = 30
+# ограничение частоты запросов на ключ API: запросов в секунду, размер всплеска, максимум ожидания в секундах
+KONTUR_RATE_LIMIT = dict(rate=5, burst=10, deadline=10)
+# квота запросов по договору на календарный месяц, 0 — не ограничена
+KONTUR_MONTHLY_QUOTA = 0
 
 LIMIT_FINISHED_CONTRACTS = 1
+# актуальность локальной статистики исполненных контрактов, часы
+SUPPLIER_CONTRACT_STATS_MAX_AGE_HOURS = 24 * 7
+SUPPLIER_CONTRACT_STATS_REFRESH_WORKERS = 4
+
+# ночной прогрев внешних данных по контрагентам активных заявок
+PREWARM_COUNTERPARTIES_WORKERS = 4
+PREWARM_COUNTERPARTIES_CHECKPOINT_TTL = 60 * 60 * 24
+
+# параметры исходящих http-интеграций: таймауты в секундах, повторы, размыкатель цепи
+OUTBOUND_INTEGRATIONS = {
+    'kontur': dict(connect_timeout=3, read_timeout=15, retries=2),
+    'morpher': dict(connect_timeout=2, read_timeout=5, retries=1),
+    'cbcom': dict(connect_timeout=3, read_timeout=5, retries=1),
+    'zakupki': dict(connect_timeout=3, read_timeout=10, retries=1),
+    'fedsfm': dict(connect_timeout=3, read_timeout=10, retries=1),
+}
+
+# объединение одновременных одинаковых внешних запросов между воркерами, секунды
+SINGLEFLIGHT_LOCK_TTL = 30
+SINGLEFLIGHT_RESULT_TTL = 10
+SINGLEFLIGHT_POLL_INTERVAL = 0.1
+
+# кеш данных тендеров по госномеру, секунды
+TENDER_INFO_CACHE_TTL = 60 * 60 * 24 * 7
+TENDER_INFO_NEGATIVE_CACHE_TTL = 60 * 60
+TENDER_INFO_TIMEOUT = 15
+TENDER_INFO_MAX_WORKERS = 6
+
+# сколько секунд помнить, что заказчика нет в реестре zakupki.gov.ru
+ZAKUPKI_CUSTOMER_NEGATIVE_CACHE_TTL = 60 * 60
+
+# словарь склонений Morpher: размер кеша в памяти процесса и параллельность дозагрузки
+MORPHER_LRU_SIZE = 2000
+MORPHER_PREFETCH_MAX_WORKERS = 6
+
+# суммы прописью и номера гарантий: размер кеша в памяти процесса
+AMOUNT_IN_WORDS_CACHE_SIZE = 4096
+
+# фоновое формирование актов заявки командой docworker; без запущенного обработчика держать выключенным
+DOCWORKER_ENABLED = False
+DOCWORKER_PROCESSES = 4
+DOCWORKER_POLL_INTERVAL = 2
+# задачи, которые дольше этого времени в работе, возвращаются в очередь
+DOCWORKER_TASK_TIMEOUT = 60 * 10
+# как часто обработчик ищет такие задачи, в том числе когда сам занят
+DOCWORKER_REQUEUE_INTERVAL = 60
+# заполненные xlsx-документы крупнее этого размера пишутся на диск, а не в память
+DOCUMENT_SPOOL_MAX_SIZE = 5 * 1024 * 1024
+
+# пакетное заполнение заключений из админки и REST
+CONCLUSION_BATCH_MAX_ISSUES = 100
+# при включенном docworker столько секунд веб-процесс ждет заключения пакета
+CONCLUSION_BATCH_TIMEOUT = 60
+
+# побочные действия сохранения заявки, помеченные фоновыми, выполняются в пуле потоков после фиксации транзакции
+SIDE_EFFECTS_BACKGROUND = False
+SIDE_EFFECTS_MAX_WORKERS = 4
 
 include(
     optional('secrets.py'),